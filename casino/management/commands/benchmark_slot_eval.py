@@ -0,0 +1,74 @@
+# casino/management/commands/benchmark_slot_eval.py
+
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from casino.paytable import GAMES, GRID_GAME
+
+
+def legacy_3x3_spin(rng):
+    """
+    舊版 slot_machine_3x3_view 的做法：每局重建符號表 / 中獎線 / 3x3 盤面並逐線比對。
+    """
+    symbols = ["7", "⭐", "🍒", "🍋", "🔔"]
+    weights = [1, 2, 3, 4, 4]
+    symbol_multipliers = {"7": 5, "⭐": 3, "🍒": 2, "🍋": 2, "🔔": 2}
+    grid = [rng.choices(symbols, weights=weights, k=3) for _ in range(3)]
+    winning_lines = [
+        [(0, 0), (0, 1), (0, 2)], [(1, 0), (1, 1), (1, 2)], [(2, 0), (2, 1), (2, 2)],
+        [(0, 0), (1, 0), (2, 0)], [(0, 1), (1, 1), (2, 1)], [(0, 2), (1, 2), (2, 2)],
+        [(0, 0), (1, 1), (2, 2)], [(0, 2), (1, 1), (2, 0)],
+    ]
+    multiplier = 0
+    for line in winning_lines:
+        line_symbols = [grid[r][c] for r, c in line]
+        if line_symbols[0] == line_symbols[1] == line_symbols[2]:
+            multiplier += symbol_multipliers[line_symbols[0]]
+    return multiplier
+
+
+class Command(BaseCommand):
+    help = "量測單局拉霸評估成本 (舊版逐線比對 vs. 引擎 evaluate vs. 賠率表查表)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--spins', type=int, default=200_000, help="每種方式的局數")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def _report(self, label, elapsed, spins):
+        self.stdout.write(f"  {label}: {elapsed / spins * 1e9:,.0f} ns/局 ({spins / elapsed:,.0f} 局/秒)")
+
+    def _measure_spins(self, label, spin_once, spins, seed):
+        rng = random.Random(seed)
+        start = time.perf_counter()
+        for _ in range(spins):
+            spin_once(rng)
+        self._report(label, time.perf_counter() - start, spins)
+
+    def _measure_eval(self, label, evaluate, draws):
+        start = time.perf_counter()
+        for cells in draws:
+            evaluate(cells)
+        self._report(label, time.perf_counter() - start, len(draws))
+
+    def handle(self, *args, **options):
+        spins, seed = options['spins'], options['seed']
+        for name, game in GAMES.items():
+            start = time.perf_counter()
+            table = game.payout_table()
+            self.stdout.write(
+                f"{name}: 賠率表 {len(table):,} 筆 / {len(table) * table.itemsize:,} bytes，"
+                f"建立 {(time.perf_counter() - start) * 1000:.0f} ms"
+            )
+
+            # 完整一局 (抽符號 + 評估)
+            if game is GRID_GAME:
+                self._measure_spins("舊版整局 (重建結構 + 逐線比對)", legacy_3x3_spin, spins, seed)
+            self._measure_spins("目前整局 play", game.play, spins, seed)
+
+            # 只量評估成本：先抽好所有盤面
+            rng = random.Random(seed)
+            draws = [game.spin(rng) for _ in range(spins)]
+            self._measure_eval("評估 evaluate", game.evaluate, draws)
+            self._measure_eval("評估 payout (查表)", game.payout, draws)
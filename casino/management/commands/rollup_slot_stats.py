@@ -0,0 +1,24 @@
+# casino/management/commands/rollup_slot_stats.py
+
+from django.core.management.base import BaseCommand
+
+from casino.rollups import ROLLUP_LAG, last_rollup, rollup_slot_stats
+
+
+class Command(BaseCommand):
+    help = "排程 (例如每小時)：將上次水位之後的拉霸紀錄增量彙總到每日 / 每會員每日統計表"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help="清除所有彙總後從頭重算 (紀錄被修改 / 刪除後使用)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="bulk_create / bulk_update 每批筆數")
+
+    def handle(self, *args, **options):
+        previous = last_rollup()
+        if previous and not options['rebuild']:
+            self.stdout.write(f"上次水位：{previous.rolled_up_through:%Y-%m-%d %H:%M:%S}")
+
+        run = rollup_slot_stats(rebuild=options['rebuild'], batch_size=options['batch_size'])
+        self.stdout.write(
+            f"✅ {'重算' if run.rebuilt else '彙總'}完成：{run.records_processed} 筆紀錄、{run.days_affected} 天，"
+            f"水位 {run.rolled_up_through:%Y-%m-%d %H:%M:%S} (保留最近 {ROLLUP_LAG} 的紀錄下次處理)"
+        )
@@ -0,0 +1,61 @@
+# casino/management/commands/simulate_slots.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from casino.paytable import GAMES, GridPaytable, ReelPaytable
+
+
+def parse_numbers(value, cast=float):
+    return [cast(v) for v in value.split(",")]
+
+
+class Command(BaseCommand):
+    help = "計算拉霸規則的返還率 (RTP)、中獎率與變異數：精確列舉與蒙地卡羅模擬"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', choices=sorted(GAMES), default="3x3", help="遊戲規則")
+        parser.add_argument('--spins', type=int, default=1_000_000, help="模擬局數 (0 = 不模擬)")
+        parser.add_argument('--seed', type=int, default=None, help="亂數種子")
+        parser.add_argument('--exact', action='store_true', help="另外列舉所有符號組合計算精確值")
+        parser.add_argument('--weights', help="以逗號分隔的符號權重，覆寫目前設定 (例如 1,2,3,4,4)")
+        parser.add_argument('--multipliers', help="(3x3) 以逗號分隔的各符號三連賠率 (例如 5,3,2,2,2)")
+
+    def build_paytable(self, options):
+        game = GAMES[options['game']]
+        weights = parse_numbers(options['weights']) if options['weights'] else game.weights
+        if len(weights) != len(game.symbols):
+            raise CommandError(f"❌ 需要 {len(game.symbols)} 個權重 ({', '.join(game.symbols)})")
+
+        if isinstance(game, GridPaytable):
+            multipliers = parse_numbers(options['multipliers'], int) if options['multipliers'] else game.multipliers
+            if len(multipliers) != len(game.symbols):
+                raise CommandError(f"❌ 需要 {len(game.symbols)} 個賠率 ({', '.join(game.symbols)})")
+            return GridPaytable(game.symbols, weights, dict(zip(game.symbols, multipliers)))
+
+        if options['multipliers']:
+            raise CommandError("❌ --multipliers 只適用於 3x3")
+        return ReelPaytable(
+            game.symbols, weights, game.symbols[game.wild],
+            game.three_of_a_kind, game.three_wilds, game.wild_pays
+        )
+
+    def report(self, label, stats):
+        line = (
+            f"{label}: RTP {stats.rtp:.4%}，中獎率 {stats.hit_rate:.4%}，"
+            f"變異數 {stats.variance:.4f} (標準差 {stats.std:.4f})"
+        )
+        if stats.spins_per_second:
+            line += f"，{stats.spins_per_second:,.0f} 局/秒"
+        elif stats.seconds is not None:
+            line += f"，{stats.seconds:.2f} 秒"
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        paytable = self.build_paytable(options)
+        self.stdout.write(
+            f"遊戲 {options['game']}：符號 {' '.join(paytable.symbols)}，權重 {list(paytable.weights)}"
+        )
+        if options['exact']:
+            self.report("精確值", paytable.exact_stats())
+        if options['spins'] > 0:
+            self.report(f"模擬 {options['spins']:,} 局", paytable.simulate(options['spins'], seed=options['seed']))
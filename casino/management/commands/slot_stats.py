@@ -0,0 +1,43 @@
+# casino/management/commands/slot_stats.py
+
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from casino.stats import outcome_stats
+from members.models import SlotMachineRecord, slot_paytable
+
+GAME_IDS = {"3x3": SlotMachineRecord.GAME_GRID, "reels": SlotMachineRecord.GAME_REELS}
+
+
+class Command(BaseCommand):
+    help = "以 SQL 彙總拉霸紀錄：各中獎線中獎率、各符號出現頻率，並與規則的理論值比較"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--game', choices=sorted(GAME_IDS), default="3x3", help="遊戲")
+        parser.add_argument('--days', type=int, default=None, help="只統計最近 N 天 (預設全部)")
+
+    def handle(self, *args, **options):
+        game = GAME_IDS[options['game']]
+        paytable = slot_paytable(game)
+        queryset = SlotMachineRecord.objects.all()
+        if options['days']:
+            queryset = queryset.filter(played_at__gte=timezone.now() - timedelta(days=options['days']))
+
+        stats = outcome_stats(game, queryset)
+        spins = stats['spins']
+        self.stdout.write(f"遊戲 {options['game']}：共 {spins:,} 局")
+        if not spins:
+            return
+
+        self.stdout.write("中獎線：實際 / 理論")
+        for name, hits, expected in zip(paytable.line_names, stats['line_hits'], paytable.line_probabilities()):
+            self.stdout.write(f"  {name}: {hits:,} 局 {hits / spins:.3%} / {expected:.3%}")
+
+        cells = spins * paytable.cells_per_spin
+        self.stdout.write("符號：出現頻率 實際 / 理論，中獎線數")
+        for symbol, count, expected, wins in zip(
+            paytable.symbols, stats['symbol_counts'], paytable.probabilities, stats['symbol_wins']
+        ):
+            self.stdout.write(f"  {symbol}: {count / cells:.3%} / {expected:.3%}，中獎 {wins:,}")
@@ -0,0 +1,331 @@
+# paytable.py
+# -------------
+# 拉霸賠率引擎：兩種拉霸遊戲的規則 (符號、權重、賠率、中獎線) 集中於此，
+# 並提供精確的返還率 (RTP) / 中獎率 / 變異數計算 (列舉所有符號組合) 與蒙地卡羅模擬。
+# 所有賠率皆以「下注的倍數」表示：贏得積分 = bet * multiplier。
+# 線上遊玩時一局 = 一次 RNG 抽出所有格子 + 一次查表 (play)；賠率表在第一次使用時才建立並由整個 process 共用。
+
+import itertools
+import math
+import random
+import threading
+import time
+from array import array
+
+import numpy as np
+
+
+class SlotStats:
+    """
+    一組規則的統計結果 (每單位下注)：
+      rtp      返還率 = E[multiplier]
+      hit_rate 中獎率 = P(multiplier > 0)
+      variance multiplier 的變異數
+    spins 為模擬局數 (精確計算時為 None)。
+    """
+
+    def __init__(self, rtp, hit_rate, variance, spins=None, seconds=None):
+        self.rtp = rtp
+        self.hit_rate = hit_rate
+        self.variance = variance
+        self.spins = spins
+        self.seconds = seconds
+
+    @property
+    def std(self):
+        return math.sqrt(max(self.variance, 0.0))
+
+    @property
+    def spins_per_second(self):
+        if not self.spins or not self.seconds:
+            return None
+        return self.spins / self.seconds
+
+    @classmethod
+    def from_sums(cls, total, total_sq, hits, weight, **kwargs):
+        mean = total / weight
+        return cls(mean, hits / weight, total_sq / weight - mean * mean, **kwargs)
+
+
+class Paytable:
+    """
+    共用部分：每局 cells_per_spin 格，各格依 weights 獨立抽出符號 (以符號索引表示)。
+    子類別實作 evaluate (單局) 與 evaluate_batch (整批 numpy 陣列，建表、精確計算與模擬使用)。
+    """
+    cells_per_spin = None
+    # 各中獎線 / 中獎組合的名稱，line_mask 的 bit i 對應 line_names[i]
+    line_names = ()
+    # 各中獎線由哪一格的符號代表 (統計各符號的中獎次數用)；None => 不屬於特定符號
+    line_anchors = ()
+
+    def __init__(self, symbols, weights):
+        if len(symbols) != len(weights):
+            raise ValueError("symbols 與 weights 長度必須相同")
+        self.symbols = tuple(symbols)
+        self.weights = tuple(weights)
+        total = sum(weights)
+        self.probabilities = tuple(w / total for w in weights)
+        self._cum_weights = tuple(itertools.accumulate(weights))
+        self._symbol_range = range(len(self.symbols))
+        self._table = None
+        self._table_lock = threading.Lock()
+
+    # --- 單局 ---
+    def spin(self, rng=random):
+        """
+        抽出一局的符號索引 (長度 cells_per_spin)，一次 RNG 呼叫。
+        """
+        return rng.choices(self._symbol_range, cum_weights=self._cum_weights, k=self.cells_per_spin)
+
+    def play(self, rng=random):
+        """
+        線上遊玩：抽出一局並查表取得倍數，返回 (cells, multiplier)。
+        """
+        cells = self.spin(rng)
+        return cells, self.payout(cells)
+
+    # --- 賠率表 ---
+    def encode(self, cells):
+        """
+        將一局的符號索引編碼為表格索引 (以符號數為底，第一格為最高位)。
+        """
+        k = len(self.symbols)
+        index = 0
+        for cell in cells:
+            index = index * k + cell
+        return index
+
+    def decode(self, index):
+        k = len(self.symbols)
+        cells = []
+        for _ in range(self.cells_per_spin):
+            index, cell = divmod(index, k)
+            cells.append(cell)
+        return cells[::-1]
+
+    def build_table(self):
+        """
+        列舉所有組合計算倍數，返回以 encode() 索引的精簡陣列 (array 'B'，倍數超過 255 時用 'H')。
+        """
+        k, n = len(self.symbols), self.cells_per_spin
+        cells = np.indices((k,) * n, dtype=np.int8).reshape(n, -1).T
+        payout = self.evaluate_batch(cells)
+        typecode = 'B' if payout.max() <= 0xFF else 'H'
+        return array(typecode, payout.astype(np.uint8 if typecode == 'B' else np.uint16).tobytes())
+
+    def payout_table(self):
+        """
+        延遲建立的賠率表 (每個 process 只建立一次)。
+        """
+        if self._table is None:
+            with self._table_lock:
+                if self._table is None:
+                    self._table = self.build_table()
+        return self._table
+
+    def payout(self, cells):
+        return self.payout_table()[self.encode(cells)]
+
+    def evaluate(self, cells):
+        raise NotImplementedError
+
+    def evaluate_batch(self, cells):
+        raise NotImplementedError
+
+    def line_mask(self, cells):
+        """
+        中獎線的位元遮罩 (存於 SlotMachineRecord.line_mask，供 SQL 統計各線中獎次數)。
+        """
+        raise NotImplementedError
+
+    def line_probabilities(self):
+        """
+        各中獎線 (line_mask 的各 bit) 的理論中獎機率：列舉所有組合 (子類別可覆寫為公式)。
+        """
+        k, n = len(self.symbols), self.cells_per_spin
+        probs = [0.0] * len(self.line_names)
+        for cells in itertools.product(range(k), repeat=n):
+            mask = self.line_mask(cells)
+            if mask:
+                prob = math.prod(self.probabilities[cell] for cell in cells)
+                for i in range(len(probs)):
+                    if mask >> i & 1:
+                        probs[i] += prob
+        return probs
+
+    def symbol_names(self, cells):
+        return [self.symbols[cell] for cell in cells]
+
+    def format_cells(self, cells):
+        """
+        顯示用的結果文字 (SlotMachineRecord.grid_result)。
+        """
+        return " / ".join(self.symbol_names(cells))
+
+    def parse_result(self, text):
+        """
+        format_cells 的反向：將舊版 grid_result 文字解析為符號索引，無法解析時返回 None。
+        """
+        names = text.replace(" / ", " ").split()
+        if len(names) != self.cells_per_spin or not set(names) <= set(self.symbols):
+            return None
+        return [self.symbols.index(name) for name in names]
+
+    # --- 精確計算：列舉所有符號組合 ---
+    def exact_stats(self):
+        """
+        列舉全部 len(symbols) ** cells_per_spin 種組合並以機率加權 (3x3 為 5^9 ≈ 195 萬種)，一次向量化計算。
+        """
+        k, n = len(self.symbols), self.cells_per_spin
+        start = time.perf_counter()
+        cells = np.indices((k,) * n, dtype=np.int8).reshape(n, -1).T
+        probs = np.asarray(self.probabilities)[cells].prod(axis=1)
+        payout = self.evaluate_batch(cells)
+        total, total_sq, hits = (probs * payout).sum(), (probs * payout ** 2).sum(), probs[payout > 0].sum()
+        return SlotStats.from_sums(
+            float(total), float(total_sq), float(hits), 1.0, seconds=time.perf_counter() - start
+        )
+
+    # --- 蒙地卡羅模擬 ---
+    def simulate(self, spins, seed=None, chunk_size=1_000_000):
+        """
+        模擬 spins 局並返回 SlotStats；每次向量化評估 chunk_size 局。
+        """
+        start = time.perf_counter()
+        total = total_sq = hits = 0.0
+        rng = np.random.default_rng(seed)
+        probs = np.asarray(self.probabilities)
+        remaining = spins
+        while remaining > 0:
+            size = min(chunk_size, remaining)
+            cells = rng.choice(len(self.symbols), size=(size, self.cells_per_spin), p=probs).astype(np.int8)
+            payout = self.evaluate_batch(cells)
+            total += float(payout.sum())
+            total_sq += float((payout.astype(np.float64) ** 2).sum())
+            hits += int(np.count_nonzero(payout))
+            remaining -= size
+        return SlotStats.from_sums(total, total_sq, hits, spins, spins=spins, seconds=time.perf_counter() - start)
+
+
+# ================================
+# 3x3 拉霸 (members.views.slot_machine_3x3_view)
+# ================================
+class GridPaytable(Paytable):
+    """
+    3x3 拉霸：9 格依權重各自抽出符號 (列優先排列)，
+    8 條中獎線 (3 列、3 行、2 斜線) 三格相同即得該符號賠率，多條線可同時中獎並累加。
+    線上遊玩查完整的 k^9 賠率表 (5 種符號約 1.95 MB，以 numpy 建立約 0.4 秒)。
+    """
+    cells_per_spin = 9
+    LINES = (
+        (0, 1, 2), (3, 4, 5), (6, 7, 8),  # rows
+        (0, 3, 6), (1, 4, 7), (2, 5, 8),  # cols
+        (0, 4, 8), (2, 4, 6),             # diag, anti-diag
+    )
+    line_names = ("第1列", "第2列", "第3列", "第1行", "第2行", "第3行", "斜線", "反斜線")
+    line_anchors = tuple(line[0] for line in LINES)
+
+    def __init__(self, symbols, weights, multipliers):
+        super().__init__(symbols, weights)
+        self.multipliers = tuple(multipliers[symbol] for symbol in self.symbols)
+
+    def evaluate(self, cells):
+        return sum(
+            self.multipliers[cells[a]]
+            for a, b, c in self.LINES
+            if cells[a] == cells[b] == cells[c]
+        )
+
+    def evaluate_batch(self, cells):
+        multipliers = np.asarray(self.multipliers, dtype=np.int64)
+        payout = np.zeros(len(cells), dtype=np.int64)
+        for a, b, c in self.LINES:
+            first = cells[:, a]
+            won = (first == cells[:, b]) & (first == cells[:, c])
+            payout += np.where(won, multipliers[first], 0)
+        return payout
+
+    def line_mask(self, cells):
+        mask = 0
+        for i, (a, b, c) in enumerate(self.LINES):
+            if cells[a] == cells[b] == cells[c]:
+                mask |= 1 << i
+        return mask
+
+    def line_probabilities(self):
+        # 每條線三格獨立 => Σ p^3 (避免列舉 5^9 種組合)
+        return [sum(p ** 3 for p in self.probabilities)] * len(self.LINES)
+
+    def to_grid(self, cells):
+        names = self.symbol_names(cells)
+        return [names[i * 3:(i + 1) * 3] for i in range(3)]
+
+    def format_cells(self, cells):
+        return " / ".join(" ".join(row) for row in self.to_grid(cells))
+
+
+# ================================
+# 三輪拉霸 (casino.views.slot_spin)
+# ================================
+class ReelPaytable(Paytable):
+    """
+    三輪拉霸：3 個捲軸的最終符號決定中獎。
+      三個相同 => wild 為 three_wilds 倍，其他符號 three_of_a_kind 倍
+      否則依 wild 出現次數給 wild_pays[次數] 倍
+    """
+    cells_per_spin = 3
+    line_names = ("三個相同", "三個 wild", "1 個 wild", "2 個 wild")
+    line_anchors = (0, 0, None, None)
+
+    def __init__(self, symbols, weights, wild, three_of_a_kind, three_wilds, wild_pays):
+        super().__init__(symbols, weights)
+        self.wild = self.symbols.index(wild)
+        self.three_of_a_kind = three_of_a_kind
+        self.three_wilds = three_wilds
+        self.wild_pays = dict(wild_pays)
+
+    def evaluate(self, cells):
+        if cells[0] == cells[1] == cells[2]:
+            return self.three_wilds if cells[0] == self.wild else self.three_of_a_kind
+        return self.wild_pays.get(sum(cell == self.wild for cell in cells), 0)
+
+    def line_mask(self, cells):
+        if cells[0] == cells[1] == cells[2]:
+            return 0b10 if cells[0] == self.wild else 0b01
+        wilds = sum(cell == self.wild for cell in cells)
+        return {1: 0b100, 2: 0b1000}.get(wilds, 0) if self.wild_pays.get(wilds) else 0
+
+    def evaluate_batch(self, cells):
+        same = (cells[:, 0] == cells[:, 1]) & (cells[:, 1] == cells[:, 2])
+        wild_count = (cells == self.wild).sum(axis=1)
+        wild_pay = np.zeros(len(cells), dtype=np.int64)
+        for count, multiplier in self.wild_pays.items():
+            wild_pay[wild_count == count] = multiplier
+        three = np.where(cells[:, 0] == self.wild, self.three_wilds, self.three_of_a_kind)
+        return np.where(same, three, wild_pay).astype(np.int64)
+
+
+# ================================
+# 目前上線的規則
+# ================================
+# 3x3：7 出現機率較低；三個7 => bet * 5，三個⭐ => bet * 3，其餘 bet * 2
+GRID_GAME = GridPaytable(
+    symbols=["7", "⭐", "🍒", "🍋", "🔔"],
+    weights=[1, 2, 3, 4, 4],
+    multipliers={"7": 5, "⭐": 3, "🍒": 2, "🍋": 2, "🔔": 2},
+)
+
+# 三輪：符號均等；三個 wild => bet * 10，其他三個相同 => bet * 5，1 / 2 個 wild => bet * 2 / 3
+REEL_GAME = ReelPaytable(
+    symbols=["symbol1", "symbol2", "symbol3", "symbol4", "wild"],
+    weights=[1, 1, 1, 1, 1],
+    wild="wild",
+    three_of_a_kind=5,
+    three_wilds=10,
+    wild_pays={1: 2, 2: 3},
+)
+
+GAMES = {
+    "3x3": GRID_GAME,
+    "reels": REEL_GAME,
+}
@@ -0,0 +1,161 @@
+# rollups.py
+# -------------
+# 拉霸每日彙總：依水位 (SlotRollupState.rolled_up_through) 只處理新的 SlotMachineRecord，
+# 以一次 GROUP BY (日期, 會員, 遊戲) 累加到 SlotMemberDailyStat，再重算受影響日期的 SlotDailyStat。
+# 後台報表只讀彙總表，查詢一年資料不需掃描紀錄表。
+# 注意：彙總後才修改 / 刪除的紀錄不會反映在彙總表，需以 rollup_slot_stats --rebuild 重算。
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from members.models import SlotDailyStat, SlotMachineRecord, SlotMemberDailyStat, SlotRollupRun, SlotRollupState
+
+# 只彙總 played_at 早於 (現在 - ROLLUP_LAG) 的紀錄：尚未提交的交易中較早的 played_at 不會被水位跳過
+ROLLUP_LAG = timedelta(minutes=5)
+
+STAT_FIELDS = ['spins', 'total_bet', 'total_win']
+
+
+# 1. 增量彙總
+def rollup_slot_stats(now=None, rebuild=False, batch_size=1000):
+    """
+    彙總上次水位之後、(now - ROLLUP_LAG) 之前的紀錄，返回新建立的 SlotRollupRun。
+    rebuild=True 時清除所有彙總後從頭重算。
+    """
+    now = now or timezone.now()
+    upto = now - ROLLUP_LAG
+    # 狀態列在交易外建立：第一次同時執行時只有一方新增成功，另一方取得同一列
+    SlotRollupState.objects.get_or_create(pk=SlotRollupState.SINGLETON_ID)
+    with transaction.atomic():
+        # 先鎖定狀態列再讀取水位：同時執行的排程 (含第一次執行與重算) 依序進行，不會重複累加
+        state = SlotRollupState.objects.select_for_update().get(pk=SlotRollupState.SINGLETON_ID)
+        since = None if rebuild else state.rolled_up_through
+        if rebuild:
+            SlotMemberDailyStat.objects.all().delete()
+            SlotDailyStat.objects.all().delete()
+        if since is not None:
+            upto = max(upto, since)
+
+        records = SlotMachineRecord.objects.filter(played_at__lte=upto)
+        if since is not None:
+            records = records.filter(played_at__gt=since)
+        rows = list(
+            records.annotate(day=TruncDate('played_at'))
+            .values('day', 'user_id', 'game')
+            .annotate(spins=Count('pk'), total_bet=Sum('bet'), total_win=Sum('win_points'))
+            .order_by()
+        )
+
+        days = {row['day'] for row in rows}
+        existing = {
+            (stat.day, stat.user_id, stat.game): stat
+            for stat in SlotMemberDailyStat.objects.filter(
+                day__in=days, user_id__in={row['user_id'] for row in rows}
+            )
+        }
+        to_create, to_update = [], []
+        for row in rows:
+            stat = existing.get((row['day'], row['user_id'], row['game']))
+            if stat is None:
+                to_create.append(SlotMemberDailyStat(
+                    day=row['day'], user_id=row['user_id'], game=row['game'],
+                    **{field: row[field] for field in STAT_FIELDS}
+                ))
+            else:
+                for field in STAT_FIELDS:
+                    setattr(stat, field, getattr(stat, field) + row[field])
+                to_update.append(stat)
+        SlotMemberDailyStat.objects.bulk_create(to_create, batch_size=batch_size)
+        SlotMemberDailyStat.objects.bulk_update(to_update, STAT_FIELDS, batch_size=batch_size)
+        refresh_daily_stats(days)
+
+        state.rolled_up_through = upto
+        state.save(update_fields=['rolled_up_through', 'updated_at'])
+        return SlotRollupRun.objects.create(
+            ran_at=now,
+            rolled_up_through=upto,
+            records_processed=sum(row['spins'] for row in rows),
+            days_affected=len(days),
+            rebuilt=rebuild,
+        )
+
+
+def refresh_daily_stats(days):
+    """
+    由 SlotMemberDailyStat 重新計算指定日期的 SlotDailyStat (一次 GROUP BY + 一次 upsert)。
+    """
+    if not days:
+        return
+    rows = (
+        SlotMemberDailyStat.objects.filter(day__in=days)
+        .values('day', 'game')
+        .annotate(
+            total_spins=Sum('spins'), bet=Sum('total_bet'), win=Sum('total_win'), players=Count('user_id')
+        )
+        .order_by()
+    )
+    SlotDailyStat.objects.bulk_create(
+        [
+            SlotDailyStat(
+                day=row['day'], game=row['game'], spins=row['total_spins'],
+                total_bet=row['bet'], total_win=row['win'], unique_players=row['players'],
+            )
+            for row in rows
+        ],
+        update_conflicts=True,
+        unique_fields=['day', 'game'],
+        update_fields=STAT_FIELDS + ['unique_players'],
+    )
+
+
+# 2. 報表 (後台只讀彙總表)
+def last_rollup():
+    return SlotRollupRun.objects.order_by('-rolled_up_through', '-id').first()
+
+
+# 報表列的欄位：spins, bet (下注), win (贏分), house_net (消耗積分 = 下注 - 贏分)
+def daily_report(start, end):
+    """
+    start ~ end (含) 每天的合計 (各遊戲加總)，新日期在前。
+    unique_players 為各遊戲玩家數相加 (同一會員玩兩種遊戲會計兩次)。
+    """
+    return list(
+        SlotDailyStat.objects.filter(day__range=(start, end))
+        .values('day')
+        .annotate(
+            spins=Sum('spins'), bet=Sum('total_bet'), win=Sum('total_win'),
+            players=Sum('unique_players'), house_net=Sum(F('total_bet') - F('total_win')),
+        )
+        .order_by('-day')
+    )
+
+
+def game_totals(start, end):
+    return list(
+        SlotDailyStat.objects.filter(day__range=(start, end))
+        .values('game')
+        .annotate(
+            spins=Sum('spins'), bet=Sum('total_bet'), win=Sum('total_win'),
+            house_net=Sum(F('total_bet') - F('total_win')),
+        )
+        .order_by('game')
+    )
+
+
+def top_members(start, end, limit=10):
+    """
+    期間內消耗積分 (下注 - 贏分) 最多的會員。
+    """
+    return list(
+        SlotMemberDailyStat.objects.filter(day__range=(start, end))
+        .values('user_id', 'user__username')
+        .annotate(
+            spins=Sum('spins'), bet=Sum('total_bet'), win=Sum('total_win'),
+            house_net=Sum(F('total_bet') - F('total_win')),
+        )
+        .order_by('-house_net')[:limit]
+    )
@@ -0,0 +1,53 @@
+# stats.py
+# -------------
+# 拉霸結果統計：以 SlotMachineRecord 的盤面編碼 (grid_code) 與中獎線遮罩 (line_mask) 直接在資料庫彙總，
+# 一次 aggregate 查詢取得各中獎線、各符號的出現 / 中獎次數，不需把紀錄讀回 Python 解析。
+
+from django.db.models import Count, F, Value
+from django.db.models.functions import Mod
+from django.db.models.lookups import Exact
+
+from members.models import SlotMachineRecord, slot_paytable
+
+
+def cell_symbol(paytable, position):
+    """
+    第 position 格的符號索引 = (grid_code / k^(n-1-position)) % k (整數除法，與 Paytable.encode 對應)。
+    """
+    k, n = len(paytable.symbols), paytable.cells_per_spin
+    return Mod(F('grid_code') / Value(k ** (n - 1 - position)), Value(k))
+
+
+def line_won(bit):
+    return Exact(F('line_mask').bitand(1 << bit), 1 << bit)
+
+
+def outcome_stats(game, queryset=None):
+    """
+    返回 {spins, line_hits: [各線中獎局數], symbol_counts: [各符號出現格數], symbol_wins: [各符號的中獎線數]}。
+    symbol_wins 依 Paytable.line_anchors 的格子判斷中獎符號 (三輪拉霸的 wild 組合不計)。
+    """
+    paytable = slot_paytable(game)
+    queryset = (queryset if queryset is not None else SlotMachineRecord.objects.all()).filter(game=game)
+    k, n = len(paytable.symbols), paytable.cells_per_spin
+    anchored = [(bit, cell) for bit, cell in enumerate(paytable.line_anchors) if cell is not None]
+
+    aggregates = {'spins': Count('pk')}
+    for bit in range(len(paytable.line_names)):
+        aggregates[f'line_{bit}'] = Count('pk', filter=line_won(bit))
+    for position in range(n):
+        for symbol in range(k):
+            aggregates[f'cell_{position}_{symbol}'] = Count('pk', filter=Exact(cell_symbol(paytable, position), symbol))
+    for bit, cell in anchored:
+        for symbol in range(k):
+            aggregates[f'win_{bit}_{symbol}'] = Count(
+                'pk', filter=line_won(bit) & Exact(cell_symbol(paytable, cell), symbol)
+            )
+    row = queryset.aggregate(**aggregates)
+
+    return {
+        'spins': row['spins'],
+        'line_hits': [row[f'line_{bit}'] for bit in range(len(paytable.line_names))],
+        'symbol_counts': [sum(row[f'cell_{p}_{s}'] for p in range(n)) for s in range(k)],
+        'symbol_wins': [sum(row[f'win_{bit}_{s}'] for bit, _ in anchored) for s in range(k)],
+    }
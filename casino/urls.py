@@ -1,8 +1,9 @@
 # casino/urls.py
 from django.urls import path
-from .views import slot_game, slot_spin
+from .views import slot_game, slot_spin, slot_spin_batch
 
 urlpatterns = [
     path('slot/', slot_game, name='slot_game'),
     path('slot/spin/', slot_spin, name='slot_spin'),
+    path('slot/spin/batch/', slot_spin_batch, name='slot_spin_batch'),
 ]
@@ -1,72 +1,109 @@
 from django.shortcuts import render
 from django.http import JsonResponse
-from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
-from django.db.models import Sum
 from django.utils import timezone
 import random
+from datetime import timedelta
 
-from members.models import ConsumptionRecord, RedemptionRecord, SlotMachineRecord
+from members.models import SlotMachineRecord
+from members.member_cache import get_member_summary, invalidate_member_cache
+from members.points import apply_slot_batch, get_available_points, spend_points, InsufficientPointsError
+
+from .paytable import REEL_GAME
+
+# 自動轉一次請求最多的局數 (slot_game.html 的自動轉按鈕最多 100 次)
+MAX_AUTO_SPINS = 100
+
+# 回應中捲軸結果的格式版本 (POST 參數 format, 未提供時為 1, 相容舊版前端)：
+#   1 => reelSequences: 每局 3 條序列, 每條 12 個符號名稱 (最後一個為最終符號)
+#   2 => reels: 每局 3 個最終符號的索引 (一格一個字元, 依序串接) + seed:
+#        轉動動畫的前 11 個符號由前端以 seed 決定性產生 (mulberry32, 見 slot_game.html)，伺服器不產生
+WIRE_FORMATS = (1, 2)
 
 @login_required
 def slot_game(request):
     """
     顯示「拉霸機遊戲頁面」, 需要使用者已登入
-    傳入 user_id, points 到模板
+    傳入 points 到模板 (拉霸 API 以 session 辨識會員)
     """
-    points = get_user_current_points(request.user)
+    points = get_member_summary(request.user)['available_points']
     return render(request, 'casino/slot_game.html', {
-        "user_id": request.user.id,
-        "points": points
+        "points": points,
+        "reel_symbols": list(REEL_GAME.symbols),  # format 2 的符號索引表
     })
 
 
 def get_user_current_points(user: User) -> int:
     """
-    動態計算使用者目前可用積分
-    (消費回饋 + 拉霸贏分) - (兌換 + 拉霸下注)
-    """
-    total_consumption = (
-        user.consumption_records.aggregate(sum=Sum('reward_points'))['sum'] or 0
-    )
-    total_slot_win = (
-        user.slot_records.aggregate(sum=Sum('win_points'))['sum'] or 0
-    )
-    total_redemption = (
-        user.redemption_records.aggregate(sum=Sum('points_used'))['sum'] or 0
-    )
-    total_slot_bet = (
-        user.slot_records.aggregate(sum=Sum('bet'))['sum'] or 0
-    )
-    return (total_consumption + total_slot_win) - (total_redemption + total_slot_bet)
-
-
-@csrf_exempt
+    使用者目前可用積分
+    (消費回饋 + 拉霸贏分) - (兌換 + 拉霸下注 + 已到期)，由 MemberBalance 以主鍵查詢取得
+    """
+    return get_available_points(user)
+
+
+def build_reel_sequences(final_symbols):
+    """
+    產生 3 條序列, 每條 12 個符號 (前面 11 個僅供轉動動畫, 第 12 個為最終符號)
+    """
+    return [
+        [random.choice(REEL_GAME.symbols) for _ in range(11)] + [final_sym]
+        for final_sym in final_symbols
+    ]
+
+
+def compact_reels(spins):
+    """
+    format 2：將各局的最終符號索引串接成字串 (符號數 < 10, 一格一個字元)，並附上動畫用的 seed。
+    """
+    return {
+        "reels": "".join(str(cell) for cells in spins for cell in cells),
+        "seed": random.getrandbits(32),
+    }
+
+
+def parse_wire_format(request):
+    """
+    解析 POST 參數 format；返回 (版本, 錯誤的 JsonResponse)。
+    """
+    value = request.POST.get("format", "1")
+    if value not in {str(v) for v in WIRE_FORMATS}:
+        return None, JsonResponse({"error": f"Unsupported format, use one of {list(WIRE_FORMATS)}."}, status=400)
+    return int(value), None
+
+
+def parse_positive_int(value, name, required=True):
+    """
+    解析 POST 參數為正整數；返回 (數值, 錯誤的 JsonResponse)。未提供且非必要時返回 (None, None)。
+    """
+    if value in (None, ""):
+        if required:
+            return None, JsonResponse({"error": f"Missing {name}."}, status=400)
+        return None, None
+    try:
+        number = int(value)
+    except ValueError:
+        return None, JsonResponse({"error": f"Invalid {name} value."}, status=400)
+    if number <= 0:
+        return None, JsonResponse({"error": f"{name.capitalize()} must be a positive integer."}, status=400)
+    return number, None
+
+
+@login_required
 def slot_spin(request):
     """
-    拉霸機後端 API:
-      1) 接收 user_id, bet
-      2) 檢查積分, 不足則報錯
-      3) 為每個捲軸產生「序列」(預設 12 個符號)
-         - 最後一個符號當「最終符號」做計算
-      4) 計算 win_amount, 寫入 DB
-      5) 回傳 reelSequences, win_amount, current_points
+    拉霸機後端 API, 需要使用者已登入並附上 CSRF token:
+      1) 接收 bet, 選填 format (見 WIRE_FORMATS) (會員為 request.user)
+      2) 鎖定會員餘額並檢查積分, 不足則報錯
+      3) 產生 3 個最終符號, 計算 win_amount, 寫入 DB
+      4) 回傳捲軸結果 (format 1: reelSequences / format 2: reels + seed), win_amount, current_points
     """
     if request.method != 'POST':
         return JsonResponse({"error": "Method not allowed, use POST."}, status=405)
 
-    user_id = request.POST.get("user_id")
+    user = request.user
     bet_str = request.POST.get("bet", "10")
 
-    if not user_id:
-        return JsonResponse({"error": "Missing user_id."}, status=400)
-
-    try:
-        user = User.objects.get(pk=user_id)
-    except User.DoesNotExist:
-        return JsonResponse({"error": "User not found."}, status=404)
-
     try:
         bet = int(bet_str)
         if bet <= 0:
@@ -74,55 +111,132 @@ def slot_spin(request):
     except ValueError:
         return JsonResponse({"error": "Invalid bet value."}, status=400)
 
-    current_points = get_user_current_points(user)
-    if current_points < bet:
-        return JsonResponse({"error": "Not enough points."}, status=400)
+    wire_format, error = parse_wire_format(request)
+    if error:
+        return error
 
-    # 產生 3 條序列, 每條 12 個符號
-    possible_symbols = ["symbol1","symbol2","symbol3","symbol4","wild"]
-    reel_sequences = []
-    final_symbols = []
-
-    for i in range(3):
-        seq = []
-        # 前面 11 個隨機
-        for _ in range(11):
-            seq.append(random.choice(possible_symbols))
-        # 第 12 個符號 => 最終符號, 也決定中獎
-        final_sym = random.choice(possible_symbols)
-        seq.append(final_sym)
-        reel_sequences.append(seq)
-        final_symbols.append(final_sym)
-
-    # 計算中獎
-    win_amount = 0
-    if final_symbols[0] == final_symbols[1] == final_symbols[2]:
-        if final_symbols[0] == "wild":
-            win_amount = bet * 10
-        else:
-            win_amount = bet * 5
-    else:
-        wild_count = final_symbols.count("wild")
-        if wild_count == 1:
-            win_amount = bet * 2
-        elif wild_count == 2:
-            win_amount = bet * 3
-
-    # 寫入 DB
-    grid_result = " / ".join(final_symbols)
-    SlotMachineRecord.objects.create(
-        user=user,
-        bet=bet,
-        grid_result=grid_result,
-        win_points=win_amount,
-        played_at=timezone.now()
-    )
+    try:
+        # 鎖定會員餘額 => 檢查積分 => 產生結果並寫入，全部在同一個交易中完成
+        with spend_points(user, bet):
+            # 3 個最終符號決定中獎 (規則見 casino/paytable.py 的 REEL_GAME)
+            cells, multiplier = REEL_GAME.play(random)
+            final_symbols = REEL_GAME.symbol_names(cells)
+
+            # 計算中獎
+            win_amount = bet * multiplier
+
+            # 寫入 DB (盤面以編碼儲存)
+            SlotMachineRecord.for_spin(
+                SlotMachineRecord.GAME_REELS, cells,
+                user=user,
+                bet=bet,
+                win_points=win_amount,
+                played_at=timezone.now()
+            ).save()
+    except InsufficientPointsError:
+        return JsonResponse({"error": "Not enough points."}, status=400)
 
     new_points = get_user_current_points(user)
 
     data = {
-        "reelSequences": reel_sequences,  # 3 條序列
+        "v": wire_format,
         "win_amount": win_amount,
         "current_points": new_points
     }
+    if wire_format == 1:
+        data["reelSequences"] = build_reel_sequences(final_symbols)  # 3 條序列
+    else:
+        data.update(compact_reels([cells]))
+    return JsonResponse(data)
+
+
+@login_required
+def slot_spin_batch(request):
+    """
+    自動轉後端 API (一次請求 n 局, 取代逐局呼叫 slot_spin), 需要使用者已登入並附上 CSRF token:
+      1) 接收 bet, n (1 ~ MAX_AUTO_SPINS), 選填 stop_loss / stop_win / format (會員為 request.user)
+      2) 鎖定會員餘額一次, 在記憶體中逐局計算:
+         - 積分不足以再下注 => 停止
+         - 累計淨輸 (下注 - 贏分) >= stop_loss => 停止
+         - 累計淨贏 (贏分 - 下注) >= stop_win => 停止
+      3) 所有局以一次 bulk_create 寫入 SlotMachineRecord, 再一次更新 PointLot / MemberBalance
+      4) 回傳每局的捲軸結果與贏分 (依序排列), 停止原因與 current_points
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "Method not allowed, use POST."}, status=405)
+
+    user = request.user
+    bet, error = parse_positive_int(request.POST.get("bet", "10"), "bet")
+    if error:
+        return error
+    spins, error = parse_positive_int(request.POST.get("n"), "n")
+    if error:
+        return error
+    if spins > MAX_AUTO_SPINS:
+        return JsonResponse({"error": f"n must be at most {MAX_AUTO_SPINS}."}, status=400)
+    stop_loss, error = parse_positive_int(request.POST.get("stop_loss"), "stop_loss", required=False)
+    if error:
+        return error
+    stop_win, error = parse_positive_int(request.POST.get("stop_win"), "stop_win", required=False)
+    if error:
+        return error
+    wire_format, error = parse_wire_format(request)
+    if error:
+        return error
+
+    spin_cells, wins, records = [], [], []
+    stopped = None
+    try:
+        # 至少要能下注一局；鎖定期間同一會員的其他扣款會等待本批次完成
+        with spend_points(user, bet) as balance:
+            available = balance.available_points
+            net = 0  # 累計 贏分 - 下注
+            now = timezone.now()
+            for i in range(spins):
+                if available < bet:
+                    stopped = "insufficient_points"
+                    break
+                cells, multiplier = REEL_GAME.play(random)
+                win_amount = bet * multiplier
+                available += win_amount - bet
+                net += win_amount - bet
+
+                spin_cells.append(cells)
+                wins.append(win_amount)
+                records.append(SlotMachineRecord.for_spin(
+                    SlotMachineRecord.GAME_REELS, cells,
+                    user=user,
+                    bet=bet,
+                    win_points=win_amount,
+                    # 每局相差 1 微秒：保持歷史排序，重建 PointLot 時也依相同順序重播
+                    played_at=now + timedelta(microseconds=i)
+                ))
+                if stop_loss is not None and -net >= stop_loss:
+                    stopped = "stop_loss"
+                    break
+                if stop_win is not None and net >= stop_win:
+                    stopped = "stop_win"
+                    break
+
+            # bulk_create 不觸發 signal => 自行更新積分批次與餘額, 並使會員摘要快取失效
+            SlotMachineRecord.objects.bulk_create(records)
+            apply_slot_batch(user.pk, records, now)
+            invalidate_member_cache(user.pk)
+    except InsufficientPointsError:
+        return JsonResponse({"error": "Not enough points."}, status=400)
+
+    data = {
+        "v": wire_format,
+        "wins": wins,  # 每局贏分
+        "spins": len(records),
+        "total_bet": bet * len(records),
+        "total_win": sum(wins),
+        "stopped": stopped,
+        "current_points": available,
+    }
+    if wire_format == 1:
+        # 每局 3 條序列
+        data["reelSequences"] = [build_reel_sequences(REEL_GAME.symbol_names(cells)) for cells in spin_cells]
+    else:
+        data.update(compact_reels(spin_cells))
     return JsonResponse(data)
@@ -2,10 +2,69 @@ from django.contrib import admin
 
 # Register your models here.
 from django.contrib import admin
-from .models import GoogleSheetsSyncLog
+from .models import (
+    GoogleSheetsSyncLog, GoogleSheetsSyncWarning, MemberBalance, BackgroundJob, PointLot, PointExpiryRun,
+    ExpiringPointsSummary, SlotRollupRun
+)
+
+class GoogleSheetsSyncWarningInline(admin.TabularInline):
+    model = GoogleSheetsSyncWarning
+    fields = ("message",)
+    readonly_fields = ("message",)
+    extra = 0
+    can_delete = False
 
 @admin.register(GoogleSheetsSyncLog)
 class GoogleSheetsSyncLogAdmin(admin.ModelAdmin):
-    list_display = ("sync_time", "status", "message")
-    list_filter = ("status",)
+    list_display = ("sync_time", "sync_type", "status", "rows_fetched", "rows_inserted",
+                    "rows_deleted", "rows_skipped", "warning_count", "total_seconds", "throughput")
+    list_filter = ("sync_type", "status")
     search_fields = ("message",)
+    date_hierarchy = "sync_time"
+    readonly_fields = ("sync_type", "status", "message", "rows_fetched", "rows_inserted",
+                       "rows_updated", "rows_deleted", "rows_skipped", "rows_failed",
+                       "warning_count", "fetch_seconds", "resolve_seconds", "write_seconds",
+                       "commit_seconds", "total_seconds")
+    inlines = [GoogleSheetsSyncWarningInline]
+
+    @admin.display(description="每秒列數")
+    def throughput(self, obj):
+        return f"{obj.rows_per_second:.0f}"
+
+@admin.register(MemberBalance)
+class MemberBalanceAdmin(admin.ModelAdmin):
+    list_display = ("user", "available_points", "earned_points", "redeemed_points",
+                    "slot_bet_points", "slot_win_points", "expired_points", "updated_at")
+    search_fields = ("user__username", "user__email")
+    readonly_fields = ("earned_points", "redeemed_points", "slot_bet_points",
+                       "slot_win_points", "expired_points", "available_points", "updated_at")
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ("id", "kind", "status", "rows_processed", "created_at", "started_at", "finished_at")
+    list_filter = ("kind", "status")
+    readonly_fields = ("rows_processed", "message", "started_at", "finished_at")
+
+
+@admin.register(PointLot)
+class PointLotAdmin(admin.ModelAdmin):
+    list_display = ("user", "points", "remaining_points", "expired_points", "earned_at", "expires_at")
+    search_fields = ("user__username", "user__email")
+    date_hierarchy = "expires_at"
+    readonly_fields = ("user", "consumption", "slot_record", "points", "remaining_points",
+                       "expired_points", "earned_at", "expires_at")
+
+@admin.register(PointExpiryRun)
+class PointExpiryRunAdmin(admin.ModelAdmin):
+    list_display = ("ran_at", "expired_through", "members_affected", "lots_expired", "points_expired",
+                    "expiring_soon_members", "notifications_sent")
+
+@admin.register(ExpiringPointsSummary)
+class ExpiringPointsSummaryAdmin(admin.ModelAdmin):
+    list_display = ("user", "points", "next_expiry", "computed_at", "notified_at")
+    search_fields = ("user__username", "user__email")
+    readonly_fields = ("user", "points", "next_expiry", "window_end", "computed_at", "notified_at")
+
+@admin.register(SlotRollupRun)
+class SlotRollupRunAdmin(admin.ModelAdmin):
+    list_display = ("ran_at", "rolled_up_through", "records_processed", "days_affected", "rebuilt")
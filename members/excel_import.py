@@ -0,0 +1,114 @@
+# excel_import.py
+# -------------
+# 超級管理者上傳的 Excel (.xlsx) 銷售明細匯入：openpyxl read_only 模式逐列串流讀取，
+# 沿用 Google Sheets 同步的欄位對應、資料清洗與自然鍵 (sheet_sync)，每批 bulk_create。
+# 記憶體用量只與批次大小有關 (20 萬列的活頁簿也不會整份載入)。
+# 與 Google Sheets 同步不同：上傳的檔案只新增紀錄，不會刪除檔案中沒有的紀錄；同一檔案重複上傳不會重複新增。
+
+from zipfile import BadZipFile
+
+import openpyxl
+from django.conf import settings
+from openpyxl.utils.exceptions import InvalidFileException
+
+from .models import ConsumptionRecord, GoogleSheetsSyncLog
+from .row_cleaning import RowCleaner, safe_strip
+from .sales_time import SalesTimeParser
+from .sheet_sync import import_batch, iter_batches, iter_sheet_rows
+from .sync_metrics import SyncMetrics
+
+# 標題列必須包含的欄位 (與 Google Sheets 相同；「銷售品項」可省略)
+REQUIRED_COLUMNS = ("會員 Email", "消費金額(元)", "銷售時間")
+
+
+class ExcelImportError(Exception):
+    """
+    無法讀取檔案、缺少欄位或匯入中途失敗。
+    """
+
+
+# 1. 串流讀取活頁簿
+def iter_workbook_records(file):
+    """
+    逐列產生第一個工作表的紀錄 dict (key 為標題列)，整列空白的資料列會略過。
+    file 可為路徑或檔案物件 (例如 Django 的 UploadedFile)。
+    """
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = ["" if name is None else safe_strip(name) for name in next(rows, ())]
+        missing = [name for name in REQUIRED_COLUMNS if name not in header]
+        if missing:
+            raise ExcelImportError(f"❌ Excel 標題列缺少欄位：{'、'.join(missing)}")
+
+        for row in rows:
+            if all(cell is None or str(cell).strip() == "" for cell in row):
+                continue
+            cells = ["" if cell is None else cell for cell in row]
+            cells += [""] * (len(header) - len(cells))
+            yield dict(zip(header, cells))
+    finally:
+        # read_only 模式會保持檔案開啟，需明確關閉
+        workbook.close()
+
+
+# 2. 匯入
+def import_excel_sales(file, batch_size=None, progress=None):
+    """
+    匯入上傳的銷售明細並返回結果訊息；結果寫入 GoogleSheetsSyncLog (類型為 Excel 匯入)。
+    各批獨立提交：中途失敗時已提交的批次保留，重新上傳同一檔案會略過已匯入的列。
+    progress(已讀取列數) 供背景工作回報進度。失敗時拋出 ExcelImportError。
+    """
+    batch_size = batch_size or settings.SHEETS_IMPORT_BATCH_SIZE
+    metrics = SyncMetrics(GoogleSheetsSyncLog.SYNC_TYPE_EXCEL_IMPORT)
+    source = ConsumptionRecord.SOURCE_EXCEL
+    cleaner = RowCleaner()
+    time_parser = SalesTimeParser()
+    seen_keys = set()
+    already_imported = 0
+
+    try:
+        records = metrics.timed_iter(iter_workbook_records(file))
+        rows = iter_sheet_rows(records, seen_keys, cleaner, chunk_size=batch_size, source=source)
+        for batch in iter_batches(rows, batch_size):
+            with metrics.atomic():
+                # 只查詢這一批的鍵，不需載入所有既有紀錄
+                existing = set(
+                    ConsumptionRecord.objects.filter(sheet_row_key__in=[key for key, _ in batch])
+                    .values_list('sheet_row_key', flat=True)
+                )
+                new_rows = [(key, row) for key, row in batch if key not in existing]
+                already_imported += len(batch) - len(new_rows)
+                if new_rows:
+                    import_batch(new_rows, {}, batch_size, metrics, time_parser, source)
+            if progress:
+                progress(len(seen_keys))
+        metrics.add('fetched', len(seen_keys))
+    except Exception as e:
+        metrics.counts['fetched'] = len(seen_keys)
+        if isinstance(e, ExcelImportError):
+            message = str(e)
+        elif isinstance(e, (InvalidFileException, BadZipFile)):
+            message = f"❌ 無法讀取 Excel 檔案 (請確認為 .xlsx 格式): {e}"
+        else:
+            message = f"❌ Excel 匯入失敗 (已新增 {metrics.counts['inserted']} 筆): {e}"
+        metrics.write_log("失敗", message)
+        raise ExcelImportError(message) from e
+
+    cleaner.log_summary()
+    if cleaner.issues:
+        metrics.warn(f"⚠️ 消費金額無法解析，已以 0 計算：{cleaner.summary()}。")
+    if not seen_keys:
+        message = "⚠️ Excel 檔案中沒有任何資料列。\n"
+        metrics.write_log("失敗", message)
+        return message
+
+    counts = metrics.counts
+    message = "✅ Excel 匯入完成！\n"
+    message += metrics.summary_warnings()
+    message += (
+        f"新增 {counts['inserted']} 筆、已匯入過 {already_imported} 筆、略過 {counts['skipped']} 筆、"
+        f"時間無法解析 {counts['failed']} 筆 (共 {counts['fetched']} 列)。\n"
+    )
+    metrics.write_log("成功", message)
+    return message
@@ -0,0 +1,151 @@
+# expiry.py
+# -------------
+# 每晚的積分到期批次作業：分批將過期批次轉為到期、以一次 GROUP BY 預先計算「即將到期」摘要、寄出到期提醒
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Min, Q, Sum
+from django.utils import timezone
+
+from .member_cache import invalidate_member_cache
+from .models import ExpiringPointsSummary, MemberBalance, PointLot
+from .points import EXPIRING_SOON_DAYS, get_member_balance
+
+# 同一位會員兩次到期提醒之間至少間隔
+NOTIFY_INTERVAL = timedelta(days=7)
+
+
+# 1. 分批到期
+def expire_due_lots(now=None, batch_size=500):
+    """
+    將所有「仍有剩餘且已過期」的批次轉為到期 (走 pointlot_open_expiry_idx 部分索引，不掃描完整歷史)。
+    每 batch_size 位會員一個交易：依主鍵順序鎖定 MemberBalance (與 spend_points 相同的鎖)，
+    一次讀出該批會員的過期批次，bulk_update 批次與餘額。
+    返回 (受影響會員數, 到期批次數, 到期積分)。
+    """
+    now = now or timezone.now()
+    due = PointLot.objects.filter(remaining_points__gt=0, expires_at__lte=now)
+    user_ids = sorted(set(due.order_by().values_list('user_id', flat=True)))
+
+    lots_expired = points_expired = 0
+    for start in range(0, len(user_ids), batch_size):
+        chunk = user_ids[start:start + batch_size]
+        # 尚未建立 MemberBalance 的會員先補建 (補建時會重播紀錄並一併到期)
+        existing = set(MemberBalance.objects.filter(pk__in=chunk).values_list('pk', flat=True))
+        for user_id in set(chunk) - existing:
+            get_member_balance(user_id)
+
+        with transaction.atomic():
+            balances = {
+                balance.pk: balance
+                for balance in MemberBalance.objects.select_for_update().filter(pk__in=chunk).order_by('pk')
+            }
+            lots = list(due.filter(user_id__in=chunk))
+            per_user = defaultdict(int)
+            for lot in lots:
+                per_user[lot.user_id] += lot.remaining_points
+                lot.expired_points += lot.remaining_points
+                lot.remaining_points = 0
+            PointLot.objects.bulk_update(lots, ['remaining_points', 'expired_points'], batch_size=1000)
+
+            for user_id, points in per_user.items():
+                balance = balances[user_id]
+                balance.expired_points += points
+                balance.available_points -= points
+                balance.updated_at = now
+                invalidate_member_cache(user_id)
+            MemberBalance.objects.bulk_update(
+                [balances[user_id] for user_id in per_user],
+                ['expired_points', 'available_points', 'updated_at'],
+                batch_size=1000
+            )
+        lots_expired += len(lots)
+        points_expired += sum(per_user.values())
+    return len(user_ids), lots_expired, points_expired
+
+
+# 2. 「即將到期」摘要
+def precompute_expiring_summaries(now=None, days=EXPIRING_SOON_DAYS):
+    """
+    以一次 GROUP BY 計算所有會員在 days 天內到期、尚未使用的積分，upsert 到 ExpiringPointsSummary，
+    並刪除本次未出現的舊資料列 (保留 notified_at)。返回有即將到期積分的會員數。
+    """
+    now = now or timezone.now()
+    window_end = now + timedelta(days=days)
+    rows = (
+        PointLot.objects
+        .filter(remaining_points__gt=0, expires_at__gt=now, expires_at__lte=window_end)
+        .values('user_id')
+        .annotate(points=Sum('remaining_points'), next_expiry=Min('expires_at'))
+        .order_by()
+    )
+    summaries = [
+        ExpiringPointsSummary(
+            user_id=row['user_id'],
+            points=row['points'],
+            next_expiry=row['next_expiry'],
+            window_end=window_end,
+            computed_at=now
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        ExpiringPointsSummary.objects.bulk_create(
+            summaries,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['points', 'next_expiry', 'window_end', 'computed_at'],
+        )
+        ExpiringPointsSummary.objects.filter(computed_at__lt=now).delete()
+    return len(summaries)
+
+
+# 3. 到期提醒
+def expiry_notification(summary):
+    return EmailMessage(
+        subject="【會員系統】您有積分即將到期",
+        body=(
+            f"{summary.user.username} 您好：\n\n"
+            f"您有 {summary.points} 積分將於 {timezone.localtime(summary.next_expiry):%Y-%m-%d} 起陸續到期，"
+            f"請在 {timezone.localtime(summary.window_end):%Y-%m-%d} 前使用。\n"
+        ),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[summary.user.email],
+    )
+
+
+def send_expiry_notifications(now=None, batch_size=100):
+    """
+    依預先計算的摘要寄出到期提醒：同一個郵件連線分批寄送，
+    同一位會員 NOTIFY_INTERVAL 內只提醒一次。返回寄出封數。
+    """
+    now = now or timezone.now()
+    pending = (
+        ExpiringPointsSummary.objects
+        .filter(Q(notified_at__isnull=True) | Q(notified_at__lt=now - NOTIFY_INTERVAL))
+        .exclude(user__email='')
+        .select_related('user')
+        .order_by('pk')
+    )
+    sent = 0
+    batch = []
+    with get_connection() as connection:
+        for summary in pending.iterator(chunk_size=batch_size):
+            batch.append(summary)
+            if len(batch) >= batch_size:
+                sent += _send_batch(connection, batch, now)
+                batch = []
+        if batch:
+            sent += _send_batch(connection, batch, now)
+    return sent
+
+
+def _send_batch(connection, summaries, now):
+    sent = connection.send_messages([expiry_notification(summary) for summary in summaries]) or 0
+    ExpiringPointsSummary.objects.filter(pk__in=[summary.pk for summary in summaries]).update(notified_at=now)
+    return sent
@@ -0,0 +1,261 @@
+# exports.py
+# -------------
+# 會計用的串流匯出 (CSV / XLSX)：以 values_list + iterator(chunk_size) 逐批讀取，不建立 model 實例，
+# 記憶體用量與資料表大小無關。
+#   - CSV：StreamingHttpResponse 邊查詢邊輸出
+#   - XLSX：openpyxl write_only 模式逐列寫入暫存檔 (不保留在記憶體)，寫完後以 FileResponse 分段傳送。
+#     .xlsx 是 zip 檔，整份寫完前無法送出第一個位元組 => 只有 XLSX_SYNC_MAX_ROWS 列以內在 request 中產生，
+#     更大的匯出排入背景工作 (export_xlsx_file)，完成後從背景工作列表下載
+
+import csv
+import tempfile
+import uuid
+from datetime import datetime, time, timedelta
+
+import openpyxl
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from openpyxl.cell import WriteOnlyCell
+
+from .models import ConsumptionRecord, SlotMachineRecord, slot_paytable
+
+# 每次從資料庫取回的列數 (PostgreSQL 上為 server-side cursor 的批次大小)
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FORMATS = ('csv', 'xlsx')
+
+# request 中直接產生 XLSX 的列數上限 (20 萬列約需 40 秒；2 萬列約 4 秒)，超過時改排入背景工作
+XLSX_SYNC_MAX_ROWS = 20_000
+
+
+# 1. 匯出資料集
+def parse_export_date(value):
+    """
+    YYYY-MM-DD => date；空值返回 None，格式錯誤時拋出 ValueError。
+    """
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(value)
+    return day
+
+
+def _local(value):
+    """
+    datetime => 當地時間字串 (CSV 與 XLSX 相同)。
+    """
+    if value is None:
+        return ""
+    return timezone.localtime(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _consumption_row(row):
+    pk, username, email, amount, sold_item, sales_time, reward_points, expiry_date, source = row
+    return [pk, username, email, amount, sold_item, _local(sales_time), reward_points, _local(expiry_date), source]
+
+
+GAME_LABELS = dict(SlotMachineRecord.GAME_CHOICES)
+
+
+def _slot_row(row):
+    pk, username, email, game, bet, win_points, grid_code, line_mask, legacy_result, played_at = row
+    paytable = slot_paytable(game)
+    if paytable and grid_code is not None:
+        result = paytable.format_cells(paytable.decode(grid_code))
+    else:
+        result = legacy_result or ""
+    return [pk, username, email, GAME_LABELS.get(game, game), bet, win_points, result, line_mask, _local(played_at)]
+
+
+class ExportDataset:
+    """
+    一種可匯出的資料：model、values_list 欄位、標題列、日期篩選欄位與每列的轉換函式。
+    """
+
+    def __init__(self, name, label, model, fields, header, date_field, convert):
+        self.name = name
+        self.label = label
+        self.model = model
+        self.fields = fields
+        self.header = header
+        self.date_field = date_field
+        self.convert = convert
+
+    def queryset(self, start=None, end=None):
+        """
+        start / end 為當地日期 (含)。
+        """
+        queryset = self.model.objects.all()
+        tz = timezone.get_current_timezone()
+        if start:
+            queryset = queryset.filter(**{
+                f"{self.date_field}__gte": timezone.make_aware(datetime.combine(start, time.min), tz)
+            })
+        if end:
+            queryset = queryset.filter(**{
+                f"{self.date_field}__lt": timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+            })
+        return queryset
+
+    def count(self, start=None, end=None):
+        return self.queryset(start, end).count()
+
+    def rows(self, start=None, end=None):
+        """
+        依 id 排序逐列產生 (已轉換) 的資料。
+        """
+        for row in self.queryset(start, end).order_by('pk').values_list(*self.fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            yield self.convert(row)
+
+    def filename(self, start, end, file_format):
+        period = f"_{start or ''}_{end or ''}" if start or end else ""
+        return f"{self.name}{period}.{file_format}"
+
+
+EXPORT_DATASETS = {
+    'consumption': ExportDataset(
+        'consumption',
+        "消費紀錄",
+        ConsumptionRecord,
+        ['id', 'user__username', 'user__email', 'amount', 'sold_item', 'sales_time',
+         'reward_points', 'expiry_date', 'source'],
+        ["ID", "會員", "Email", "消費金額(元)", "銷售品項", "銷售時間", "回饋積分", "積分到期時間", "來源"],
+        'sales_time',
+        _consumption_row,
+    ),
+    'slots': ExportDataset(
+        'slots',
+        "拉霸紀錄",
+        SlotMachineRecord,
+        ['id', 'user__username', 'user__email', 'game', 'bet', 'win_points', 'grid_code', 'line_mask', 'legacy_grid_result', 'played_at'],
+        ["ID", "會員", "Email", "遊戲", "下注積分", "贏得積分", "盤面", "中獎線遮罩", "遊玩時間"],
+        'played_at',
+        _slot_row,
+    ),
+}
+
+
+# 2. 輸出格式
+class _Echo:
+    """
+    csv.writer 的假檔案：writerow() 直接返回該列字串，交給 StreamingHttpResponse 輸出。
+    """
+
+    def write(self, value):
+        return value
+
+
+# 試算表軟體會把這些字元開頭的儲存格當成公式 (CSV / formula injection)
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def _csv_cell(value):
+    """
+    品項、會員名稱等使用者輸入的文字若以公式字元開頭，前面補上 ' 讓試算表當成純文字。
+    """
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def stream_csv(dataset, start=None, end=None):
+    def lines():
+        writer = csv.writer(_Echo())
+        # UTF-8 BOM：讓 Excel 直接開啟時正確顯示中文
+        yield "\ufeff" + writer.writerow(dataset.header)
+        for row in dataset.rows(start, end):
+            yield writer.writerow([_csv_cell(value) for value in row])
+
+    response = StreamingHttpResponse(lines(), content_type="text/csv; charset=utf-8")
+    response['Content-Disposition'] = f'attachment; filename="{dataset.filename(start, end, "csv")}"'
+    return response
+
+
+def _xlsx_cell(sheet, value):
+    """
+    openpyxl 會把 = 開頭的字串寫成公式 => 這類文字明確標成字串儲存格。
+    """
+    if isinstance(value, str) and value.startswith("="):
+        cell = WriteOnlyCell(sheet, value)
+        cell.data_type = 's'
+        return cell
+    return value
+
+
+def write_xlsx(dataset, output, start=None, end=None, progress=None):
+    """
+    將資料寫入 output (檔案物件) 並返回列數；progress(已寫入列數) 每 EXPORT_CHUNK_SIZE 列呼叫一次。
+    write_only 工作表逐列寫入 openpyxl 的暫存 XML，save() 再壓縮到 output。
+    """
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(dataset.name)
+    sheet.append(dataset.header)
+    count = 0
+    for row in dataset.rows(start, end):
+        sheet.append([_xlsx_cell(sheet, value) for value in row])
+        count += 1
+        if progress and count % EXPORT_CHUNK_SIZE == 0:
+            progress(count)
+    workbook.save(output)
+    return count
+
+
+def xlsx_response(dataset, start=None, end=None):
+    """
+    XLSX_SYNC_MAX_ROWS 列以內的匯出：在 request 中寫入暫存檔 (關閉時自動刪除) 後以 FileResponse 傳送。
+    """
+    output = tempfile.TemporaryFile()
+    write_xlsx(dataset, output, start, end)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=dataset.filename(start, end, "xlsx"),
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+def export_response(dataset_name, file_format, start=None, end=None):
+    dataset = EXPORT_DATASETS[dataset_name]
+    if file_format == 'xlsx':
+        return xlsx_response(dataset, start, end)
+    return stream_csv(dataset, start, end)
+
+
+def needs_background_export(dataset_name, file_format, start=None, end=None):
+    """
+    XLSX 且超過 XLSX_SYNC_MAX_ROWS 列 => 應排入背景工作。
+    """
+    return file_format == 'xlsx' and EXPORT_DATASETS[dataset_name].count(start, end) > XLSX_SYNC_MAX_ROWS
+
+
+def export_job_parameters(dataset_name, start=None, end=None):
+    """
+    背景匯出工作的參數 (BackgroundJob.parameters)，result 為結果檔在 default_storage 中的名稱。
+    """
+    dataset = EXPORT_DATASETS[dataset_name]
+    return {
+        'dataset': dataset_name,
+        'start': start.isoformat() if start else None,
+        'end': end.isoformat() if end else None,
+        'result': f"job_results/{uuid.uuid4().hex}/{dataset.filename(start, end, 'xlsx')}",
+    }
+
+
+# 3. 背景匯出 (run_jobs worker 執行)
+def export_xlsx_file(dataset, result, start=None, end=None, progress=None):
+    """
+    將 XLSX 寫入暫存檔後存到 default_storage 的 result (參數見 export_job_parameters)，返回結果訊息。
+    """
+    start, end = parse_export_date(start), parse_export_date(end)
+    with tempfile.TemporaryFile() as output:
+        count = write_xlsx(EXPORT_DATASETS[dataset], output, start, end, progress)
+        output.seek(0)
+        default_storage.save(result, File(output))
+    if progress:
+        progress(count)
+    return f"✅ 匯出完成，共 {count} 列。\n"
@@ -0,0 +1,113 @@
+# fake_sheets.py
+# -------------
+# 離線測試用的工作表替身：實作 iter_google_sheets_records 與同步流程用到的 gspread Worksheet 介面，
+# 資料保存在記憶體中，不需要網路或 Google 憑證。
+
+from gspread.exceptions import APIError
+from gspread.utils import a1_range_to_grid_range
+
+
+class FakeWorksheet:
+    """
+    以二維 list (第一列為標題列) 模擬 gspread.Worksheet。
+    每次 API 呼叫會記錄在 self.calls，方便測試驗證分段讀取的次數與範圍。
+    errors 為依序拋出的例外 (例如 api_error(429))，每次寫入呼叫前取出一個，用於測試重試；
+    read_errors 同上，於每次 get() 前取出。
+    """
+
+    def __init__(self, rows, title="Sheet9", row_count=None, errors=(), read_errors=()):
+        self.title = title
+        self.rows = [list(row) for row in rows]
+        self._row_count = row_count
+        self.errors = list(errors)
+        self.read_errors = list(read_errors)
+        self.calls = []
+
+    @property
+    def row_count(self):
+        # 真實工作表的格線範圍通常大於資料列數
+        return self._row_count or max(len(self.rows), 1)
+
+    def row_values(self, row):
+        self.calls.append(("row_values", row))
+        if row > len(self.rows):
+            return []
+        return _trim_trailing(self.rows[row - 1])
+
+    def get(self, range_name):
+        """
+        讀取 A1 範圍 (例如 "A2:D1001")；與 Sheets API 相同，會截掉尾端的空白列與空白儲存格。
+        """
+        self.calls.append(("get", range_name))
+        if self.read_errors:
+            raise self.read_errors.pop(0)
+        grid = a1_range_to_grid_range(range_name)
+        start_row = grid.get("startRowIndex", 0)
+        end_row = grid.get("endRowIndex", len(self.rows))
+        start_col = grid.get("startColumnIndex", 0)
+        end_col = grid.get("endColumnIndex")
+
+        values = [_trim_trailing(row[start_col:end_col]) for row in self.rows[start_row:end_row]]
+        while values and not values[-1]:
+            values.pop()
+        return values
+
+    def get_all_records(self):
+        self.calls.append(("get_all_records",))
+        if not self.rows:
+            return []
+        header = self.rows[0]
+        return [
+            dict(zip(header, list(row) + [""] * (len(header) - len(row))))
+            for row in self.rows[1:]
+        ]
+
+
+    def batch_update(self, data, raw=True, **kwargs):
+        """
+        一次寫入多個 A1 範圍：data 為 [{"range": "A2:D3", "values": [[...], [...]]}, ...]。
+        """
+        self.calls.append(("batch_update", [item["range"] for item in data]))
+        if self.errors:
+            raise self.errors.pop(0)
+        for item in data:
+            grid = a1_range_to_grid_range(item["range"])
+            start_row = grid.get("startRowIndex", 0)
+            start_col = grid.get("startColumnIndex", 0)
+            for offset, values in enumerate(item["values"]):
+                row_index = start_row + offset
+                if row_index >= self.row_count:
+                    raise APIError(_FakeResponse(400, f"Range ({item['range']}) exceeds grid limits."))
+                while len(self.rows) <= row_index:
+                    self.rows.append([])
+                row = self.rows[row_index]
+                row.extend([""] * (start_col + len(values) - len(row)))
+                row[start_col:start_col + len(values)] = values
+        return {}
+
+    def add_rows(self, rows):
+        self.calls.append(("add_rows", rows))
+        self._row_count = self.row_count + rows
+
+
+class _FakeResponse:
+    def __init__(self, status_code, message):
+        self.status_code = status_code
+        self.text = message
+
+    def json(self):
+        return {"error": {"code": self.status_code, "message": self.text, "status": "FAKE"}}
+
+
+def api_error(code=429, message="Quota exceeded"):
+    """
+    建立與 gspread 相同型別的 API 錯誤 (例如 429 超過配額)。
+    """
+    return APIError(_FakeResponse(code, message))
+
+
+def _trim_trailing(row):
+    row = list(row)
+    while row and row[-1] in ("", None):
+        row.pop()
+    return row
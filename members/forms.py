@@ -15,6 +15,9 @@ class ConsumptionRecordForm(forms.ModelForm):
 # 積分兌換表單
 # ================================
 class RedeemPointsForm(forms.ModelForm):
+    # 0 或負數在表單層即回報錯誤 (spend_points 只接受正整數)
+    points_used = forms.IntegerField(min_value=1, help_text="兌換使用的積分")
+
     class Meta:
         model = RedemptionRecord
         fields = ['points_used', 'redeemed_item']
@@ -23,7 +26,17 @@ class RedeemPointsForm(forms.ModelForm):
 # Excel 檔案上傳表單 (超級管理者用)
 # ================================
 class ExcelUploadForm(forms.Form):
-    file = forms.FileField(label="上傳 Excel 檔案", help_text="請選擇 .xlsx 或 .xls 格式的文件")
+    file = forms.FileField(
+        label="上傳 Excel 檔案",
+        help_text="請選擇 .xlsx 格式的文件 (標題列需包含：會員 Email、消費金額(元)、銷售品項、銷售時間)"
+    )
+
+    def clean_file(self):
+        file = self.cleaned_data['file']
+        # openpyxl 只支援 .xlsx (舊版 .xls 請先另存新檔)
+        if not file.name.lower().endswith('.xlsx'):
+            raise forms.ValidationError("只支援 .xlsx 格式，請將 .xls 另存為 .xlsx 後再上傳。")
+        return file
 
 # ================================
 # 定義會員編輯資料只有姓名、Email
@@ -4,11 +4,18 @@
 
 import os
 import json
+import logging
+import random
 import re
+import threading
+import time
 import gspread
-from decimal import Decimal, InvalidOperation
 from google.oauth2.service_account import Credentials
 
+from .row_cleaning import ISSUE_LABELS, RowCleaner, clean_decimal, safe_strip
+
+logger = logging.getLogger(__name__)
+
 # 1. 設定 Google API 權限範圍
 #    最常用的操作 Google Sheets/Drive 的範圍如下：
 SCOPES = [
@@ -16,25 +23,58 @@ SCOPES = [
     "https://www.googleapis.com/auth/drive"
 ]
 
-# 2. 嘗試從環境變數中讀取憑證並建立 gspread 客戶端
-try:
-    google_credentials = os.getenv("GOOGLE_CREDENTIALS")
-    if not google_credentials:
-        raise ValueError("❌ GOOGLE_CREDENTIALS 環境變數未設置，無法進行 Google Sheets API 授權！")
+# 從環境變數讀取試算表 ID 和預設工作表名稱
+SPREADSHEET_ID = os.getenv("SPREADSHEET_ID", "1DsDd1YFcUNX6mtSfoLVDfStSNT9GTGcLIhhRS5eH2Ss")
+SHEET_NAME = os.getenv("SHEET_NAME", "Sheet9")
 
-    creds = Credentials.from_service_account_info(
-        json.loads(google_credentials),
-        scopes=SCOPES
-    )
-    client = gspread.authorize(creds)
+# 2. 延遲建立、程序內共用的 gspread 客戶端
+#    模組匯入時不做任何網路授權；第一次真正需要同步時才建立，之後整個程序共用同一個 client。
+#    Credentials 由 google-auth 的 AuthorizedSession 持有，token 過期時會自動 refresh。
+_client = None
+_client_lock = threading.Lock()
 
-    # 從環境變數讀取試算表 ID 和預設工作表名稱
-    SPREADSHEET_ID = os.getenv("SPREADSHEET_ID", "1DsDd1YFcUNX6mtSfoLVDfStSNT9GTGcLIhhRS5eH2Ss")
-    SHEET_NAME = os.getenv("SHEET_NAME", "Sheet9")
+def get_client():
+    """
+    取得共用的 gspread client (第一次呼叫時才授權)，失敗時返回 None。
+    失敗不會被快取，下次呼叫會重試。
+    """
+    global _client
+    if _client is not None:
+        return _client
+
+    with _client_lock:
+        if _client is None:
+            try:
+                google_credentials = os.getenv("GOOGLE_CREDENTIALS")
+                if not google_credentials:
+                    raise ValueError("❌ GOOGLE_CREDENTIALS 環境變數未設置，無法進行 Google Sheets API 授權！")
+
+                creds = Credentials.from_service_account_info(
+                    json.loads(google_credentials),
+                    scopes=SCOPES
+                )
+                _client = gspread.authorize(creds)
+            except Exception:
+                logger.exception("⚠️ Google Sheets API 初始化失敗")
+                return None
+    return _client
+
+def reset_client():
+    """
+    清除快取的 client (例如更換憑證或測試時使用)。
+    """
+    global _client
+    with _client_lock:
+        _client = None
 
-except Exception as e:
-    print(f"⚠️ Google Sheets API 初始化失敗: {e}")
-    client = None  # 若初始化失敗，client 設為 None
+def open_worksheet(worksheet_name=None):
+    """
+    開啟預設試算表中的工作表 (預設為 SHEET_NAME)；client 無法建立時返回 None。
+    """
+    client = get_client()
+    if not client:
+        return None
+    return client.open_by_key(SPREADSHEET_ID).worksheet(worksheet_name or SHEET_NAME)
 
 # 3. 定義讀取 Google Sheets 資料的函式
 def fetch_google_sheets_data():
@@ -42,12 +82,11 @@ def fetch_google_sheets_data():
     連線到預設的 SPREADSHEET_ID & SHEET_NAME，並返回整個表的資料（list of dict）。
     每一列為一個 dict，key 來自標題列，value 為該儲存格的值。
     """
-    if not client:
-        print("❌ 無法讀取 Google Sheets，因為 client 尚未建立 (API 初始化失敗)！")
-        return []
-
     try:
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
+        sheet = open_worksheet()
+        if sheet is None:
+            print("❌ 無法讀取 Google Sheets，因為 client 尚未建立 (API 初始化失敗)！")
+            return []
         data = sheet.get_all_records()
         if not data:
             print("⚠️ 試算表沒有資料 (空表)")
@@ -62,72 +101,119 @@ def fetch_google_sheets_data():
         print(f"⚠️ 發生未知錯誤: {e}")
         return []
 
-# 4. 定義安全資料清洗的輔助函式
-def safe_strip(value):
+def sheet_label():
     """
-    若 value 不是字串，先轉換為字串，再移除前後空白。
+    目前同步來源的識別字串 (試算表 ID / 工作表名稱)，用於保存同步高水位。
     """
-    if not isinstance(value, str):
-        value = str(value)
-    return value.strip()
+    return f"{SPREADSHEET_ID}/{SHEET_NAME}"
 
-def safe_decimal(value, default="0"):
+def fetch_sheet_last_update_time():
     """
-    嘗試將 value 轉換成 Decimal，若失敗則返回預設值。
-    1. 若 value 非字串，轉為字串並去除前後空白。
-    2. 使用正則只保留數字、小數點與負號。
-    3. 若結果為空、或包含多個小數點，則返回 default。
+    透過 Drive API 取得試算表的最後修改時間 (常數時間，不讀取資料列)。
+    無法取得時返回 None，呼叫端應改為完整比對。
     """
+    client = get_client()
+    if not client:
+        return None
+
     try:
-        # 若不是字串，先轉成字串
-        if not isinstance(value, str):
-            value = str(value)
-        value = value.strip()
-        if not value:
-            print("safe_decimal: 空值，使用預設值", default)
-            return Decimal(default)
-
-        # 只保留數字、小數點與負號
-        cleaned = re.sub(r"[^\d\.\-]", "", value)
-        if not cleaned:
-            print("safe_decimal: 清洗後為空，使用預設值", default)
-            return Decimal(default)
-
-        # 檢查是否有多個小數點
-        if cleaned.count('.') > 1:
-            print(f"⚠️ safe_decimal: '{cleaned}' 含多個小數點，使用預設值 {default}")
-            return Decimal(default)
-
-        print(f"safe_decimal: 原始='{value}', 清洗後='{cleaned}'")
-        return Decimal(cleaned)
-
-    except (InvalidOperation, Exception) as e:
-        print(f"⚠️ safe_decimal: 無法將 '{value}' 轉為 Decimal，使用預設值 {default}: {e}")
-        return Decimal(default)
-
-# 5. 定義處理單筆記錄的函式
-def process_record(record):
+        return client.open_by_key(SPREADSHEET_ID).get_lastUpdateTime()
+    except gspread.exceptions.APIError as e:
+        logger.warning("⚠️ 無法取得試算表最後修改時間: %s", e)
+        return None
+
+# 4. 資料清洗 (實作於 row_cleaning.py，這裡保留原本的函式名稱)
+def safe_decimal(value, default="0"):
+    """
+    嘗試將 value 轉換成 Decimal，若失敗則返回預設值 (規則見 row_cleaning.clean_decimal)。
+    單獨呼叫時問題只記錄為 DEBUG；整批清洗請使用 RowCleaner (會計數並限量記錄 WARNING)。
+    """
+    number, issue = clean_decimal(value, default)
+    if issue is not None:
+        logger.debug("safe_decimal %r：%s，使用預設值 %s", value, ISSUE_LABELS[issue], default)
+    return number
+
+# 5. 定義處理紀錄的函式
+def process_record(record, cleaner=None):
     """
     根據欄位名稱做資料清洗：
     - 若欄位包含 "金額", "價格", "數量" 等字樣，嘗試轉成 Decimal。
     - 其他欄位僅去除多餘空白。
+    多筆紀錄請改用 RowCleaner.clean_batch() 整批清洗。
     """
-    cleaned_record = {}
-    for key, value in record.items():
-        if key in ["金額", "價格", "數量"]:
-            cleaned_record[key] = safe_decimal(value)
-        else:
-            cleaned_record[key] = safe_strip(value)
-    return cleaned_record
+    return (cleaner or RowCleaner()).clean_batch([record])[0]
 
 def process_google_sheets_data():
     """
     讀取 Google Sheets 並進行資料清洗，返回 list of dict。
     """
-    raw_data = fetch_google_sheets_data()
-    return [process_record(row) for row in raw_data]
+    cleaner = RowCleaner()
+    data = cleaner.clean_batch(fetch_google_sheets_data())
+    cleaner.log_summary()
+    return data
+
+# 6. 以固定列數分段讀取 (串流)
+#    get_all_records() 會把整張表一次載入記憶體；這裡改為每次讀取一段 A1 範圍，
+#    逐筆 yield 清洗後的紀錄，記憶體用量只與 chunk_rows 有關。
+SHEET_READ_CHUNK_ROWS = int(os.getenv("SHEET_READ_CHUNK_ROWS", "1000"))
 
-# 6. 測試用主程式 (僅在直接執行 google_sheets.py 時才跑)
+def iter_google_sheets_records(sheet=None, chunk_rows=None, cleaner=None):
+    """
+    逐筆產生工作表中的紀錄 (每段以 RowCleaner.clean_batch 整批清洗)。
+    - sheet：gspread Worksheet 或相容物件 (例如 fake_sheets.FakeWorksheet)，預設開啟 SHEET_NAME
+    - chunk_rows：每次 API 呼叫讀取的列數
+    - cleaner：共用的 RowCleaner (累計清洗問題)，預設每次呼叫建立一個
+    第一列為標題列；整列空白的資料列會略過。暫時性 API 錯誤以 call_with_backoff 重試，
+    重試後仍失敗時直接拋出例外，由呼叫端決定是否中止同步。
+    """
+    chunk_rows = chunk_rows or SHEET_READ_CHUNK_ROWS
+    cleaner = cleaner or RowCleaner()
+    if sheet is None:
+        sheet = open_worksheet()
+        if sheet is None:
+            raise RuntimeError("無法讀取 Google Sheets，因為 client 尚未建立 (API 初始化失敗)！")
+
+    header = [safe_strip(name) for name in call_with_backoff(sheet.row_values, 1)]
+    if not header:
+        return
+    last_col = re.sub(r"\d", "", gspread.utils.rowcol_to_a1(1, len(header)))
+
+    # row_count 為工作表格線範圍 (來自 metadata，不需額外 API 呼叫)；
+    # 不以「回傳列數 < chunk_rows」判斷結束，因為 API 會截掉範圍尾端的空白列
+    start = 2
+    while start <= sheet.row_count:
+        end = start + chunk_rows - 1
+        records = []
+        # 每段各自重試 (429 / 5xx)，配額用盡時不必從頭重讀
+        for row in call_with_backoff(sheet.get, f"A{start}:{last_col}{end}"):
+            if not any(str(cell).strip() for cell in row):
+                continue
+            padded = list(row) + [""] * (len(header) - len(row))
+            records.append(dict(zip(header, padded)))
+        yield from cleaner.clean_batch(records)
+        start = end + 1
+
+# 7. API 配額 (429) 與暫時性錯誤的重試
+RETRYABLE_API_ERRORS = (429, 500, 502, 503)
+API_MAX_RETRIES = int(os.getenv("SHEETS_API_MAX_RETRIES", "5"))
+
+def call_with_backoff(func, *args, retries=None, base_delay=1.0, max_delay=32.0, **kwargs):
+    """
+    呼叫 Sheets API；遇到 429 (超過配額) 或暫時性 5xx 時以指數退避 (含隨機抖動) 重試，
+    最多重試 retries 次 (預設 SHEETS_API_MAX_RETRIES)，其他錯誤直接拋出。
+    """
+    retries = API_MAX_RETRIES if retries is None else retries
+    for attempt in range(retries + 1):
+        try:
+            return func(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            if e.code not in RETRYABLE_API_ERRORS or attempt == retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1)
+            logger.warning("Google Sheets API 錯誤 %s，%.1f 秒後重試 (%d/%d)", e.code, delay, attempt + 1, retries)
+            time.sleep(delay)
+
+# 8. 測試用主程式 (僅在直接執行 google_sheets.py 時才跑)
 if __name__ == '__main__':
     data = process_google_sheets_data()
     print("處理後的資料：")
@@ -0,0 +1,214 @@
+# jobs.py
+# -------------
+# 以資料庫為佇列的背景工作：排入 (enqueue)、由 worker 取出 (claim) 並執行 (run)。
+# worker 請見 members/management/commands/run_jobs.py
+
+import logging
+import threading
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .excel_import import ExcelImportError, import_excel_sales
+from .exports import export_xlsx_file
+from .models import BackgroundJob
+from .sheet_sync import (
+    SheetSyncError,
+    sync_members_to_google_sheets_logic,
+    update_from_google_sheets_logic,
+)
+
+
+def import_uploaded_excel(upload, progress=None):
+    """
+    匯入工作附帶的上傳檔案 (upload 為 BackgroundJob.upload)。
+    """
+    with upload.open('rb') as file:
+        return import_excel_sales(file, progress=progress)
+
+
+# 工作類型 => 執行函式 (接受 progress 回呼與 BackgroundJob.parameters，有上傳檔案時另外傳入 upload；
+# 返回結果訊息，失敗時拋出例外)
+JOB_HANDLERS = {
+    BackgroundJob.KIND_SHEETS_IMPORT: update_from_google_sheets_logic,
+    BackgroundJob.KIND_MEMBER_EXPORT: sync_members_to_google_sheets_logic,
+    BackgroundJob.KIND_EXCEL_IMPORT: import_uploaded_excel,
+    BackgroundJob.KIND_XLSX_EXPORT: export_xlsx_file,
+}
+
+ACTIVE_STATUSES = (BackgroundJob.STATUS_PENDING, BackgroundJob.STATUS_RUNNING)
+
+# 執行中的工作每隔多久寫入一次心跳 (秒)；超過 STALE_AFTER 沒有心跳即視為 worker 已中止
+HEARTBEAT_INTERVAL = 30
+STALE_AFTER = timedelta(minutes=5)
+# 背景匯出的結果檔保留天數
+RESULT_RETENTION = timedelta(days=7)
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_job(kind, requested_by=None, upload=None, parameters=None):
+    """
+    排入一個背景工作並立即返回；同類型已有等待中 / 執行中的工作時直接沿用，不重複排入。
+    附帶上傳檔案 (upload) 或參數 (parameters) 的工作每次都會排入，檔案先存入 MEDIA_ROOT 供 worker 讀取。
+    返回 (job, created)。
+    """
+    if upload is not None or parameters:
+        job = BackgroundJob.objects.create(
+            kind=kind, requested_by=requested_by, upload=upload or "", parameters=parameters or {}
+        )
+        return job, True
+
+    with transaction.atomic():
+        existing = (
+            BackgroundJob.objects.select_for_update()
+            .filter(kind=kind, status__in=ACTIVE_STATUSES)
+            .order_by('created_at')
+            .first()
+        )
+        if existing:
+            return existing, False
+        job = BackgroundJob.objects.create(kind=kind, requested_by=requested_by)
+        return job, True
+
+
+def claim_next_job():
+    """
+    取出最早的等待中工作並標記為執行中 (同時寫入第一次心跳)。
+    PostgreSQL 上以 SKIP LOCKED 讓多個 worker 互不搶同一筆工作。
+    """
+    with transaction.atomic():
+        job = (
+            BackgroundJob.objects.select_for_update(skip_locked=True)
+            .filter(status=BackgroundJob.STATUS_PENDING)
+            .order_by('created_at')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = BackgroundJob.STATUS_RUNNING
+        job.started_at = job.heartbeat_at = timezone.now()
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at'])
+        return job
+
+
+def _running(job):
+    return BackgroundJob.objects.filter(pk=job.pk, status=BackgroundJob.STATUS_RUNNING)
+
+
+class Heartbeat:
+    """
+    工作執行期間由背景執行緒每 interval 秒更新 heartbeat_at，
+    讓其他 worker 能分辨「仍在執行」與「worker 已中止」(見 fail_stale_jobs)。
+
+        with Heartbeat(job):
+            handler(...)
+    """
+
+    def __init__(self, job, interval=HEARTBEAT_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-{job.pk}-heartbeat", daemon=True)
+
+    def _run(self):
+        try:
+            while not self._stop.wait(self.interval):
+                _running(self.job).update(heartbeat_at=timezone.now())
+        finally:
+            # 執行緒有自己的資料庫連線，結束時關閉
+            connection.close()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_job(job):
+    """
+    執行已取出的工作，過程中回報已處理列數並持續寫入心跳 (GoogleSheetsSyncLog 由各同步函式自行寫入)。
+    結束時只在工作仍為「執行中」時寫入結果：若已被 fail_stale_jobs 判定為中止，不覆寫其狀態。
+    """
+    def progress(rows_processed):
+        _running(job).update(rows_processed=rows_processed, heartbeat_at=timezone.now())
+        job.rows_processed = rows_processed
+
+    handler = JOB_HANDLERS[job.kind]
+    arguments = dict(job.parameters)
+    if job.upload:
+        arguments['upload'] = job.upload
+    try:
+        with Heartbeat(job):
+            message = handler(progress=progress, **arguments)
+        status = BackgroundJob.STATUS_SUCCEEDED
+    except (SheetSyncError, ExcelImportError) as e:
+        message = str(e)
+        status = BackgroundJob.STATUS_FAILED
+    except Exception as e:
+        message = f"⚠️ 發生未知錯誤: {e}"
+        status = BackgroundJob.STATUS_FAILED
+
+    if job.upload:
+        # 上傳檔案只供這次執行使用 (匯入失敗時請修正後重新上傳，已匯入的列會略過)
+        job.upload.delete(save=False)
+        BackgroundJob.objects.filter(pk=job.pk).update(upload="")
+
+    finished = _running(job).update(
+        status=status,
+        message=message,
+        finished_at=timezone.now(),
+        rows_processed=job.rows_processed,
+    )
+    if not finished:
+        logger.warning("工作 #%s 已不是執行中 (可能被判定為中止)，未寫入結果：%s", job.pk, message)
+    job.refresh_from_db()
+    return job
+
+
+def fail_stale_jobs(stale_after=STALE_AFTER):
+    """
+    超過 stale_after 沒有心跳 (worker 中途終止) 而卡在「執行中」的工作標記為失敗，返回筆數。
+    仍在執行的工作每 HEARTBEAT_INTERVAL 秒更新心跳，不會被誤判。
+    """
+    cutoff = timezone.now() - stale_after
+    return BackgroundJob.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=BackgroundJob.STATUS_RUNNING,
+    ).update(
+        status=BackgroundJob.STATUS_FAILED,
+        finished_at=timezone.now(),
+        message="⚠️ worker 中途終止，工作未完成"
+    )
+
+
+def job_result_name(job):
+    """
+    工作成功產生的結果檔名稱 (default_storage)；沒有或已清除時返回 None。
+    """
+    if job.status != BackgroundJob.STATUS_SUCCEEDED:
+        return None
+    name = job.parameters.get('result')
+    return name if name and default_storage.exists(name) else None
+
+
+def purge_job_results(older_than=RESULT_RETENTION):
+    """
+    刪除超過保留期限的結果檔，並自參數移除 result (之後不再檢查)，返回筆數。
+    """
+    jobs = BackgroundJob.objects.filter(
+        parameters__has_key='result',
+        finished_at__lt=timezone.now() - older_than,
+    )
+    purged = 0
+    for job in jobs:
+        default_storage.delete(job.parameters.pop('result'))
+        job.save(update_fields=['parameters'])
+        purged += 1
+    return purged
@@ -0,0 +1,58 @@
+# members/management/commands/benchmark_cold_start.py
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# 子程序中模擬 gunicorn worker 啟動：載入 WSGI application 與 views (含 google_sheets 模組)
+WORKER_BOOT = (
+    "from membership_system.wsgi import application\n"
+    "import members.views\n"
+)
+
+# 模擬舊版行為：啟動時就進行 Google 授權並開啟工作表
+EAGER_AUTH = (
+    "from members.google_sheets import open_worksheet\n"
+    "try:\n"
+    "    open_worksheet()\n"
+    "except Exception as e:\n"
+    "    print(e)\n"
+)
+
+
+class Command(BaseCommand):
+    help = "量測 worker 冷啟動時間 (延遲建立 Google Sheets client vs. 啟動時立即授權)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help="每種模式執行次數")
+
+    def _measure(self, code, runs):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'membership_system.settings'))
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(
+                [sys.executable, "-c", code],
+                cwd=settings.BASE_DIR, env=env,
+                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False
+            )
+            timings.append(time.perf_counter() - start)
+        return timings
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+        for label, code in [
+            ("延遲建立 (目前)", WORKER_BOOT),
+            ("啟動時授權 (舊版)", WORKER_BOOT + EAGER_AUTH),
+        ]:
+            timings = self._measure(code, runs)
+            self.stdout.write(
+                f"{label}: 中位數 {statistics.median(timings) * 1000:.0f} ms，"
+                f"最慢 {max(timings) * 1000:.0f} ms (共 {runs} 次)"
+            )
@@ -0,0 +1,79 @@
+# members/management/commands/benchmark_expiring_points.py
+
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from members.expiry import expire_due_lots, precompute_expiring_summaries
+from members.models import MemberBalance, PointLot
+from members.points import EXPIRING_SOON_DAYS
+
+
+class Command(BaseCommand):
+    help = "以合成會員量測「即將到期」計算：逐會員彙總 (舊作法) vs. 一次 GROUP BY 預先計算 (資料於結束時回滾)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--members', type=int, default=100_000, help="合成會員數")
+        parser.add_argument('--lots-per-member', type=int, default=3, help="每位會員的積分批次數")
+        parser.add_argument('--sample', type=int, default=1000, help="逐會員彙總的抽樣會員數 (再依比例推估全體)")
+
+    def handle(self, *args, **options):
+        members = options['members']
+        now = timezone.now()
+        rng = random.Random(42)
+
+        with transaction.atomic():
+            start = time.perf_counter()
+            users = User.objects.bulk_create(
+                [User(username=f"bench_expiry_{i}", email=f"bench_expiry_{i}@example.com") for i in range(members)],
+                batch_size=5000
+            )
+            user_ids = [user.pk for user in users]
+            MemberBalance.objects.bulk_create(
+                [MemberBalance(user_id=user_id, earned_points=100 * options['lots_per_member'],
+                               available_points=100 * options['lots_per_member']) for user_id in user_ids],
+                batch_size=5000
+            )
+            lots = []
+            for user_id in user_ids:
+                for _ in range(options['lots_per_member']):
+                    # 到期時間分布在過去 10 天 ~ 未來 365 天
+                    expires_at = now + timedelta(days=rng.uniform(-10, 365))
+                    lots.append(PointLot(
+                        user_id=user_id, points=100, remaining_points=100,
+                        earned_at=expires_at - timedelta(days=365), expires_at=expires_at
+                    ))
+            PointLot.objects.bulk_create(lots, batch_size=5000)
+            self.stdout.write(f"建立 {members} 位會員、{len(lots)} 個批次：{time.perf_counter() - start:.1f} 秒")
+
+            # (A) 舊作法：每位會員各一次範圍彙總 (抽樣後推估)
+            sample = rng.sample(user_ids, min(options['sample'], members))
+            window_end = now + timedelta(days=EXPIRING_SOON_DAYS)
+            start = time.perf_counter()
+            for user_id in sample:
+                PointLot.objects.filter(
+                    user_id=user_id, remaining_points__gt=0, expires_at__range=(now, window_end)
+                ).aggregate(total=Sum('remaining_points'))
+            per_member = (time.perf_counter() - start) / len(sample)
+            self.stdout.write(
+                f"逐會員彙總：每位 {per_member * 1000:.2f} ms，推估 {members} 位共 {per_member * members:.1f} 秒"
+            )
+
+            # (B) 分批到期 + 一次 GROUP BY 預先計算
+            start = time.perf_counter()
+            affected, lots_expired, _ = expire_due_lots(now)
+            self.stdout.write(
+                f"分批到期：{affected} 位會員、{lots_expired} 個批次，{time.perf_counter() - start:.1f} 秒"
+            )
+            start = time.perf_counter()
+            count = precompute_expiring_summaries(now)
+            self.stdout.write(f"GROUP BY 預先計算：{count} 位會員有即將到期積分，{time.perf_counter() - start:.1f} 秒")
+
+            transaction.set_rollback(True)
+        self.stdout.write("✅ 合成資料已回滾")
@@ -0,0 +1,85 @@
+# members/management/commands/benchmark_sales_time.py
+
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from members.sales_time import SalesTimeParser
+
+FORMATS = {
+    'slash': "%Y/%m/%d %H:%M",
+    'slash-date': "%Y/%m/%d",
+    'iso': "%Y-%m-%d %H:%M:%S",
+}
+
+
+def legacy_parse_sales_time(sales_time_str):
+    """
+    舊版逐筆解析：parse_datetime → 最多 6 次 strptime (失敗時拋 ValueError) → 正規表示式，全部失敗時返回 now。
+    """
+    dt = parse_datetime(sales_time_str)
+    if dt is not None:
+        return dt
+    for fmt in ["%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%Y/%m/%d", "%Y-%m-%d %H:%M:%S", "%Y-%m-%d %H:%M", "%Y-%m-%d"]:
+        try:
+            return timezone.make_aware(datetime.strptime(sales_time_str, fmt), timezone.get_current_timezone())
+        except ValueError:
+            pass
+    match = re.match(r'^(\d{4})/(\d{1,2})/(\d{1,2})$', sales_time_str.strip())
+    if match:
+        try:
+            return timezone.make_aware(datetime(*map(int, match.groups())), timezone.get_current_timezone())
+        except ValueError:
+            pass
+    return timezone.now()
+
+
+class Command(BaseCommand):
+    help = "量測銷售時間欄位解析：舊版逐筆嘗試多種格式 vs. 偵測格式後整欄解析 (含 numpy 快速路徑)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000, help="時間字串筆數")
+        parser.add_argument('--format', choices=sorted(FORMATS), default='slash', help="試算表欄位格式")
+
+    def _measure(self, label, parse_column, values):
+        start = time.perf_counter()
+        times, failures = parse_column(values)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"  {label}: {elapsed * 1000:,.0f} ms ({elapsed / len(values) * 1e9:,.0f} ns/筆，無法解析 {failures} 筆)"
+        )
+        return times
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        start = datetime(2024, 1, 1)
+        fmt = FORMATS[options['format']]
+        values = [
+            (start + timedelta(minutes=rng.randrange(365 * 24 * 60))).strftime(fmt) for _ in range(options['rows'])
+        ]
+        self.stdout.write(f"{len(values):,} 筆，格式 {fmt}")
+
+        def legacy(values):
+            return [legacy_parse_sales_time(v) for v in values], 0
+
+        def column(parser):
+            def parse(values):
+                times, failures = parser.parse_column(values)
+                return times, len(failures)
+            return parse
+
+        expected = self._measure("舊版逐筆解析", legacy, values)
+        # 舊版對 ISO 字串返回 naive datetime (存檔時才以目前時區解讀) => 比對前補上時區
+        expected = [timezone.make_aware(dt) if timezone.is_naive(dt) else dt for dt in expected]
+        results = [
+            self._measure("偵測格式 + 整欄解析", column(SalesTimeParser(use_numpy=False)), values),
+            self._measure("numpy datetime64 路徑", column(SalesTimeParser()), values),
+        ]
+        for times in results:
+            if times != expected:
+                self.stdout.write(self.style.WARNING("⚠️ 解析結果與舊版不一致"))
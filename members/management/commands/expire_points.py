@@ -0,0 +1,56 @@
+# members/management/commands/expire_points.py
+
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from members.expiry import expire_due_lots, precompute_expiring_summaries, send_expiry_notifications
+from members.models import PointExpiryRun, PointLot
+
+
+class Command(BaseCommand):
+    help = "每晚排程：將過期積分批次轉為到期、預先計算「即將到期」摘要，並可寄出到期提醒"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="只統計不寫入")
+        parser.add_argument('--batch-size', type=int, default=500, help="每個交易處理的會員數")
+        parser.add_argument('--skip-summary', action='store_true', help="不重新計算即將到期摘要")
+        parser.add_argument('--notify', action='store_true', help="依摘要寄出到期提醒 Email")
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        last_run = PointExpiryRun.objects.order_by('-ran_at').first()
+        if last_run:
+            self.stdout.write(f"上次執行：{last_run.ran_at:%Y-%m-%d %H:%M}，處理到 {last_run.expired_through:%Y-%m-%d %H:%M}")
+
+        # 只讀取「仍有剩餘且已過期」的批次 (pointlot_open_expiry_idx 部分索引)：
+        # 上次執行後跨過到期時間的批次，以及事後補匯入、匯入時即已過期的舊批次；不掃描會員完整歷史
+        if options['dry_run']:
+            stats = PointLot.objects.filter(remaining_points__gt=0, expires_at__lte=now).aggregate(
+                lots=Count('id'), points=Sum('remaining_points')
+            )
+            self.stdout.write(f"預計到期 {stats['lots']} 個批次，共 {stats['points'] or 0} 積分 (未寫入)")
+            return
+
+        members, lots_expired, points_expired = expire_due_lots(now, batch_size=options['batch_size'])
+        self.stdout.write(f"✅ 到期處理完成：{members} 位會員、{lots_expired} 個批次，共 {points_expired} 積分到期")
+
+        expiring_soon_members = None
+        if not options['skip_summary']:
+            expiring_soon_members = precompute_expiring_summaries(now)
+            self.stdout.write(f"✅ 即將到期摘要：{expiring_soon_members} 位會員")
+
+        notifications_sent = 0
+        if options['notify']:
+            notifications_sent = send_expiry_notifications(now)
+            self.stdout.write(f"✅ 已寄出 {notifications_sent} 封到期提醒")
+
+        PointExpiryRun.objects.create(
+            ran_at=now,
+            expired_through=now,
+            members_affected=members,
+            lots_expired=lots_expired,
+            points_expired=points_expired,
+            expiring_soon_members=expiring_soon_members,
+            notifications_sent=notifications_sent,
+        )
@@ -0,0 +1,20 @@
+# members/management/commands/import_excel.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from members.excel_import import ExcelImportError, import_excel_sales
+
+
+class Command(BaseCommand):
+    help = "從 Excel (.xlsx) 檔案匯入銷售明細 (串流讀取，與後台上傳相同邏輯)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help=".xlsx 檔案路徑")
+        parser.add_argument('--batch-size', type=int, default=None, help="每批寫入筆數 (預設 SHEETS_IMPORT_BATCH_SIZE)")
+
+    def handle(self, *args, **options):
+        try:
+            message = import_excel_sales(options['path'], batch_size=options['batch_size'])
+        except ExcelImportError as e:
+            raise CommandError(str(e))
+        self.stdout.write(message)
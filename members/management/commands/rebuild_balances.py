@@ -0,0 +1,56 @@
+# members/management/commands/rebuild_balances.py
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from members.member_cache import invalidate_member_cache
+from members.models import MemberBalance
+from members.points import BALANCE_FIELDS, available_from_totals, compute_all_member_totals, rebuild_member_balance
+
+
+class Command(BaseCommand):
+    help = "從原始消費 / 兌換 / 拉霸紀錄重建 PointLot 與 MemberBalance，並比對現有餘額是否一致"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="只比對不寫入；若有不一致則以錯誤結束",
+        )
+
+    def handle(self, *args, **options):
+        check_only = options['check']
+        all_totals = compute_all_member_totals()
+        existing = {b.user_id: b for b in MemberBalance.objects.all()}
+
+        mismatched = []
+        missing = []
+        for user_id in User.objects.values_list('id', flat=True):
+            totals = all_totals.get(user_id, dict.fromkeys(BALANCE_FIELDS, 0))
+            expected = dict(totals, available_points=available_from_totals(totals))
+            balance = existing.get(user_id)
+            if balance is None:
+                missing.append(user_id)
+                continue
+            if any(getattr(balance, field) != value for field, value in expected.items()):
+                mismatched.append((user_id, balance.available_points, expected['available_points']))
+
+        for user_id, stored, expected in mismatched:
+            self.stdout.write(f"⚠️ 會員 {user_id} 餘額不一致：紀錄為 {stored}，重算為 {expected}")
+
+        if check_only:
+            if mismatched:
+                raise CommandError(f"❌ 共 {len(mismatched)} 位會員餘額不一致")
+            self.stdout.write(f"✅ 餘額一致 (另有 {len(missing)} 位會員尚未建立 MemberBalance)")
+            return
+
+        # 重播紀錄重建積分批次 (FIFO 扣款與到期需逐位會員計算)
+        for user_id in missing + [user_id for user_id, _, _ in mismatched]:
+            with transaction.atomic():
+                rebuild_member_balance(user_id)
+                invalidate_member_cache(user_id)
+
+        self.stdout.write(
+            f"✅ 重建完成：新增 {len(missing)} 筆，修正 {len(mismatched)} 筆 MemberBalance"
+        )
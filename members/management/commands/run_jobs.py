@@ -0,0 +1,41 @@
+# members/management/commands/run_jobs.py
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from members.jobs import STALE_AFTER, claim_next_job, fail_stale_jobs, purge_job_results, run_job
+
+
+class Command(BaseCommand):
+    help = "背景工作 worker：持續從資料庫佇列取出並執行 Google Sheets 同步等工作"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="執行完目前佇列中的工作後結束")
+        parser.add_argument('--poll-interval', type=float, default=5.0, help="佇列為空時的輪詢間隔 (秒)")
+        parser.add_argument('--stale-minutes', type=int, default=int(STALE_AFTER.total_seconds() // 60),
+                            help="執行中的工作超過此分鐘數沒有心跳，視為 worker 已中止並標記為失敗")
+
+    def handle(self, *args, **options):
+        stale_after = timedelta(minutes=options['stale_minutes'])
+        while True:
+            close_old_connections()
+            # 每次取工作前檢查：其他 worker 中止後留下的工作不必等到本 worker 重新啟動才處理
+            stale = fail_stale_jobs(stale_after)
+            if stale:
+                self.stdout.write(f"⚠️ 已將 {stale} 筆中止的工作標記為失敗")
+
+            job = claim_next_job()
+            if job is None:
+                # 佇列為空時順便清除過期的匯出結果檔
+                purge_job_results()
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+
+            self.stdout.write(f"▶️ 開始執行工作 {job}")
+            run_job(job)
+            self.stdout.write(f"{job}：{job.message}")
@@ -1,13 +1,16 @@
 # members/management/commands/update_sheets.py
 
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 # 只引入邏輯函式
-from members.views import update_from_google_sheets_logic
+from members.sheet_sync import SheetSyncError, update_from_google_sheets_logic
 
 class Command(BaseCommand):
     help = "自動從 Google Sheets 取得資料並更新資料庫 (不需 request)"
 
     def handle(self, *args, **options):
         # 直接呼叫邏輯函式
-        message = update_from_google_sheets_logic()
+        try:
+            message = update_from_google_sheets_logic()
+        except SheetSyncError as e:
+            raise CommandError(str(e))
         self.stdout.write(message)
@@ -0,0 +1,165 @@
+# member_cache.py
+# -------------
+# 會員摘要快取：可用積分、30 天內到期積分、累積回饋與最近活動。
+# 每位會員一個版本號，摘要以 (會員, 版本) 為 key；紀錄寫入時只需遞增版本號，舊摘要自然失效。
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import (
+    ConsumptionRecord,
+    ExpiringPointsSummary,
+    PointExpiryRun,
+    PointLot,
+    RedemptionRecord,
+    SlotMachineRecord,
+)
+from .points import EXPIRING_SOON_DAYS, EXPIRING_SUMMARY_MAX_AGE, get_member_balance
+
+# 最近活動顯示筆數
+RECENT_ACTIVITY_LIMIT = 5
+
+HITS_KEY = "member_cache:hits"
+MISSES_KEY = "member_cache:misses"
+
+
+# 1. key 與版本號
+def _version_key(user_id):
+    return f"member_cache:{user_id}:version"
+
+
+def _summary_key(user_id, version):
+    return f"member_cache:{user_id}:summary:{version}"
+
+
+def _new_version():
+    # 版本號被快取淘汰後重新建立時，不可與仍留在快取中的舊摘要撞號 => 以時間產生
+    return time.time_ns()
+
+
+def _current_version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), _new_version(), timeout=None)
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def _bump_version(user_id):
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        cache.set(_version_key(user_id), _new_version(), timeout=None)
+
+
+def _count(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+# 2. 失效
+def invalidate_member_cache(user_id):
+    """
+    會員的消費 / 兌換 / 拉霸紀錄變動時呼叫。
+    立即遞增版本號 (同一交易內後續讀取看得到新值)，並在 COMMIT 後再遞增一次，
+    丟棄其他連線在提交前以舊資料寫入的摘要。
+    """
+    _bump_version(user_id)
+    transaction.on_commit(lambda: _bump_version(user_id))
+
+
+# 3. 讀取
+def compute_member_summary(user_id):
+    """
+    從資料庫計算會員摘要 (快取未命中時)。
+    """
+    now = timezone.now()
+    totals = ConsumptionRecord.objects.filter(user_id=user_id).aggregate(
+        total_points=Sum('reward_points'),
+        record_count=Count('id'),
+    )
+    balance = get_member_balance(user_id)
+    available_points = balance.available_points
+
+    activity = [
+        {"kind": "消費", "points": r.reward_points, "time": r.sales_time, "detail": r.sold_item}
+        for r in ConsumptionRecord.objects.filter(user_id=user_id).order_by('-sales_time')[:RECENT_ACTIVITY_LIMIT]
+    ] + [
+        {"kind": "兌換", "points": -r.points_used, "time": r.redemption_time, "detail": r.redeemed_item}
+        for r in RedemptionRecord.objects.filter(user_id=user_id).order_by('-redemption_time')[:RECENT_ACTIVITY_LIMIT]
+    ] + [
+        {"kind": "拉霸", "points": r.win_points - r.bet, "time": r.played_at, "detail": r.grid_result}
+        for r in SlotMachineRecord.objects.filter(user_id=user_id).order_by('-played_at')[:RECENT_ACTIVITY_LIMIT]
+    ]
+    activity.sort(key=lambda item: item["time"], reverse=True)
+
+    return {
+        "available_points": available_points,
+        "total_points": totals['total_points'] or 0,
+        "points_expiring_soon": expiring_soon_points(balance, now),
+        "record_count": totals['record_count'],
+        "recent_activity": activity[:RECENT_ACTIVITY_LIMIT],
+    }
+
+
+def expiring_soon_points(balance, now):
+    """
+    即將到期積分：優先讀取 expire_points 每晚預先計算的 ExpiringPointsSummary；
+    摘要過舊、尚未計算過，或會員在摘要計算後有積分異動 (FIFO 扣款會先扣掉即將到期的批次)，
+    改為即時彙總該會員的批次。
+    """
+    latest = (
+        PointExpiryRun.objects.filter(expiring_soon_members__isnull=False)
+        .order_by('-ran_at').values_list('ran_at', flat=True).first()
+    )
+    if latest and latest >= now - EXPIRING_SUMMARY_MAX_AGE and balance.updated_at <= latest:
+        points = ExpiringPointsSummary.objects.filter(pk=balance.pk).values_list('points', flat=True).first()
+    else:
+        points = PointLot.objects.filter(
+            user_id=balance.pk, remaining_points__gt=0,
+            expires_at__range=(now, now + timedelta(days=EXPIRING_SOON_DAYS))
+        ).aggregate(total=Sum('remaining_points'))['total']
+    return min(points or 0, max(balance.available_points, 0))
+
+
+def get_member_summary(user):
+    """
+    取得會員摘要 (dict)，優先讀快取。
+    僅供顯示使用；扣款前的餘額檢查仍以 spend_points 鎖定資料庫為準。
+    """
+    user_id = getattr(user, 'pk', user)
+    key = _summary_key(user_id, _current_version(user_id))
+    summary = cache.get(key)
+    if summary is not None:
+        _count(HITS_KEY)
+        return summary
+
+    _count(MISSES_KEY)
+    summary = compute_member_summary(user_id)
+    cache.set(key, summary, timeout=settings.MEMBER_CACHE_TIMEOUT)
+    return summary
+
+
+# 4. 命中率統計
+def member_cache_stats():
+    """
+    返回 {'hits', 'misses', 'hit_rate'}；計數存放在快取中，多個 worker 共用同一組計數。
+    """
+    counts = cache.get_many([HITS_KEY, MISSES_KEY])
+    hits = counts.get(HITS_KEY, 0)
+    misses = counts.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": hits / total if total else 0.0}
+
+
+def reset_member_cache_stats():
+    cache.delete_many([HITS_KEY, MISSES_KEY])
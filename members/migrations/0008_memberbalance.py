@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:23
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0007_slotmachinerecord'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MemberBalance',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='balance', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('earned_points', models.IntegerField(default=0, help_text='消費回饋積分總和')),
+                ('redeemed_points', models.IntegerField(default=0, help_text='兌換使用積分總和')),
+                ('slot_bet_points', models.IntegerField(default=0, help_text='拉霸下注積分總和')),
+                ('slot_win_points', models.IntegerField(default=0, help_text='拉霸贏得積分總和')),
+                ('available_points', models.IntegerField(default=0, help_text='目前可用積分')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='最後更新時間')),
+            ],
+        ),
+    ]
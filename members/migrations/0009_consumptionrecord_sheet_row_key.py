@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0008_memberbalance'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleSheetsSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sheet_label', models.CharField(help_text='試算表 ID / 工作表名稱', max_length=200, unique=True)),
+                ('last_modified', models.CharField(blank=True, default='', help_text='上次同步時試算表的最後修改時間', max_length=64)),
+                ('row_count', models.IntegerField(default=0, help_text='上次同步時的資料列數')),
+                ('synced_at', models.DateTimeField(blank=True, help_text='上次同步完成時間', null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='consumptionrecord',
+            name='sheet_row_key',
+            field=models.CharField(blank=True, editable=False, help_text='Google Sheets 來源列的自然鍵 (非試算表匯入的紀錄為空)', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:38
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0009_consumptionrecord_sheet_row_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('sheets_import', '從 Google Sheets 匯入消費紀錄'), ('member_export', '同步會員資料到 Google Sheets')], help_text='工作類型', max_length=30)),
+                ('status', models.CharField(choices=[('pending', '等待中'), ('running', '執行中'), ('succeeded', '成功'), ('failed', '失敗')], default='pending', help_text='狀態', max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now, help_text='排入時間')),
+                ('started_at', models.DateTimeField(blank=True, help_text='開始執行時間', null=True)),
+                ('finished_at', models.DateTimeField(blank=True, help_text='完成時間', null=True)),
+                ('rows_processed', models.IntegerField(default=0, help_text='已處理列數')),
+                ('message', models.TextField(blank=True, default='', help_text='執行結果描述')),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='background_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='members_bac_status_c1631d_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0010_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GoogleSheetsSyncWarning',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('message', models.CharField(help_text='警告內容', max_length=500)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='commit_seconds',
+            field=models.FloatField(default=0, help_text='交易提交耗時'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='fetch_seconds',
+            field=models.FloatField(default=0, help_text='讀取 Google Sheets 耗時'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='resolve_seconds',
+            field=models.FloatField(default=0, help_text='解析會員 Email 耗時'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='rows_deleted',
+            field=models.IntegerField(default=0, help_text='刪除筆數'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='rows_failed',
+            field=models.IntegerField(default=0, help_text='失敗筆數'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='rows_fetched',
+            field=models.IntegerField(default=0, help_text='讀取列數'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='rows_inserted',
+            field=models.IntegerField(default=0, help_text='新增筆數'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='rows_skipped',
+            field=models.IntegerField(default=0, help_text='略過筆數 (非會員等)'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='rows_updated',
+            field=models.IntegerField(default=0, help_text='更新筆數'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='sync_type',
+            field=models.CharField(choices=[('匯入消費紀錄', '匯入消費紀錄'), ('同步會員資料', '同步會員資料')], default='匯入消費紀錄', help_text='同步類型', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='total_seconds',
+            field=models.FloatField(default=0, help_text='總耗時'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='warning_count',
+            field=models.IntegerField(default=0, help_text='警告總數 (明細最多保存 MAX_SYNC_WARNINGS 筆)'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssynclog',
+            name='write_seconds',
+            field=models.FloatField(default=0, help_text='寫入資料庫耗時'),
+        ),
+        migrations.AddIndex(
+            model_name='googlesheetssynclog',
+            index=models.Index(fields=['sync_type', '-sync_time'], name='members_goo_sync_ty_f42d4b_idx'),
+        ),
+        migrations.AddField(
+            model_name='googlesheetssyncwarning',
+            name='sync_log',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='warnings', to='members.googlesheetssynclog'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0011_googlesheetssynclog_metrics'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='consumptionrecord',
+            index=models.Index(fields=['user', '-sales_time'], name='members_con_user_id_103664_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='consumptionrecord',
+            index=models.Index(fields=['user', 'expiry_date'], name='members_con_user_id_7cd916_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='redemptionrecord',
+            index=models.Index(fields=['user', '-redemption_time'], name='members_red_user_id_6737b1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='slotmachinerecord',
+            index=models.Index(fields=['user', '-played_at'], name='members_slo_user_id_0e73ce_idx'),
+        ),
+        # auth.User 屬於 Django 內建 app，無法在 Meta 宣告索引 => 以 SQL 建立 (Sheets 匯入依 Email 查會員)
+        migrations.RunSQL(
+            sql="CREATE INDEX IF NOT EXISTS members_auth_user_email_idx ON auth_user (email);",
+            reverse_sql="DROP INDEX IF EXISTS members_auth_user_email_idx;",
+        ),
+    ]
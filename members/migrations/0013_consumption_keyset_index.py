@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0012_member_history_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='consumptionrecord',
+            name='members_con_user_id_103664_idx',
+        ),
+        migrations.AddIndex(
+            model_name='consumptionrecord',
+            index=models.Index(fields=['user', '-sales_time', '-id'], name='members_con_user_id_6e4f01_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:47
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def reset_member_balances(apps, schema_editor):
+    """
+    既有的 MemberBalance 沒有積分批次 => 全部刪除，
+    每位會員下次讀取餘額時會由 get_member_balance 依紀錄重播，一併建立 PointLot 與 expired_points。
+    (也可在部署後執行 python manage.py rebuild_balances 一次建立)
+    """
+    apps.get_model('members', 'MemberBalance').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0013_consumption_keyset_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PointExpiryRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ran_at', models.DateTimeField(default=django.utils.timezone.now, help_text='執行時間')),
+                ('expired_through', models.DateTimeField(help_text='本次處理到期時間的上限 (下次從此接續)')),
+                ('members_affected', models.IntegerField(default=0, help_text='受影響會員數')),
+                ('lots_expired', models.IntegerField(default=0, help_text='到期批次數')),
+                ('points_expired', models.IntegerField(default=0, help_text='到期積分總和')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='memberbalance',
+            name='expired_points',
+            field=models.IntegerField(default=0, help_text='已到期積分總和'),
+        ),
+        migrations.CreateModel(
+            name='PointLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.IntegerField(help_text='入帳積分')),
+                ('remaining_points', models.IntegerField(help_text='剩餘可用積分')),
+                ('expired_points', models.IntegerField(default=0, help_text='到期未使用的積分')),
+                ('earned_at', models.DateTimeField(help_text='入帳時間')),
+                ('expires_at', models.DateTimeField(help_text='到期時間')),
+                ('consumption', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='point_lot', to='members.consumptionrecord')),
+                ('slot_record', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='point_lot', to='members.slotmachinerecord')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='point_lots', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('remaining_points__gt', 0)), fields=['user', 'expires_at', 'id'], name='pointlot_open_fifo_idx'), models.Index(condition=models.Q(('remaining_points__gt', 0)), fields=['expires_at'], name='pointlot_open_expiry_idx')],
+            },
+        ),
+        migrations.RunPython(reset_member_balances, migrations.RunPython.noop),
+    ]
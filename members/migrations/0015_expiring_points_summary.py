@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-17 07:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('members', '0014_point_lots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpiringPointsSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='expiring_points_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('points', models.IntegerField(help_text='即將到期的積分')),
+                ('next_expiry', models.DateTimeField(help_text='最早到期時間')),
+                ('window_end', models.DateTimeField(help_text='統計範圍的結束時間')),
+                ('computed_at', models.DateTimeField(help_text='計算時間')),
+                ('notified_at', models.DateTimeField(blank=True, help_text='上次寄出到期提醒的時間', null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='pointexpiryrun',
+            name='expiring_soon_members',
+            field=models.IntegerField(blank=True, help_text='本次預先計算「即將到期」的會員數 (未計算為空)', null=True),
+        ),
+        migrations.AddField(
+            model_name='pointexpiryrun',
+            name='notifications_sent',
+            field=models.IntegerField(default=0, help_text='寄出的到期提醒數'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-17 08:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # 只新增欄位；舊 grid_result 文字的轉換見 0024，移除舊欄位見 0025
+
+    dependencies = [
+        ('members', '0015_expiring_points_summary'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slotmachinerecord',
+            name='game',
+            field=models.PositiveSmallIntegerField(choices=[(0, '未知'), (1, '3x3 拉霸'), (2, '三輪拉霸')], default=0, help_text='遊戲種類'),
+        ),
+        migrations.AddField(
+            model_name='slotmachinerecord',
+            name='grid_code',
+            field=models.PositiveIntegerField(blank=True, help_text='盤面編碼：各格符號索引以符號數為底組成的整數 (Paytable.encode，3x3 < 5^9)', null=True),
+        ),
+        migrations.AddField(
+            model_name='slotmachinerecord',
+            name='line_mask',
+            field=models.PositiveSmallIntegerField(default=0, help_text='中獎線位元遮罩 (bit i 對應 Paytable.line_names[i])'),
+        ),
+        migrations.AddIndex(
+            model_name='slotmachinerecord',
+            index=models.Index(fields=['game', 'played_at'], name='members_slo_game_9d917d_idx'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-17 08:04
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0016_slot_grid_encoding'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotRollupRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ran_at', models.DateTimeField(default=django.utils.timezone.now, help_text='執行時間')),
+                ('rolled_up_through', models.DateTimeField(help_text='水位：played_at 不晚於此時間的紀錄皆已彙總 (下次從此接續)')),
+                ('records_processed', models.IntegerField(default=0, help_text='本次彙總的紀錄數')),
+                ('days_affected', models.IntegerField(default=0, help_text='本次更新的日期數')),
+                ('rebuilt', models.BooleanField(default=False, help_text='是否為清除後全部重算')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SlotDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='遊玩日期 (TIME_ZONE 當地日期)')),
+                ('game', models.PositiveSmallIntegerField(choices=[(0, '未知'), (1, '3x3 拉霸'), (2, '三輪拉霸')], help_text='遊戲種類')),
+                ('spins', models.IntegerField(default=0, help_text='局數')),
+                ('total_bet', models.BigIntegerField(default=0, help_text='下注積分總和')),
+                ('total_win', models.BigIntegerField(default=0, help_text='贏得積分總和')),
+                ('unique_players', models.IntegerField(default=0, help_text='遊玩會員數')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'game'), name='slot_daily_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SlotMemberDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='遊玩日期 (TIME_ZONE 當地日期)')),
+                ('game', models.PositiveSmallIntegerField(choices=[(0, '未知'), (1, '3x3 拉霸'), (2, '三輪拉霸')], help_text='遊戲種類')),
+                ('spins', models.IntegerField(default=0, help_text='局數')),
+                ('total_bet', models.BigIntegerField(default=0, help_text='下注積分總和')),
+                ('total_win', models.BigIntegerField(default=0, help_text='贏得積分總和')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_daily_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-day'], name='members_slo_user_id_711573_idx')],
+                'constraints': [models.UniqueConstraint(fields=('day', 'user', 'game'), name='slot_member_daily_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.6 on 2026-10-17 08:15
+
+from django.db import migrations, models
+
+
+def mark_sheet_records(apps, schema_editor):
+    """
+    既有帶自然鍵的紀錄都來自 Google Sheets 同步。
+    """
+    ConsumptionRecord = apps.get_model('members', 'ConsumptionRecord')
+    ConsumptionRecord.objects.filter(sheet_row_key__isnull=False).update(source='sheets')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0017_slot_daily_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='consumptionrecord',
+            name='source',
+            field=models.CharField(blank=True, choices=[('', '手動 / 其他'), ('sheets', 'Google Sheets'), ('xlsx', 'Excel 上傳')], default='', editable=False, help_text='紀錄來源 (Google Sheets 同步只會刪除來源為 Google Sheets 的紀錄)', max_length=10),
+        ),
+        migrations.RunPython(mark_sheet_records, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='consumptionrecord',
+            name='sheet_row_key',
+            field=models.CharField(blank=True, editable=False, help_text='Google Sheets / Excel 來源列的自然鍵 (非匯入的紀錄為空)', max_length=64, null=True, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='googlesheetssynclog',
+            name='sync_type',
+            field=models.CharField(choices=[('匯入消費紀錄', '匯入消費紀錄'), ('同步會員資料', '同步會員資料'), ('Excel 匯入', 'Excel 匯入')], default='匯入消費紀錄', help_text='同步類型', max_length=20),
+        ),
+    ]
@@ -0,0 +1,100 @@
+from bisect import bisect_left
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db import migrations
+
+LEGACY_BET_ITEM = "3x3 拉霸下注"
+LEGACY_WIN_ITEM = "3x3 拉霸中獎"
+# 舊版 3x3 拉霸在同一個 request 內依序建立下注 / 中獎紀錄與 SlotMachineRecord
+MATCH_WINDOW = timedelta(seconds=60)
+
+
+def _bucket(rows):
+    """
+    (pk, user_id, 時間, 積分) => {(user_id, 積分): ([時間...], [pk...])}，各組依時間排序。
+    """
+    groups = defaultdict(list)
+    for pk, user_id, at, points in rows:
+        groups[(user_id, points)].append((at, pk))
+    buckets = {}
+    for key, items in groups.items():
+        items.sort()
+        buckets[key] = ([at for at, _ in items], [pk for _, pk in items])
+    return buckets
+
+
+def _pop_match(bucket, moment):
+    """
+    從同會員、同積分的候選 (依時間排序) 中取出時間最接近 moment (MATCH_WINDOW 內) 的一筆舊紀錄 id。
+    二分搜尋 moment 的位置，最接近的只可能是前後兩筆。
+    """
+    if bucket is None:
+        return None
+    times, pks = bucket
+    index = bisect_left(times, moment)
+    best = None
+    for i in (index - 1, index):
+        if 0 <= i < len(times) and abs(times[i] - moment) <= MATCH_WINDOW:
+            if best is None or abs(times[i] - moment) < abs(times[best] - moment):
+                best = i
+    if best is None:
+        return None
+    del times[best]
+    return pks.pop(best)
+
+
+def remove_legacy_slot_mirrors(apps, schema_editor):
+    """
+    舊版 3x3 拉霸每局除了 SlotMachineRecord 外，另以 RedemptionRecord (3x3 拉霸下注) 扣下注、
+    ConsumptionRecord (3x3 拉霸中獎) 加贏分；積分帳本已直接計算 SlotMachineRecord.bet / win_points，
+    保留這些鏡像紀錄會重複計算。
+    只刪除能對應到 SlotMachineRecord (同會員、同積分、時間相近) 的鏡像紀錄，對應不到的保留 (它們是該局唯一的紀錄)。
+    受影響會員的 MemberBalance / PointLot 刪除，下次讀取時依紀錄重播 (或執行 rebuild_balances)。
+    """
+    RedemptionRecord = apps.get_model('members', 'RedemptionRecord')
+    ConsumptionRecord = apps.get_model('members', 'ConsumptionRecord')
+    SlotMachineRecord = apps.get_model('members', 'SlotMachineRecord')
+    MemberBalance = apps.get_model('members', 'MemberBalance')
+    PointLot = apps.get_model('members', 'PointLot')
+
+    bets = _bucket(RedemptionRecord.objects.filter(redeemed_item=LEGACY_BET_ITEM).values_list(
+        'pk', 'user_id', 'redemption_time', 'points_used'
+    ))
+    wins = _bucket(ConsumptionRecord.objects.filter(sold_item=LEGACY_WIN_ITEM).values_list(
+        'pk', 'user_id', 'sales_time', 'reward_points'
+    ))
+
+    bet_ids, win_ids = [], []
+    for user_id in {user_id for user_id, _ in bets} | {user_id for user_id, _ in wins}:
+        spins = SlotMachineRecord.objects.filter(user_id=user_id).order_by('played_at', 'pk').values_list(
+            'played_at', 'bet', 'win_points'
+        )
+        for played_at, bet, win_points in spins.iterator():
+            pk = _pop_match(bets.get((user_id, bet)), played_at)
+            if pk is not None:
+                bet_ids.append(pk)
+            if win_points > 0:
+                pk = _pop_match(wins.get((user_id, win_points)), played_at)
+                if pk is not None:
+                    win_ids.append(pk)
+
+    affected = set(
+        RedemptionRecord.objects.filter(pk__in=bet_ids).values_list('user_id', flat=True)
+    ) | set(ConsumptionRecord.objects.filter(pk__in=win_ids).values_list('user_id', flat=True))
+    RedemptionRecord.objects.filter(pk__in=bet_ids).delete()
+    # 連帶刪除由中獎鏡像建立的 PointLot
+    ConsumptionRecord.objects.filter(pk__in=win_ids).delete()
+    PointLot.objects.filter(user_id__in=affected).delete()
+    MemberBalance.objects.filter(user_id__in=affected).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0018_consumption_record_source'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_legacy_slot_mirrors, migrations.RunPython.noop),
+    ]
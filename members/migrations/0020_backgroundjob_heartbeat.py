@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 08:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0019_remove_legacy_slot_mirrors'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='worker 最後回報仍在執行的時間', null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 08:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0020_backgroundjob_heartbeat'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='upload',
+            field=models.FileField(blank=True, help_text='工作使用的上傳檔案 (執行後刪除)', upload_to='job_uploads/'),
+        ),
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('sheets_import', '從 Google Sheets 匯入消費紀錄'), ('member_export', '同步會員資料到 Google Sheets'), ('excel_import', '從上傳的 Excel 匯入消費紀錄')], help_text='工作類型', max_length=30),
+        ),
+    ]
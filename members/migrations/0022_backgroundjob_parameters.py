@@ -0,0 +1,23 @@
+# Generated by Django 5.1.6 on 2026-10-17 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0021_backgroundjob_upload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='parameters',
+            field=models.JSONField(blank=True, default=dict, help_text='傳給執行函式的參數'),
+        ),
+        migrations.AlterField(
+            model_name='backgroundjob',
+            name='kind',
+            field=models.CharField(choices=[('sheets_import', '從 Google Sheets 匯入消費紀錄'), ('member_export', '同步會員資料到 Google Sheets'), ('excel_import', '從上傳的 Excel 匯入消費紀錄'), ('xlsx_export', '匯出資料 (Excel)')], help_text='工作類型', max_length=30),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.1.6 on 2026-10-17 08:43
+
+from django.db import migrations, models
+
+
+def seed_rollup_state(apps, schema_editor):
+    """
+    以最新一次 SlotRollupRun 的水位建立狀態列，既有彙總不需重算。
+    """
+    SlotRollupRun = apps.get_model('members', 'SlotRollupRun')
+    SlotRollupState = apps.get_model('members', 'SlotRollupState')
+    last = SlotRollupRun.objects.order_by('-rolled_up_through', '-id').first()
+    SlotRollupState.objects.create(pk=1, rolled_up_through=last.rolled_up_through if last else None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0022_backgroundjob_parameters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SlotRollupState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rolled_up_through', models.DateTimeField(blank=True, help_text='水位 (尚未彙總過時為空)', null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='最後更新時間')),
+            ],
+        ),
+        migrations.RunPython(seed_rollup_state, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.1.6 on 2026-10-17 09:10
+
+from django.db import migrations, transaction
+
+from casino.paytable import GridPaytable, ReelPaytable
+
+BATCH_SIZE = 2000
+
+# 轉換當時的規則 (凍結於此，之後修改 casino/paytable.py 不影響此 migration)
+GRID = GridPaytable(
+    symbols=["7", "⭐", "🍒", "🍋", "🔔"],
+    weights=[1, 2, 3, 4, 4],
+    multipliers={"7": 5, "⭐": 3, "🍒": 2, "🍋": 2, "🔔": 2},
+)
+REELS = ReelPaytable(
+    symbols=["symbol1", "symbol2", "symbol3", "symbol4", "wild"],
+    weights=[1, 1, 1, 1, 1],
+    wild="wild",
+    three_of_a_kind=5,
+    three_wilds=10,
+    wild_pays={1: 2, 2: 3},
+)
+GAMES = {1: GRID, 2: REELS}
+
+
+def encode_grid_results(apps, schema_editor):
+    """
+    依 pk 分批將 grid_result 文字解析為 (game, grid_code, line_mask)，每批一個交易 + 一次 bulk_update。
+    只處理 grid_code 為空的列，中斷後重新執行會從未轉換的列繼續；無法解析的舊資料保留 game=0 (未知)，
+    原文字由 0025 封存。
+    """
+    SlotMachineRecord = apps.get_model('members', 'SlotMachineRecord')
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                SlotMachineRecord.objects.filter(pk__gt=last_pk, grid_code__isnull=True).order_by('pk')
+                .only('pk', 'grid_result')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            for record in batch:
+                for game, paytable in GAMES.items():
+                    cells = paytable.parse_result(record.grid_result)
+                    if cells is not None:
+                        record.game = game
+                        record.grid_code = paytable.encode(cells)
+                        record.line_mask = paytable.line_mask(cells)
+                        break
+            SlotMachineRecord.objects.bulk_update(batch, ['game', 'grid_code', 'line_mask'])
+        last_pk = batch[-1].pk
+
+
+def decode_grid_results(apps, schema_editor):
+    """
+    反向：由 grid_code 還原 grid_result 文字 (無法解析的列由 0025 的反向還原原文字)。
+    """
+    SlotMachineRecord = apps.get_model('members', 'SlotMachineRecord')
+    last_pk = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                SlotMachineRecord.objects.filter(pk__gt=last_pk, grid_code__isnull=False).order_by('pk')
+                .only('pk', 'game', 'grid_code')[:BATCH_SIZE]
+            )
+            if not batch:
+                break
+            for record in batch:
+                paytable = GAMES.get(record.game)
+                if paytable is not None:
+                    record.grid_result = paytable.format_cells(paytable.decode(record.grid_code))
+            SlotMachineRecord.objects.bulk_update(batch, ['grid_result'])
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+    # 只做資料轉換，分批提交 (大量歷史紀錄時不會長時間鎖住整張表)；欄位變更在 0016 / 0025
+    atomic = False
+
+    dependencies = [
+        ('members', '0023_slot_rollup_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(encode_grid_results, decode_grid_results, atomic=False),
+    ]
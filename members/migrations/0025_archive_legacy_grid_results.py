@@ -0,0 +1,43 @@
+# Generated by Django 5.1.6 on 2026-10-17 09:10
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def archive_unparsed_results(apps, schema_editor):
+    """
+    0024 無法解析的列 (grid_code 為空) 將原 grid_result 文字複製到 legacy_grid_result，再移除舊欄位。
+    """
+    SlotMachineRecord = apps.get_model('members', 'SlotMachineRecord')
+    SlotMachineRecord.objects.filter(grid_code__isnull=True).update(legacy_grid_result=F('grid_result'))
+
+
+def restore_unparsed_results(apps, schema_editor):
+    SlotMachineRecord = apps.get_model('members', 'SlotMachineRecord')
+    SlotMachineRecord.objects.filter(legacy_grid_result__isnull=False).update(grid_result=F('legacy_grid_result'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0024_encode_slot_grid_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='slotmachinerecord',
+            name='legacy_grid_result',
+            field=models.TextField(blank=True, help_text='無法解析為盤面編碼的舊版結果文字 (僅 game=0 的舊資料)', null=True),
+        ),
+        migrations.RunPython(archive_unparsed_results, restore_unparsed_results),
+        # 給預設值，反向 migration 重新加回欄位時既有列才有值可填
+        migrations.AlterField(
+            model_name='slotmachinerecord',
+            name='grid_result',
+            field=models.TextField(default='', help_text='3x3 拉霸結果，如：🍒 🍋 🍒 / 🍋 🍋 🍋 / 🔔 🍒 7'),
+        ),
+        migrations.RemoveField(
+            model_name='slotmachinerecord',
+            name='grid_result',
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.6 on 2026-10-17 08:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('members', '0025_archive_legacy_grid_results'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='googlesheetssyncstate',
+            name='pending_emails',
+            field=models.JSONField(blank=True, default=list, help_text='上次同步因非會員 / 共用 Email 略過的 Email (成為會員後需重新匯入)'),
+        ),
+    ]
@@ -1,13 +1,24 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal
 from datetime import timedelta
 
+from casino.paytable import GRID_GAME, REEL_GAME
+
 # ================================
 # 會員消費紀錄 (ConsumptionRecord)
 # ================================
 class ConsumptionRecord(models.Model):
+    SOURCE_OTHER = ""
+    SOURCE_SHEETS = "sheets"
+    SOURCE_EXCEL = "xlsx"
+    SOURCE_CHOICES = [
+        (SOURCE_OTHER, "手動 / 其他"),
+        (SOURCE_SHEETS, "Google Sheets"),
+        (SOURCE_EXCEL, "Excel 上傳"),
+    ]
+
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -18,11 +29,30 @@ class ConsumptionRecord(models.Model):
     sales_time = models.DateTimeField(default=timezone.now, help_text="銷售時間")
     reward_points = models.IntegerField(default=0, help_text="回饋積分")
     expiry_date = models.DateTimeField(null=True, blank=True, help_text="積分到期時間")
+    sheet_row_key = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False,
+        help_text="Google Sheets / Excel 來源列的自然鍵 (非匯入的紀錄為空)"
+    )
+    source = models.CharField(
+        max_length=10, choices=SOURCE_CHOICES, blank=True, default=SOURCE_OTHER, editable=False,
+        help_text="紀錄來源 (Google Sheets 同步只會刪除來源為 Google Sheets 的紀錄)"
+    )
+
+    class Meta:
+        indexes = [
+            # 個人頁：依銷售時間排序 / 依日期搜尋 / keyset 分頁 (sales_time, id)
+            models.Index(fields=['user', '-sales_time', '-id']),
+            # 個人頁：即將到期積分
+            models.Index(fields=['user', 'expiry_date']),
+        ]
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} 元 - {self.sold_item} - {self.sales_time:%Y-%m-%d %H:%M} - {self.reward_points} 積分"
 
-    def save(self, *args, **kwargs):
+    def fill_derived_fields(self):
+        """
+        計算 expiry_date 與 reward_points (save() 與批次匯入 bulk_create 共用)。
+        """
         # 1. 如果尚未設定 expiry_date，預設為 sales_time + 365 天
         if not self.expiry_date:
             if not self.sales_time:
@@ -36,7 +66,12 @@ class ConsumptionRecord(models.Model):
             # 一般情況：reward_points = 消費金額的 10%
             self.reward_points = int(self.amount * Decimal('0.1'))
 
-        super().save(*args, **kwargs)
+    def save(self, *args, **kwargs):
+        self.fill_derived_fields()
+
+        # 與 MemberBalance 的更新 (post_save) 在同一個交易中完成
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
 
 # ================================
@@ -52,21 +87,150 @@ class RedemptionRecord(models.Model):
     redeemed_item = models.CharField(max_length=200, default="未指定", help_text="兌換品項")
     redemption_time = models.DateTimeField(default=timezone.now, help_text="兌換時間")
 
+    class Meta:
+        indexes = [models.Index(fields=['user', '-redemption_time'])]
+
     def __str__(self):
         return f"{self.user.username} - 兌換 {self.redeemed_item} - 使用 {self.points_used} 積分"
 
+    def save(self, *args, **kwargs):
+        # 與 MemberBalance 的更新 (post_save) 在同一個交易中完成
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
 
 # ================================
 # Google Sheets 同步記錄
 # ================================
 class GoogleSheetsSyncLog(models.Model):
+    SYNC_TYPE_IMPORT = "匯入消費紀錄"
+    SYNC_TYPE_MEMBER_EXPORT = "同步會員資料"
+    SYNC_TYPE_EXCEL_IMPORT = "Excel 匯入"
+
     sync_time = models.DateTimeField(default=timezone.now, help_text="同步時間")
+    sync_type = models.CharField(
+        max_length=20,
+        choices=[
+            (SYNC_TYPE_IMPORT, SYNC_TYPE_IMPORT),
+            (SYNC_TYPE_MEMBER_EXPORT, SYNC_TYPE_MEMBER_EXPORT),
+            (SYNC_TYPE_EXCEL_IMPORT, SYNC_TYPE_EXCEL_IMPORT),
+        ],
+        default=SYNC_TYPE_IMPORT,
+        help_text="同步類型"
+    )
     status = models.CharField(max_length=20, choices=[("成功", "成功"), ("失敗", "失敗")], default="成功")
     message = models.TextField(blank=True, null=True, help_text="同步結果描述")
 
+    # 筆數
+    rows_fetched = models.IntegerField(default=0, help_text="讀取列數")
+    rows_inserted = models.IntegerField(default=0, help_text="新增筆數")
+    rows_updated = models.IntegerField(default=0, help_text="更新筆數")
+    rows_deleted = models.IntegerField(default=0, help_text="刪除筆數")
+    rows_skipped = models.IntegerField(default=0, help_text="略過筆數 (非會員等)")
+    rows_failed = models.IntegerField(default=0, help_text="失敗筆數")
+    warning_count = models.IntegerField(default=0, help_text="警告總數 (明細最多保存 MAX_SYNC_WARNINGS 筆)")
+
+    # 各階段耗時 (秒)
+    fetch_seconds = models.FloatField(default=0, help_text="讀取 Google Sheets 耗時")
+    resolve_seconds = models.FloatField(default=0, help_text="解析會員 Email 耗時")
+    write_seconds = models.FloatField(default=0, help_text="寫入資料庫耗時")
+    commit_seconds = models.FloatField(default=0, help_text="交易提交耗時")
+    total_seconds = models.FloatField(default=0, help_text="總耗時")
+
+    class Meta:
+        indexes = [models.Index(fields=['sync_type', '-sync_time'])]
+
     def __str__(self):
         return f"{self.sync_time.strftime('%Y-%m-%d %H:%M:%S')} - {self.status}"
 
+    @property
+    def rows_per_second(self):
+        if not self.total_seconds:
+            return 0
+        return self.rows_fetched / self.total_seconds
+
+
+class GoogleSheetsSyncWarning(models.Model):
+    """
+    同步時逐列的警告 (非會員 Email 等)，每次同步最多保存 MAX_SYNC_WARNINGS 筆。
+    """
+    sync_log = models.ForeignKey(GoogleSheetsSyncLog, on_delete=models.CASCADE, related_name='warnings')
+    message = models.CharField(max_length=500, help_text="警告內容")
+
+    def __str__(self):
+        return self.message
+
+
+# ================================
+# Google Sheets 同步狀態 (高水位)
+# ================================
+class GoogleSheetsSyncState(models.Model):
+    sheet_label = models.CharField(max_length=200, unique=True, help_text="試算表 ID / 工作表名稱")
+    last_modified = models.CharField(max_length=64, blank=True, default="", help_text="上次同步時試算表的最後修改時間")
+    row_count = models.IntegerField(default=0, help_text="上次同步時的資料列數")
+    synced_at = models.DateTimeField(null=True, blank=True, help_text="上次同步完成時間")
+    pending_emails = models.JSONField(
+        default=list, blank=True, help_text="上次同步因非會員 / 共用 Email 略過的 Email (成為會員後需重新匯入)"
+    )
+
+    def __str__(self):
+        return f"{self.sheet_label} - {self.last_modified or '尚未同步'}"
+
+
+# ================================
+# 背景工作佇列 (BackgroundJob)
+# ================================
+class BackgroundJob(models.Model):
+    """
+    以資料庫為佇列的背景工作 (不需外部 broker)：
+    後台只負責排入工作，由 `python manage.py run_jobs` worker 取出執行。
+    """
+    KIND_SHEETS_IMPORT = "sheets_import"
+    KIND_MEMBER_EXPORT = "member_export"
+    KIND_EXCEL_IMPORT = "excel_import"
+    KIND_XLSX_EXPORT = "xlsx_export"
+    KIND_CHOICES = [
+        (KIND_SHEETS_IMPORT, "從 Google Sheets 匯入消費紀錄"),
+        (KIND_MEMBER_EXPORT, "同步會員資料到 Google Sheets"),
+        (KIND_EXCEL_IMPORT, "從上傳的 Excel 匯入消費紀錄"),
+        (KIND_XLSX_EXPORT, "匯出資料 (Excel)"),
+    ]
+
+    STATUS_PENDING = "pending"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_PENDING, "等待中"),
+        (STATUS_RUNNING, "執行中"),
+        (STATUS_SUCCEEDED, "成功"),
+        (STATUS_FAILED, "失敗"),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, help_text="工作類型")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_PENDING, help_text="狀態")
+    requested_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='background_jobs'
+    )
+    created_at = models.DateTimeField(default=timezone.now, help_text="排入時間")
+    started_at = models.DateTimeField(null=True, blank=True, help_text="開始執行時間")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, help_text="worker 最後回報仍在執行的時間")
+    finished_at = models.DateTimeField(null=True, blank=True, help_text="完成時間")
+    rows_processed = models.IntegerField(default=0, help_text="已處理列數")
+    message = models.TextField(blank=True, default="", help_text="執行結果描述")
+    upload = models.FileField(upload_to='job_uploads/', blank=True, help_text="工作使用的上傳檔案 (執行後刪除)")
+    parameters = models.JSONField(default=dict, blank=True, help_text="傳給執行函式的參數")
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'created_at'])]
+
+    def __str__(self):
+        return f"#{self.pk} {self.get_kind_display()} - {self.get_status_display()}"
+
 
 # ================================
 # 拉霸機紀錄 (SlotMachineRecord)
@@ -77,10 +241,275 @@ class SlotMachineRecord(models.Model):
         on_delete=models.CASCADE,
         related_name='slot_records'
     )
+    # 遊戲種類 (規則見 casino/paytable.py)
+    GAME_UNKNOWN = 0  # 舊資料中無法解析的結果
+    GAME_GRID = 1     # 3x3 拉霸 (GRID_GAME)
+    GAME_REELS = 2    # 三輪拉霸 (REEL_GAME)
+    GAME_CHOICES = [
+        (GAME_UNKNOWN, '未知'),
+        (GAME_GRID, '3x3 拉霸'),
+        (GAME_REELS, '三輪拉霸'),
+    ]
+
     bet = models.IntegerField(help_text="下注積分")
-    grid_result = models.TextField(help_text="3x3 拉霸結果，如：🍒 🍋 🍒 / 🍋 🍋 🍋 / 🔔 🍒 7")
+    game = models.PositiveSmallIntegerField(choices=GAME_CHOICES, default=GAME_UNKNOWN, help_text="遊戲種類")
+    grid_code = models.PositiveIntegerField(
+        null=True, blank=True,
+        help_text="盤面編碼：各格符號索引以符號數為底組成的整數 (Paytable.encode，3x3 < 5^9)"
+    )
+    line_mask = models.PositiveSmallIntegerField(
+        default=0, help_text="中獎線位元遮罩 (bit i 對應 Paytable.line_names[i])"
+    )
+    legacy_grid_result = models.TextField(
+        null=True, blank=True, help_text="無法解析為盤面編碼的舊版結果文字 (僅 game=0 的舊資料)"
+    )
     win_points = models.IntegerField(default=0, help_text="贏得積分(含0)")
     played_at = models.DateTimeField(default=timezone.now, help_text="遊玩時間")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-played_at']),
+            # 結果統計 (casino/stats.py) 依遊戲與時間範圍彙總
+            models.Index(fields=['game', 'played_at']),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - Bet: {self.bet}, Win: {self.win_points}"
+
+    @classmethod
+    def for_spin(cls, game, cells, **kwargs):
+        """
+        依一局的符號索引建立紀錄 (編碼盤面與中獎線)，例如：
+            SlotMachineRecord.for_spin(SlotMachineRecord.GAME_REELS, cells, user=user, bet=bet, win_points=win)
+        """
+        paytable = slot_paytable(game)
+        return cls(game=game, grid_code=paytable.encode(cells), line_mask=paytable.line_mask(cells), **kwargs)
+
+    @property
+    def cells(self):
+        paytable = slot_paytable(self.game)
+        if paytable is None or self.grid_code is None:
+            return None
+        return paytable.decode(self.grid_code)
+
+    @property
+    def grid_result(self):
+        """
+        顯示用的結果文字，如：🍒 🍋 🍒 / 🍋 🍋 🍋 / 🔔 🍒 7 或 symbol1 / wild / symbol3
+        """
+        cells = self.cells
+        if cells is None:
+            return self.legacy_grid_result or ""
+        return slot_paytable(self.game).format_cells(cells)
+
+    def save(self, *args, **kwargs):
+        # 與 MemberBalance 的更新 (post_save) 在同一個交易中完成
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+
+def slot_paytable(game):
+    """
+    SlotMachineRecord.game => casino/paytable.py 的規則 (GAME_UNKNOWN 返回 None)。
+    """
+    return {SlotMachineRecord.GAME_GRID: GRID_GAME, SlotMachineRecord.GAME_REELS: REEL_GAME}.get(game)
+
+
+# ================================
+# 會員積分餘額 (MemberBalance)
+# ================================
+class MemberBalance(models.Model):
+    """
+    每位會員一筆的積分帳本彙總，由 ConsumptionRecord / RedemptionRecord / SlotMachineRecord
+    寫入時同步更新 (見 members/points.py)，讀取餘額只需一次主鍵查詢。
+    可用積分 = (消費回饋 + 拉霸贏分) - (兌換 + 拉霸下注 + 已到期)
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='balance'
+    )
+    earned_points = models.IntegerField(default=0, help_text="消費回饋積分總和")
+    redeemed_points = models.IntegerField(default=0, help_text="兌換使用積分總和")
+    slot_bet_points = models.IntegerField(default=0, help_text="拉霸下注積分總和")
+    slot_win_points = models.IntegerField(default=0, help_text="拉霸贏得積分總和")
+    expired_points = models.IntegerField(default=0, help_text="已到期積分總和")
+    available_points = models.IntegerField(default=0, help_text="目前可用積分")
+    updated_at = models.DateTimeField(auto_now=True, help_text="最後更新時間")
+
+    def __str__(self):
+        return f"{self.user.username} - 可用 {self.available_points} 積分"
+
+
+# ================================
+# 積分批次 (PointLot)
+# ================================
+class PointLot(models.Model):
+    """
+    每筆入帳 (消費回饋、拉霸贏分) 為一個積分批次，各自有到期時間與剩餘積分。
+    兌換與拉霸下注依到期時間由舊到新 (FIFO) 扣除；到期時剩餘積分轉入 expired_points。
+    恆等式：points = 已扣除 + remaining_points + expired_points
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='point_lots'
+    )
+    consumption = models.OneToOneField(
+        ConsumptionRecord,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='point_lot'
+    )
+    slot_record = models.OneToOneField(
+        SlotMachineRecord,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='point_lot'
+    )
+    points = models.IntegerField(help_text="入帳積分")
+    remaining_points = models.IntegerField(help_text="剩餘可用積分")
+    expired_points = models.IntegerField(default=0, help_text="到期未使用的積分")
+    earned_at = models.DateTimeField(help_text="入帳時間")
+    expires_at = models.DateTimeField(help_text="到期時間")
+
+    class Meta:
+        indexes = [
+            # 扣款時依 (到期時間, id) 取得會員最舊的未用完批次
+            models.Index(
+                fields=['user', 'expires_at', 'id'],
+                condition=models.Q(remaining_points__gt=0),
+                name='pointlot_open_fifo_idx'
+            ),
+            # expire_points 只掃描尚有剩餘、已過期的批次
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(remaining_points__gt=0),
+                name='pointlot_open_expiry_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.remaining_points}/{self.points} 積分 (到期 {self.expires_at:%Y-%m-%d})"
+
+
+# ================================
+# 積分到期批次作業紀錄 (PointExpiryRun)
+# ================================
+class PointExpiryRun(models.Model):
+    ran_at = models.DateTimeField(default=timezone.now, help_text="執行時間")
+    expired_through = models.DateTimeField(help_text="本次處理到期時間的上限 (下次從此接續)")
+    members_affected = models.IntegerField(default=0, help_text="受影響會員數")
+    lots_expired = models.IntegerField(default=0, help_text="到期批次數")
+    points_expired = models.IntegerField(default=0, help_text="到期積分總和")
+    expiring_soon_members = models.IntegerField(
+        null=True, blank=True, help_text="本次預先計算「即將到期」的會員數 (未計算為空)"
+    )
+    notifications_sent = models.IntegerField(default=0, help_text="寄出的到期提醒數")
+
+    def __str__(self):
+        return f"{self.ran_at:%Y-%m-%d %H:%M} - 到期 {self.points_expired} 積分"
+
+
+# ================================
+# 即將到期積分摘要 (ExpiringPointsSummary)
+# ================================
+class ExpiringPointsSummary(models.Model):
+    """
+    由 expire_points 每晚以一次 GROUP BY 預先計算：每位會員在 window_end 之前到期、尚未使用的積分。
+    個人頁與到期提醒直接讀取此表；只有即將到期積分 > 0 的會員會有資料列。
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='expiring_points_summary'
+    )
+    points = models.IntegerField(help_text="即將到期的積分")
+    next_expiry = models.DateTimeField(help_text="最早到期時間")
+    window_end = models.DateTimeField(help_text="統計範圍的結束時間")
+    computed_at = models.DateTimeField(help_text="計算時間")
+    notified_at = models.DateTimeField(null=True, blank=True, help_text="上次寄出到期提醒的時間")
+
+    def __str__(self):
+        return f"{self.user.username} - {self.points} 積分將於 {self.next_expiry:%Y-%m-%d} 起到期"
+
+
+# ================================
+# 拉霸每日彙總 (SlotMemberDailyStat / SlotDailyStat / SlotRollupRun)
+# ================================
+class SlotMemberDailyStat(models.Model):
+    """
+    每位會員每天每種遊戲一筆：由 rollup_slot_stats 依水位增量累加 (見 casino/rollups.py)。
+    """
+    day = models.DateField(help_text="遊玩日期 (TIME_ZONE 當地日期)")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='slot_daily_stats')
+    game = models.PositiveSmallIntegerField(choices=SlotMachineRecord.GAME_CHOICES, help_text="遊戲種類")
+    spins = models.IntegerField(default=0, help_text="局數")
+    total_bet = models.BigIntegerField(default=0, help_text="下注積分總和")
+    total_win = models.BigIntegerField(default=0, help_text="贏得積分總和")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'user', 'game'], name='slot_member_daily_unique'),
+        ]
+        indexes = [models.Index(fields=['user', '-day'])]
+
+    def __str__(self):
+        return f"{self.day} {self.user_id} - {self.spins} 局"
+
+
+class SlotDailyStat(models.Model):
+    """
+    每天每種遊戲一筆：由 SlotMemberDailyStat 重新彙總 (unique_players 無法增量累加)。
+    後台報表只讀此表，一年約 730 筆。
+    """
+    day = models.DateField(help_text="遊玩日期 (TIME_ZONE 當地日期)")
+    game = models.PositiveSmallIntegerField(choices=SlotMachineRecord.GAME_CHOICES, help_text="遊戲種類")
+    spins = models.IntegerField(default=0, help_text="局數")
+    total_bet = models.BigIntegerField(default=0, help_text="下注積分總和")
+    total_win = models.BigIntegerField(default=0, help_text="贏得積分總和")
+    unique_players = models.IntegerField(default=0, help_text="遊玩會員數")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'game'], name='slot_daily_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.get_game_display()} - {self.spins} 局"
+
+    @property
+    def house_net(self):
+        """
+        莊家淨收 (消耗的積分) = 下注 - 贏分
+        """
+        return self.total_bet - self.total_win
+
+
+class SlotRollupRun(models.Model):
+    ran_at = models.DateTimeField(default=timezone.now, help_text="執行時間")
+    rolled_up_through = models.DateTimeField(help_text="水位：played_at 不晚於此時間的紀錄皆已彙總 (下次從此接續)")
+    records_processed = models.IntegerField(default=0, help_text="本次彙總的紀錄數")
+    days_affected = models.IntegerField(default=0, help_text="本次更新的日期數")
+    rebuilt = models.BooleanField(default=False, help_text="是否為清除後全部重算")
+
+    def __str__(self):
+        return f"{self.ran_at:%Y-%m-%d %H:%M} - 彙總至 {self.rolled_up_through:%Y-%m-%d %H:%M}"
+
+
+class SlotRollupState(models.Model):
+    """
+    彙總水位的單一狀態列 (pk 固定為 SINGLETON_ID)：每次彙總先 select_for_update 鎖定此列再讀取水位，
+    同時執行的彙總 (含第一次執行與 --rebuild) 因此依序進行，不會重複累加。
+    """
+    SINGLETON_ID = 1
+
+    rolled_up_through = models.DateTimeField(null=True, blank=True, help_text="水位 (尚未彙總過時為空)")
+    updated_at = models.DateTimeField(auto_now=True, help_text="最後更新時間")
+
+    def __str__(self):
+        return f"彙總至 {self.rolled_up_through:%Y-%m-%d %H:%M}" if self.rolled_up_through else "尚未彙總"
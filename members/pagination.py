@@ -0,0 +1,95 @@
+# pagination.py
+# -------------
+# 會員歷史紀錄的分頁工具
+
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+
+class KnownCountPaginator(Paginator):
+    """
+    總筆數已由其他查詢 (例如合併的 aggregate) 取得時使用，省去 Paginator 自己的 COUNT(*)。
+    count 為 None 時退回一般 Paginator 行為。
+    """
+
+    def __init__(self, object_list, per_page, count=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # Paginator.count 是 cached_property，直接寫入快取值
+            self.__dict__['count'] = count
+
+
+# ================================
+# Keyset (cursor) 分頁：以 (排序欄位, id) 定位，深層頁與第一頁成本相同
+# ================================
+class KeysetPage:
+    """
+    一頁 keyset 分頁結果；next_cursor / previous_cursor 為不透明的字串，沒有下一頁 / 上一頁時為 None。
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def encode_cursor(direction, obj, field):
+    raw = f"{direction}|{getattr(obj, field).isoformat()}|{obj.pk}"
+    return urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    """
+    解析 cursor，返回 (direction, value, pk)；格式錯誤時返回 None (視為第一頁)。
+    """
+    try:
+        raw = urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        direction, value, pk = raw.split("|")
+        if direction not in ("next", "prev"):
+            return None
+        return direction, datetime.fromisoformat(value), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, field, per_page, cursor=None):
+    """
+    依 (field, id) 由新到舊分頁，返回 KeysetPage。
+    queryset 的篩選條件 (例如日期搜尋) 會保留；不需要 OFFSET 也不需要 COUNT(*)。
+    cursor 由上一頁的 next_cursor / previous_cursor 而來。
+    """
+    position = decode_cursor(cursor) if cursor else None
+    if position is None:
+        rows = list(queryset.order_by(f'-{field}', '-pk')[:per_page + 1])
+        has_more, has_before = len(rows) > per_page, False
+        rows = rows[:per_page]
+    else:
+        direction, value, pk = position
+        if direction == "next":
+            older = Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk})
+            rows = list(queryset.filter(older).order_by(f'-{field}', '-pk')[:per_page + 1])
+            has_more, has_before = len(rows) > per_page, True
+            rows = rows[:per_page]
+        else:
+            # 往前翻：以遞增順序取得較新的紀錄後反轉
+            newer = Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk})
+            rows = list(queryset.filter(newer).order_by(field, 'pk')[:per_page + 1])
+            has_before, has_more = len(rows) > per_page, True
+            rows = rows[:per_page][::-1]
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor("next", rows[-1], field) if rows and has_more else None,
+        previous_cursor=encode_cursor("prev", rows[0], field) if rows and has_before else None,
+    )
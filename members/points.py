@@ -0,0 +1,395 @@
+# points.py
+# -------------
+# 會員積分帳本：維護 MemberBalance 彙總表，提供 O(1) 的可用積分查詢
+
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from heapq import heappop, heappush
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ConsumptionRecord, RedemptionRecord, SlotMachineRecord, MemberBalance, PointLot
+
+# 積分有效期 (與 ConsumptionRecord.expiry_date 的預設相同)
+POINT_LIFETIME = timedelta(days=365)
+# 「即將到期」的範圍，與預先計算的摘要超過多久視為過舊 (改為即時計算)
+EXPIRING_SOON_DAYS = 30
+EXPIRING_SUMMARY_MAX_AGE = timedelta(days=2)
+
+# 1. 各紀錄表對應到 MemberBalance 的欄位
+#    (紀錄 model, 紀錄上的數值欄位, MemberBalance 欄位)
+BALANCE_SOURCES = [
+    (ConsumptionRecord, 'reward_points', 'earned_points'),
+    (RedemptionRecord, 'points_used', 'redeemed_points'),
+    (SlotMachineRecord, 'bet', 'slot_bet_points'),
+    (SlotMachineRecord, 'win_points', 'slot_win_points'),
+    (PointLot, 'expired_points', 'expired_points'),
+]
+
+BALANCE_FIELDS = [balance_field for _, _, balance_field in BALANCE_SOURCES]
+
+
+def available_from_totals(totals):
+    """
+    可用積分 = (消費回饋 + 拉霸贏分) - (兌換 + 拉霸下注 + 已到期)
+    """
+    return (
+        totals.get('earned_points', 0) + totals.get('slot_win_points', 0)
+        - totals.get('redeemed_points', 0) - totals.get('slot_bet_points', 0)
+        - totals.get('expired_points', 0)
+    )
+
+
+# 2. 從原始紀錄重新計算
+def compute_member_totals(user_id):
+    """
+    從原始紀錄計算單一會員的各項積分總和 (僅用於補建 / 重建，不在一般讀取路徑上)。
+    """
+    totals = {}
+    for model, value_field, balance_field in BALANCE_SOURCES:
+        totals[balance_field] = (
+            model.objects.filter(user_id=user_id).aggregate(total=Sum(value_field))['total'] or 0
+        )
+    return totals
+
+
+def compute_all_member_totals():
+    """
+    以 GROUP BY 一次計算所有會員的各項積分總和，返回 {user_id: totals}。
+    """
+    all_totals = {}
+    for model, value_field, balance_field in BALANCE_SOURCES:
+        rows = model.objects.values('user_id').annotate(total=Sum(value_field)).order_by()
+        for row in rows:
+            totals = all_totals.setdefault(row['user_id'], dict.fromkeys(BALANCE_FIELDS, 0))
+            totals[balance_field] = row['total'] or 0
+    return all_totals
+
+
+def rebuild_member_balance(user_id):
+    """
+    依原始紀錄重建單一會員的 PointLot 與 MemberBalance，返回更新後的 MemberBalance。
+    """
+    rebuild_member_lots(user_id)
+    totals = compute_member_totals(user_id)
+    balance, _ = MemberBalance.objects.update_or_create(
+        user_id=user_id,
+        defaults=dict(totals, available_points=available_from_totals(totals))
+    )
+    return balance
+
+
+# 3. 讀取
+def get_member_balance(user):
+    """
+    以主鍵取得會員的 MemberBalance；若尚未建立 (舊會員) 則從原始紀錄補建。
+    """
+    user_id = getattr(user, 'pk', user)
+    try:
+        return MemberBalance.objects.get(pk=user_id)
+    except MemberBalance.DoesNotExist:
+        with transaction.atomic():
+            return rebuild_member_balance(user_id)
+
+
+def get_available_points(user):
+    """
+    取得會員目前可用積分 (單一主鍵查詢)。
+    """
+    return get_member_balance(user).available_points
+
+
+# 4. 寫入時的增量更新
+def record_deltas(instance, sign=1):
+    """
+    計算單筆紀錄對 MemberBalance 各欄位的增量。
+    """
+    deltas = {}
+    for model, value_field, balance_field in BALANCE_SOURCES:
+        if isinstance(instance, model):
+            deltas[balance_field] = sign * (getattr(instance, value_field) or 0)
+    return deltas
+
+
+def apply_balance_delta(user_id, deltas, create_missing=True):
+    """
+    以 F() 表達式在資料庫端原子地累加 MemberBalance。
+    若該會員尚無 MemberBalance：create_missing=True 時從原始紀錄補建
+    (此時新紀錄已寫入同一交易，補建結果已包含它)，否則略過 (例如會員本身正在被刪除)。
+    """
+    if not deltas:
+        return
+    updates = {field: F(field) + delta for field, delta in deltas.items()}
+    updates['available_points'] = F('available_points') + available_from_totals(deltas)
+    updates['updated_at'] = timezone.now()
+    updated = MemberBalance.objects.filter(pk=user_id).update(**updates)
+    if not updated and create_missing:
+        rebuild_member_balance(user_id)
+
+
+# 5. 扣款 (兌換、拉霸下注) 的共用交易單位
+class InsufficientPointsError(Exception):
+    """
+    可用積分不足以支付本次扣款。
+    """
+
+
+@contextmanager
+def spend_points(user, points):
+    """
+    鎖定會員的 MemberBalance 列 (select_for_update)，確認可用積分 >= points 後，
+    於同一交易中執行 with 區塊 (寫入 RedemptionRecord / SlotMachineRecord)。
+    同一會員的並行扣款會依序執行，不同會員之間互不阻塞；積分不足則拋出 InsufficientPointsError。
+
+        with spend_points(user, bet):
+            SlotMachineRecord.objects.create(user=user, bet=bet, ...)
+    """
+    if points <= 0:
+        raise ValueError("扣款積分必須為正整數")
+    user_id = getattr(user, 'pk', user)
+    # 先確保 MemberBalance 列存在，才有列可以鎖定
+    get_member_balance(user_id)
+    with transaction.atomic():
+        balance = MemberBalance.objects.select_for_update().get(pk=user_id)
+        # 已過期但尚未被 expire_points 處理的批次先到期，確保過期積分不能使用
+        if expire_member_lots(user_id)[0]:
+            balance.refresh_from_db()
+        if balance.available_points < points:
+            raise InsufficientPointsError(
+                f"可用積分 {balance.available_points} 不足以扣除 {points} 積分"
+            )
+        yield balance
+
+
+# 6. 批次寫入 (bulk_create 不觸發 signal) 後的彙總更新
+def apply_balance_deltas(records, sign=1):
+    """
+    依會員彙總多筆紀錄的增量後套用到 MemberBalance，每位會員一次 UPDATE，並建立 / 扣除對應的 PointLot。
+    須在寫入紀錄的同一個交易中呼叫。
+    """
+    apply_records_to_lots(records)
+    per_user = {}
+    for record in records:
+        totals = per_user.setdefault(record.user_id, {})
+        for field, delta in record_deltas(record, sign).items():
+            totals[field] = totals.get(field, 0) + delta
+    for user_id, deltas in per_user.items():
+        apply_balance_delta(user_id, deltas)
+    # 匯入時即已過期的舊紀錄 (例如補匯入一年前的銷售) 立即到期
+    now = timezone.now()
+    for user_id in {r.user_id for r in records if arrives_expired(r, now)}:
+        expire_member_lots(user_id, now)
+
+
+def apply_slot_batch(user_id, records, now=None):
+    """
+    同一會員連續多局拉霸 (自動轉) 以 bulk_create 寫入後的 PointLot / MemberBalance 更新。
+    須在 spend_points 鎖定的交易中呼叫。
+    下注總額先依 FIFO 從既有批次扣除，不足的部分 (用前幾局的贏分繼續下注) 再依序從本次的贏分批次扣除：
+    贏分批次的到期時間 (played_at + 一年) 晚於既有批次，結果與逐局套用相同，但查詢次數與局數無關。
+    """
+    win_lots = [lot_for_slot_win(r) for r in records if r.win_points > 0]
+    remaining = consume_lots(user_id, sum(r.bet for r in records), now)
+    for lot in win_lots:
+        if remaining <= 0:
+            break
+        used = min(remaining, lot.remaining_points)
+        lot.remaining_points -= used
+        remaining -= used
+    PointLot.objects.bulk_create(win_lots)
+    apply_balance_delta(user_id, {
+        'slot_bet_points': sum(r.bet for r in records),
+        'slot_win_points': sum(r.win_points for r in records),
+    })
+
+
+# 7. 積分批次 (PointLot)：FIFO 扣款與到期
+def lot_for_consumption(record):
+    return PointLot(
+        user_id=record.user_id,
+        consumption=record,
+        points=record.reward_points,
+        remaining_points=record.reward_points,
+        earned_at=record.sales_time,
+        expires_at=record.expiry_date or record.sales_time + POINT_LIFETIME
+    )
+
+
+def lot_for_slot_win(record):
+    return PointLot(
+        user_id=record.user_id,
+        slot_record=record,
+        points=record.win_points,
+        remaining_points=record.win_points,
+        earned_at=record.played_at,
+        expires_at=record.played_at + POINT_LIFETIME
+    )
+
+
+def consume_lots(user_id, points, now=None):
+    """
+    從最早到期的未過期批次依序扣除 points (走 pointlot_open_fifo_idx 索引，只讀取實際用到的批次)。
+    須在鎖定 MemberBalance 的交易中呼叫 (見 spend_points)；返回未能分配的積分 (正常為 0)。
+    """
+    now = now or timezone.now()
+    changed = []
+    open_lots = PointLot.objects.filter(
+        user_id=user_id, remaining_points__gt=0, expires_at__gt=now
+    ).order_by('expires_at', 'id')
+    for lot in open_lots.iterator(chunk_size=20):
+        if points <= 0:
+            break
+        used = min(points, lot.remaining_points)
+        lot.remaining_points -= used
+        points -= used
+        changed.append(lot)
+    PointLot.objects.bulk_update(changed, ['remaining_points'])
+    return points
+
+
+def arrives_expired(record, now):
+    """
+    入帳紀錄建立時是否已超過到期時間 (只有消費回饋可能補登過去的日期)。
+    """
+    return (
+        isinstance(record, ConsumptionRecord) and record.reward_points > 0
+        and lot_for_consumption(record).expires_at <= now
+    )
+
+
+def apply_record_to_lots(record):
+    """
+    新增的紀錄對 PointLot 的影響：入帳建立批次，扣款 (兌換、下注、負數消費) 依 FIFO 扣除。
+    """
+    if isinstance(record, ConsumptionRecord):
+        if record.reward_points > 0:
+            lot_for_consumption(record).save()
+        elif record.reward_points < 0:
+            consume_lots(record.user_id, -record.reward_points)
+    elif isinstance(record, RedemptionRecord):
+        consume_lots(record.user_id, record.points_used)
+    elif isinstance(record, SlotMachineRecord):
+        # 先扣下注，贏分再成為新的批次
+        consume_lots(record.user_id, record.bet)
+        if record.win_points > 0:
+            lot_for_slot_win(record).save()
+
+
+def apply_records_to_lots(records):
+    """
+    批次版本：正數消費回饋一次 bulk_create 成批次，其餘紀錄逐筆套用。
+    """
+    records = list(records)
+    credits = [r for r in records if isinstance(r, ConsumptionRecord) and r.reward_points > 0]
+    PointLot.objects.bulk_create([lot_for_consumption(r) for r in credits])
+    credit_ids = {id(r) for r in credits}
+    for record in records:
+        if id(record) not in credit_ids:
+            apply_record_to_lots(record)
+
+
+def expire_member_lots(user_id, now=None):
+    """
+    將會員已到期且仍有剩餘的批次轉為到期，並更新 MemberBalance.expired_points。
+    返回 (到期批次數, 到期積分)。須在鎖定 MemberBalance 的交易中呼叫。
+    """
+    now = now or timezone.now()
+    lots = list(PointLot.objects.filter(user_id=user_id, remaining_points__gt=0, expires_at__lte=now))
+    expired = 0
+    for lot in lots:
+        expired += lot.remaining_points
+        lot.expired_points += lot.remaining_points
+        lot.remaining_points = 0
+    if lots:
+        PointLot.objects.bulk_update(lots, ['remaining_points', 'expired_points'])
+        apply_balance_delta(user_id, {'expired_points': expired})
+    return len(lots), expired
+
+
+def rebuild_member_lots(user_id, now=None):
+    """
+    依時間順序重播會員所有紀錄，重建 PointLot (紀錄被修改 / 刪除、或舊會員第一次建立批次時)。
+    未用完的批次放在以 (到期時間, 順序) 排序的 heap 中，每次扣款 O(log n)。
+    舊資料中超過當時未到期積分的扣款 (啟用到期制度前)，差額視為由最早到期的已到期批次支付。
+    """
+    now = now or timezone.now()
+    # (時間, 同時間的先後, 批次或扣款積分)：同一時間先入帳消費回饋，再扣款，拉霸贏分最後
+    events = []
+    for record in ConsumptionRecord.objects.filter(user_id=user_id):
+        if record.reward_points > 0:
+            events.append((record.sales_time, 0, lot_for_consumption(record)))
+        elif record.reward_points < 0:
+            events.append((record.sales_time, 1, -record.reward_points))
+    for record in RedemptionRecord.objects.filter(user_id=user_id):
+        events.append((record.redemption_time, 1, record.points_used))
+    for record in SlotMachineRecord.objects.filter(user_id=user_id):
+        events.append((record.played_at, 1, record.bet))
+        if record.win_points > 0:
+            events.append((record.played_at, 2, lot_for_slot_win(record)))
+    events.sort(key=lambda event: event[:2])
+
+    lots, heap, expired_lots = [], [], []
+
+    def expire_until(moment):
+        while heap and heap[0][0] <= moment:
+            _, _, lot = heappop(heap)
+            lot.expired_points, lot.remaining_points = lot.remaining_points, 0
+            expired_lots.append(lot)
+
+    for seq, (moment, _, item) in enumerate(events):
+        expire_until(moment)
+        if isinstance(item, PointLot):
+            lots.append(item)
+            heappush(heap, (item.expires_at, seq, item))
+            continue
+
+        points = item
+        while points and heap:
+            lot = heap[0][2]
+            used = min(points, lot.remaining_points)
+            lot.remaining_points -= used
+            points -= used
+            if not lot.remaining_points:
+                heappop(heap)
+        for lot in expired_lots:
+            if not points:
+                break
+            used = min(points, lot.expired_points)
+            lot.expired_points -= used
+            points -= used
+    expire_until(now)
+
+    PointLot.objects.filter(user_id=user_id).delete()
+    PointLot.objects.bulk_create(lots)
+    return lots
+
+
+# 8. 修改 / 刪除紀錄後的重建
+_deferred = threading.local()
+
+
+@contextmanager
+def deferred_rebuilds():
+    """
+    區塊內修改 / 刪除紀錄時，每位會員只在區塊結束時重建一次 (例如同步時刪除大量試算表列)。
+    """
+    outer = getattr(_deferred, 'user_ids', None)
+    _deferred.user_ids = set()
+    try:
+        yield
+        user_ids = _deferred.user_ids
+    finally:
+        _deferred.user_ids = outer
+    for user_id in user_ids:
+        schedule_rebuild(user_id)
+
+
+def schedule_rebuild(user_id):
+    user_ids = getattr(_deferred, 'user_ids', None)
+    if user_ids is not None:
+        user_ids.add(user_id)
+    else:
+        rebuild_member_balance(user_id)
@@ -0,0 +1,131 @@
+# row_cleaning.py
+# -------------
+# 試算表列的資料清洗：正規表示式預先編譯、已是數字的值走快速路徑，一批紀錄依欄位一次清洗。
+# 清洗問題以 logging 記錄：每種問題只以 WARNING 記錄前幾筆，其餘只計數 (不再逐列 print 到 stdout)。
+
+import logging
+import re
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+
+logger = logging.getLogger(__name__)
+
+# process_record 轉為 Decimal 的欄位
+DECIMAL_FIELDS = ("金額", "價格", "數量")
+# 每種清洗問題以 WARNING 記錄的筆數上限 (每個 RowCleaner)
+LOG_LIMIT_PER_ISSUE = 5
+
+_PLAIN_NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+_NON_NUMERIC = re.compile(r"[^\d.\-]")
+
+# 清洗問題種類
+ISSUE_EMPTY = "empty"
+ISSUE_NO_DIGITS = "no_digits"
+ISSUE_MULTIPLE_POINTS = "multiple_points"
+ISSUE_INVALID = "invalid"
+ISSUE_LABELS = {
+    ISSUE_EMPTY: "空值",
+    ISSUE_NO_DIGITS: "清洗後為空",
+    ISSUE_MULTIPLE_POINTS: "含多個小數點",
+    ISSUE_INVALID: "無法轉為數字",
+}
+
+
+# 1. 單一值
+def safe_strip(value):
+    """
+    若 value 不是字串，先轉換為字串，再移除前後空白。
+    """
+    if not isinstance(value, str):
+        value = str(value)
+    return value.strip()
+
+
+def clean_decimal(value, default="0"):
+    """
+    將 value 轉為 Decimal，返回 (Decimal, 問題種類或 None)；有問題時數值為 default。
+    1. Decimal / int 直接使用；去除空白與千分位逗號後已是一般數字 (如 -12.5) 的字串直接轉換 (快速路徑)。
+    2. 其他字串只保留數字、小數點與負號 (如 "NT$ 1,000" => 1000)。
+    3. 若結果為空、包含多個小數點或仍無法轉換，則返回 default。
+    """
+    if isinstance(value, Decimal):
+        return value, None
+    if type(value) is int:
+        return Decimal(value), None
+    value = safe_strip(value).replace(",", "")
+    if not value:
+        return Decimal(default), ISSUE_EMPTY
+    if _PLAIN_NUMBER.fullmatch(value):
+        return Decimal(value), None
+
+    cleaned = _NON_NUMERIC.sub("", value)
+    if not cleaned:
+        return Decimal(default), ISSUE_NO_DIGITS
+    if cleaned.count('.') > 1:
+        return Decimal(default), ISSUE_MULTIPLE_POINTS
+    try:
+        return Decimal(cleaned), None
+    except InvalidOperation:
+        return Decimal(default), ISSUE_INVALID
+
+
+# 2. 整批清洗 (同一次同步 / 匯入共用一個 RowCleaner)
+class RowCleaner:
+    """
+    依欄位清洗整批紀錄，並累計各種清洗問題的次數 (self.issues)。
+    每種問題只以 WARNING 記錄前 log_limit 筆，結束時以 log_summary() 記錄總數。
+    """
+
+    def __init__(self, decimal_fields=DECIMAL_FIELDS, log_limit=LOG_LIMIT_PER_ISSUE):
+        self.decimal_fields = frozenset(decimal_fields)
+        self.log_limit = log_limit
+        self.issues = Counter()
+
+    def report(self, issue, field, value, default):
+        self.issues[issue] += 1
+        if self.issues[issue] <= self.log_limit:
+            logger.warning(
+                "清洗 %s=%r：%s，使用預設值 %s", field, value, ISSUE_LABELS[issue], default,
+                extra={'issue': issue, 'field': field},
+            )
+
+    def decimals(self, values, field="", default="0"):
+        result = []
+        for value in values:
+            number, issue = clean_decimal(value, default)
+            if issue is not None:
+                self.report(issue, field, value, default)
+            result.append(number)
+        return result
+
+    def strings(self, values):
+        return [value.strip() if type(value) is str else safe_strip(value) for value in values]
+
+    def clean_batch(self, records):
+        """
+        清洗一批欄位相同的紀錄 (list of dict，欄位以第一筆為準)：每個欄位整欄處理一次。
+        DECIMAL_FIELDS 欄位轉為 Decimal，其他欄位去除前後空白。
+        """
+        if not records:
+            return []
+        columns = []
+        for key in records[0]:
+            column = [record.get(key, "") for record in records]
+            columns.append(self.decimals(column, key) if key in self.decimal_fields else self.strings(column))
+        keys = list(records[0])
+        return [dict(zip(keys, row)) for row in zip(*columns)]
+
+    def summary(self):
+        """
+        例如「空值 3 筆、含多個小數點 1 筆」；沒有問題時返回空字串。
+        """
+        return "、".join(f"{ISSUE_LABELS[issue]} {count} 筆" for issue, count in sorted(self.issues.items()))
+
+    def log_summary(self):
+        if not self.issues:
+            return
+        suppressed = sum(max(0, count - self.log_limit) for count in self.issues.values())
+        logger.info(
+            "資料清洗問題：%s (另有 %d 筆未逐筆記錄)", self.summary(), suppressed,
+            extra={'issues': dict(self.issues)},
+        )
@@ -0,0 +1,164 @@
+# sales_time.py
+# -------------
+# 銷售時間欄位的解析：試算表同一欄幾乎只用一種格式 => 以樣本偵測格式並快取，整欄一次解析。
+# 無法解析的值返回 None 並回報 (不以現在時間代替，否則會算錯積分到期日)。
+
+import re
+from datetime import datetime
+
+import numpy as np
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+
+# 補零 ISO 字串的長度 (YYYY-MM-DD、YYYY-MM-DD HH:MM、YYYY-MM-DD HH:MM:SS)
+ISO_LENGTHS = (10, 16, 19)
+
+
+def parse_padded_iso(value):
+    """
+    補零的 YYYY-MM-DD[ HH:MM[:SS]] => naive datetime；其他值 (未補零、含時區、ISO 週日期等) 返回 None。
+    """
+    value = value.strip()
+    if len(value) not in ISO_LENGTHS or value[4:5] != "-" or value[7:8] != "-":
+        return None
+    try:
+        dt = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return dt if dt.tzinfo is None else None
+
+
+class SalesTimeFormat:
+    """
+    一種銷售時間格式：以預先編譯的正規表示式比對並直接組出 datetime (比 strptime 快，失敗時不拋例外)。
+    iso 為 True 時 (YYYY-MM-DD 系列)，補零的值改用 C 實作的 datetime.fromisoformat，
+    整欄也可交給 numpy datetime64 解析。
+    """
+
+    def __init__(self, name, pattern, iso=False):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.iso = iso
+
+    def parse(self, value, tz):
+        if self.iso:
+            dt = parse_padded_iso(value)
+            if dt is not None:
+                return dt.replace(tzinfo=tz)
+        match = self.regex.match(value)
+        if match is None:
+            return None
+        try:
+            return datetime(*map(int, match.groups()), tzinfo=tz)
+        except ValueError:  # 例如 2025/02/30
+            return None
+
+    def __str__(self):
+        return self.name
+
+
+# 依常見程度排列 (時、分、秒為選用的變化各自列出，偵測時可精確選定)
+SALES_TIME_FORMATS = [
+    SalesTimeFormat("YYYY/MM/DD", r'^\s*(\d{4})/(\d{1,2})/(\d{1,2})\s*$'),
+    SalesTimeFormat("YYYY/MM/DD HH:MM", r'^\s*(\d{4})/(\d{1,2})/(\d{1,2})[ T](\d{1,2}):(\d{2})\s*$'),
+    SalesTimeFormat("YYYY/MM/DD HH:MM:SS", r'^\s*(\d{4})/(\d{1,2})/(\d{1,2})[ T](\d{1,2}):(\d{2}):(\d{2})\s*$'),
+    SalesTimeFormat("YYYY-MM-DD", r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})\s*$', iso=True),
+    SalesTimeFormat("YYYY-MM-DD HH:MM", r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})[ T](\d{1,2}):(\d{2})\s*$', iso=True),
+    SalesTimeFormat(
+        "YYYY-MM-DD HH:MM:SS", r'^\s*(\d{4})-(\d{1,2})-(\d{1,2})[ T](\d{1,2}):(\d{2}):(\d{2})\s*$', iso=True
+    ),
+]
+
+# 偵測格式時取樣的非空白值數量
+SNIFF_SAMPLE_SIZE = 20
+# 整欄至少這麼多筆時才使用 numpy 快速路徑 (少量資料時轉換成本較高)
+NUMPY_MIN_ROWS = 1000
+
+
+def parse_sales_time(value, tz=None):
+    """
+    單一值的完整解析：依序嘗試各格式，最後以 Django parse_datetime (ISO 8601，含時區) 解析。
+    無法解析時返回 None。
+    """
+    tz = tz or timezone.get_current_timezone()
+    value = (value or "").strip()
+    for fmt in SALES_TIME_FORMATS:
+        dt = fmt.parse(value, tz)
+        if dt is not None:
+            return dt
+    try:
+        dt = parse_datetime(value)
+    except ValueError:
+        return None
+    if dt is not None and timezone.is_naive(dt):
+        dt = dt.replace(tzinfo=tz)
+    return dt
+
+
+class SalesTimeParser:
+    """
+    整欄解析銷售時間。第一次解析時以樣本偵測格式並快取在 self.format (同一次同步的後續批次沿用)；
+    不符合快取格式的個別值改走完整解析，仍失敗者列入 failures。
+
+        parser = SalesTimeParser()
+        times, failures = parser.parse_column(values)   # failures: [(索引, 原始值), ...]
+    """
+
+    def __init__(self, formats=SALES_TIME_FORMATS, use_numpy=True):
+        self.formats = formats
+        self.format = None
+        self.use_numpy = use_numpy
+
+    def sniff(self, values):
+        """
+        返回與樣本全部相符的第一個格式；沒有時返回與最多樣本相符的格式 (都不符合則為 None)。
+        """
+        sample = [v.strip() for v in values if v and v.strip()][:SNIFF_SAMPLE_SIZE]
+        if not sample:
+            return None
+        best, best_hits = None, 0
+        for fmt in self.formats:
+            hits = sum(1 for v in sample if fmt.regex.match(v))
+            if hits == len(sample):
+                return fmt
+            if hits > best_hits:
+                best, best_hits = fmt, hits
+        return best
+
+    def parse_column(self, values):
+        values = list(values)
+        if self.format is None:
+            self.format = self.sniff(values)
+        tz = timezone.get_current_timezone()
+
+        times = None
+        if self.use_numpy and self.format is not None and self.format.iso and len(values) >= NUMPY_MIN_ROWS:
+            times = self._parse_numpy(values, tz)
+        if times is None:
+            fmt = self.format
+            times = [fmt.parse(v, tz) if fmt is not None else None for v in values]
+
+        failures = []
+        for i, dt in enumerate(times):
+            if dt is None:
+                # 與快取格式不同的個別值 => 完整解析
+                times[i] = parse_sales_time(values[i], tz)
+                if times[i] is None:
+                    failures.append((i, values[i]))
+        return times, failures
+
+    def _parse_numpy(self, values, tz):
+        """
+        numpy datetime64 整欄解析：只交給 numpy 長度符合 YYYY-MM-DD[ HH:MM[:SS]] 的值，
+        其餘 (如未補零的 2025-1-3、或 numpy 也接受的 2025-01) 轉成 NaT => None，交回完整解析。
+        """
+        iso = []
+        for v in values:
+            v = v.strip()
+            iso.append(v.replace(" ", "T") if len(v) in ISO_LENGTHS else "")
+        try:
+            parsed = np.array(iso, dtype='datetime64[s]')
+        except ValueError:
+            return None
+        return [None if dt is None else dt.replace(tzinfo=tz) for dt in parsed.astype(object)]
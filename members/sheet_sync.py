@@ -0,0 +1,439 @@
+# sheet_sync.py
+# -------------
+# 將 Google Sheets 的每日銷售明細「增量」同步為 ConsumptionRecord：
+# 只新增新出現的列、只刪除已從試算表消失的列，其他紀錄 (手動新增、Excel 上傳、拉霸中獎) 不受影響。
+# 欄位對應、自然鍵與批次寫入也供 Excel 上傳 (excel_import.py) 使用。
+
+import hashlib
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from .google_sheets import (
+    call_with_backoff,
+    fetch_sheet_last_update_time,
+    iter_google_sheets_records,
+    open_worksheet,
+    sheet_label,
+)
+from .member_cache import invalidate_member_cache
+from .models import ConsumptionRecord, GoogleSheetsSyncLog, GoogleSheetsSyncState
+from .points import apply_balance_deltas, deferred_rebuilds
+from .row_cleaning import RowCleaner
+from .sales_time import SalesTimeParser
+from .sync_metrics import SyncMetrics
+
+
+# 1. 試算表列的自然鍵
+def sheet_row_key(email, sales_time_str, sold_item, amount, occurrence=0, source=ConsumptionRecord.SOURCE_SHEETS):
+    """
+    以 Email + 銷售時間 + 品項 + 金額 (+ 同內容的第幾次出現) 計算穩定的 SHA-256 自然鍵。
+    使用原始的銷售時間字串，鍵值不受時間解析結果影響 (無法解析的列下次同步仍對應同一鍵)。
+    Google Sheets 以外的來源 (Excel 上傳) 以來源名稱區隔，不會與試算表列的鍵相同。
+    """
+    amount_str = format(amount.normalize(), 'f') if isinstance(amount, Decimal) else str(amount)
+    parts = [email, sales_time_str, sold_item, amount_str, str(occurrence)]
+    if source != ConsumptionRecord.SOURCE_SHEETS:
+        parts.insert(0, source)
+    raw = "\x1f".join(parts)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def iter_sheet_rows(records, seen_keys, cleaner=None, chunk_size=1000, source=ConsumptionRecord.SOURCE_SHEETS):
+    """
+    將試算表紀錄清洗為 (key, row)，row 含 email / amount / sold_item / sales_time_str。
+    每 chunk_size 筆依欄位整批清洗一次 (金額問題累計在 cleaner)。
+    內容完全相同的多列以出現順序區分 (沿用 seen_keys 判斷第幾次出現，不另外保存整列內容)，
+    每個產生的鍵都會加入 seen_keys。
+    """
+    cleaner = cleaner or RowCleaner()
+    for chunk in iter_batches(records, chunk_size):
+        emails = cleaner.strings(record.get("會員 Email", "") for record in chunk)
+        amounts = cleaner.decimals((record.get("消費金額(元)", "0") for record in chunk), "消費金額(元)")
+        sold_items = cleaner.strings(record.get("銷售品項", "未知品項") for record in chunk)
+        sales_time_strs = cleaner.strings(record.get("銷售時間", "") for record in chunk)
+
+        for email, amount, sold_item, sales_time_str in zip(emails, amounts, sold_items, sales_time_strs):
+            occurrence = 0
+            key = sheet_row_key(email, sales_time_str, sold_item, amount, occurrence, source)
+            while key in seen_keys:
+                occurrence += 1
+                key = sheet_row_key(email, sales_time_str, sold_item, amount, occurrence, source)
+            seen_keys.add(key)
+            yield key, {
+                "email": email,
+                "amount": amount,
+                "sold_item": sold_item,
+                "sales_time_str": sales_time_str,
+            }
+
+
+def iter_batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _legacy_match_key(user_id, sold_item, amount, sales_time):
+    return (user_id, sold_item, Decimal(amount).quantize(Decimal("0.01")), sales_time)
+
+
+def resolve_member_emails(emails):
+    """
+    以單一 IN 查詢將 Email 對應到會員 ID。
+    返回 (email_to_user_id, duplicate_emails)；重複 Email (多位會員共用) 不會出現在對應表中。
+    """
+    email_to_user_id = {}
+    duplicates = set()
+    for email, user_id in User.objects.filter(email__in=set(emails)).values_list('email', 'id'):
+        if email in email_to_user_id:
+            duplicates.add(email)
+        email_to_user_id[email] = user_id
+    for email in duplicates:
+        del email_to_user_id[email]
+    return email_to_user_id, duplicates
+
+
+def load_legacy_rows():
+    """
+    舊版同步 (整表刪除重建) 留下的紀錄沒有自然鍵，以內容建立對照表：
+    {(user_id, sold_item, amount, sales_time): [id, ...]}
+    """
+    legacy = defaultdict(list)
+    legacy_rows = (
+        ConsumptionRecord.objects.filter(sheet_row_key__isnull=True)
+        .exclude(sold_item="3x3 拉霸中獎")
+        .values_list('id', 'user_id', 'sold_item', 'amount', 'sales_time')
+    )
+    for pk, user_id, sold_item, amount, sales_time in legacy_rows:
+        legacy[_legacy_match_key(user_id, sold_item, amount, sales_time)].append(pk)
+    return legacy
+
+
+def import_batch(batch, legacy, batch_size, metrics, time_parser=None, source=ConsumptionRecord.SOURCE_SHEETS,
+                 skipped_emails=None):
+    """
+    匯入一批新出現的 (key, row)：一次 IN 查詢解析 Email、整欄解析銷售時間，於記憶體建立紀錄後 bulk_create，
+    並依會員彙總更新 MemberBalance。筆數、耗時與警告累計到 metrics。
+    銷售時間無法解析的列不新增 (計入 failed)，修正試算表後下次同步會再匯入。
+    time_parser 傳入同一個 SalesTimeParser 可讓各批沿用第一批偵測到的格式；
+    skipped_emails (set) 收集因找不到唯一會員而略過的 Email。
+    """
+    time_parser = time_parser or SalesTimeParser()
+    with metrics.timer('resolve'):
+        email_to_user_id, duplicate_emails = resolve_member_emails(row["email"] for _, row in batch)
+        sales_times, failures = time_parser.parse_column(row["sales_time_str"] for _, row in batch)
+    for email in sorted(duplicate_emails):
+        metrics.warn(f"⚠️ 多筆會員共用 Email: {email}，相關紀錄未新增。")
+
+    # 在記憶體中建立紀錄 (reward_points / expiry_date 與 save() 算法相同)
+    to_create = []
+    to_adopt = []
+    for (key, row), sales_time in zip(batch, sales_times):
+        user_id = email_to_user_id.get(row["email"])
+        if user_id is None:
+            if row["email"] not in duplicate_emails:
+                # 0 筆 => 視為非會員，不建立紀錄
+                metrics.warn(f"⚠️ 非會員 Email: {row['email']}，此筆未新增。")
+            metrics.add('skipped')
+            if skipped_emails is not None:
+                skipped_emails.add(row["email"])
+            continue
+        if sales_time is None:
+            metrics.warn(f"⚠️ 無法解析銷售時間: {row['sales_time_str']!r} ({row['email']})，此筆未新增。")
+            metrics.add('failed')
+            continue
+
+        legacy_ids = legacy.get(_legacy_match_key(user_id, row["sold_item"], row["amount"], sales_time))
+        if legacy_ids:
+            # 內容相符的舊紀錄直接補上鍵值，避免第一次增量同步時重複新增
+            to_adopt.append(ConsumptionRecord(pk=legacy_ids.pop(), sheet_row_key=key, source=source))
+            continue
+
+        record = ConsumptionRecord(
+            user_id=user_id,
+            amount=row["amount"],
+            sold_item=row["sold_item"],
+            sales_time=sales_time,
+            sheet_row_key=key,
+            source=source,
+        )
+        record.fill_derived_fields()
+        to_create.append(record)
+
+    with metrics.timer('write'):
+        ConsumptionRecord.objects.bulk_update(to_adopt, ['sheet_row_key', 'source'], batch_size=batch_size)
+        ConsumptionRecord.objects.bulk_create(to_create, batch_size=batch_size)
+        # bulk_create 不觸發 signal => 依會員彙總後更新 MemberBalance，並使摘要快取失效
+        apply_balance_deltas(to_create)
+        for user_id in {record.user_id for record in to_create}:
+            invalidate_member_cache(user_id)
+    metrics.add('inserted', len(to_create))
+    metrics.add('updated', len(to_adopt))
+
+
+# 2. 增量同步
+class SheetSyncError(Exception):
+    """
+    同步中途失敗 (例如讀取 Google Sheets 時發生 API 錯誤)。
+    """
+
+
+def _report_progress(records, progress, every):
+    """
+    每讀取 every 筆紀錄呼叫一次 progress(已讀取筆數)。
+    """
+    count = 0
+    for record in records:
+        yield record
+        count += 1
+        if progress and count % every == 0:
+            progress(count)
+
+
+def update_from_google_sheets_logic(batch_size=None, sheet=None, progress=None):
+    """
+    純邏輯函式：不需要 request 或權限檢查，方便 management command 或其他地方呼叫。
+    從 Google Sheets 分段串流讀取資料，並以自然鍵增量同步到 Django 資料庫 (與 Sheet9 保持一致)：
+      - 試算表最後修改時間與上次同步相同，且上次略過的 Email 仍不是會員 => 直接略過 (高水位)
+      - 新出現的列 => 每批 bulk_create (各批獨立提交)；已從試算表消失的列 => 讀完後刪除；其餘不動
+    如果找不到唯一會員 (0 或多筆) 就跳過該筆 (視為非會員)。
+    每次同步 (含略過與失敗) 都會寫入一筆含筆數與各階段耗時的 GoogleSheetsSyncLog。
+    sheet 可傳入 FakeWorksheet 等替身以離線執行；progress(已讀取列數) 供背景工作回報進度。
+    失敗時拋出 SheetSyncError。
+    """
+    batch_size = batch_size or settings.SHEETS_IMPORT_BATCH_SIZE
+    metrics = SyncMetrics(GoogleSheetsSyncLog.SYNC_TYPE_IMPORT)
+
+    seen_keys = set()
+    try:
+        # 開啟試算表 / 讀取同步狀態也在 try 內：任何失敗都會寫入 GoogleSheetsSyncLog
+        state, _ = GoogleSheetsSyncState.objects.get_or_create(sheet_label=sheet_label())
+        last_modified = None
+        if sheet is None:
+            with metrics.timer('fetch'):
+                last_modified = fetch_sheet_last_update_time()
+            # 上次因非會員略過的列在該 Email 註冊後需要匯入，即使試算表沒有變更
+            registered, _ = resolve_member_emails(state.pending_emails)
+            if last_modified and last_modified == state.last_modified and not registered:
+                message = "✅ Google Sheets 自上次同步後沒有變更，略過同步。\n"
+                metrics.write_log("成功", message)
+                return message
+
+        existing_keys = set(
+            ConsumptionRecord.objects.filter(source=ConsumptionRecord.SOURCE_SHEETS, sheet_row_key__isnull=False)
+            .values_list('sheet_row_key', flat=True)
+        )
+        # 只有第一次增量同步需要對照舊版同步留下的紀錄
+        legacy = load_legacy_rows() if state.synced_at is None else {}
+
+        # 每批各自一個交易提交 (進度更新因此能被其他連線看到)：自然鍵讓批次可安全重跑，
+        # 中途失敗時已提交的批次會在下次同步被視為既有紀錄而略過
+        cleaner = RowCleaner()
+        records = metrics.timed_iter(iter_google_sheets_records(sheet, chunk_rows=batch_size, cleaner=cleaner))
+        records = _report_progress(records, progress, batch_size)
+        rows = iter_sheet_rows(records, seen_keys, cleaner, chunk_size=batch_size)
+        new_rows = ((key, row) for key, row in rows if key not in existing_keys)
+        time_parser = SalesTimeParser()
+        skipped_emails = set()
+        for batch in iter_batches(new_rows, batch_size):
+            with metrics.atomic():
+                import_batch(batch, legacy, batch_size, metrics, time_parser, skipped_emails=skipped_emails)
+        metrics.add('fetched', len(seen_keys))
+        cleaner.log_summary()
+        if cleaner.issues:
+            metrics.warn(f"⚠️ 消費金額無法解析，已以 0 計算：{cleaner.summary()}。")
+
+        if not seen_keys:
+            # 讀不到任何資料列時不刪除既有紀錄 (避免空表或異常時誤刪)
+            message = "⚠️ 未取得任何 Google Sheets 資料，本次未變更資料庫。\n"
+            metrics.write_log("失敗", message)
+            return message
+
+        with metrics.atomic():
+            with metrics.timer('write'):
+                vanished_keys = existing_keys - seen_keys
+                # 刪除後需重建積分批次：每位會員只重建一次
+                with deferred_rebuilds():
+                    _, deleted = ConsumptionRecord.objects.filter(sheet_row_key__in=vanished_keys).delete()
+                # 連帶刪除的 PointLot 不計入
+                metrics.add('deleted', deleted.get(ConsumptionRecord._meta.label, 0))
+
+                state.last_modified = last_modified or ""
+                state.row_count = len(seen_keys)
+                state.pending_emails = sorted(skipped_emails)
+                state.synced_at = timezone.now()
+                state.save()
+    except Exception as e:
+        # 讀取中途失敗 => 不刪除任何紀錄、不更新高水位，下次同步會從頭比對
+        metrics.counts['fetched'] = len(seen_keys)
+        message = (
+            f"❌ Google Sheets 同步失敗 (已新增 {metrics.counts['inserted']} 筆，未刪除任何紀錄): {e}"
+        )
+        metrics.write_log("失敗", message)
+        raise SheetSyncError(message) from e
+
+    if progress:
+        progress(len(seen_keys))
+
+    counts = metrics.counts
+    message = "✅ Google Sheets 同步完成！\n"
+    message += metrics.summary_warnings()
+    message += (
+        f"新增 {counts['inserted']} 筆、補上自然鍵 {counts['updated']} 筆、刪除 {counts['deleted']} 筆、"
+        f"略過 {counts['skipped']} 筆、時間無法解析 {counts['failed']} 筆 (共 {counts['fetched']} 列)。\n"
+    )
+    metrics.write_log("成功", message)
+    return message
+
+
+# 3. 會員列表推送到 Google Sheets (差異同步)
+MEMBER_LIST_WORKSHEET = "MemberList"
+MEMBER_LIST_HEADER = ["使用者名稱", "Email", "是否超級管理者", "建立日期"]
+# 每次 batch_update 最多寫入的列數 (避免超過 API 請求大小限制)
+MEMBER_PUSH_ROWS_PER_REQUEST = 5000
+
+
+def member_list_rows():
+    """
+    {使用者名稱: 工作表列}，依使用者名稱排序；只取需要的欄位 (values_list)，不建立 User 實例。
+    """
+    members = (
+        User.objects.order_by('username')
+        .values_list('username', 'email', 'is_superuser', 'date_joined')
+        .iterator(chunk_size=5000)
+    )
+    return {
+        username: [username, email, "是" if is_superuser else "否", date_joined.strftime("%Y-%m-%d %H:%M:%S")]
+        for username, email, is_superuser, date_joined in members
+    }
+
+
+def diff_member_rows(current, desired):
+    """
+    比對工作表目前的資料列 (current[i] 為第 i + 2 列) 與 desired ({使用者名稱: 列})。
+    返回 (updates, counts)：updates 為 {列號: 值}，counts 含 added / changed / removed。
+      - 仍存在且內容相同的會員不動，內容變更的就地更新
+      - 已刪除會員留下的空位由新會員或尾端的會員補上，資料列保持連續 (第 2 ~ len(desired) + 1 列)
+      - 之後到原本最後一列清空
+    新會員接在空位中，因此工作表不再保證依使用者名稱排序。
+    """
+    width = len(MEMBER_LIST_HEADER)
+    last_row = len(desired) + 1
+
+    def padded(row):
+        return [str(value) for value in row[:width]] + [""] * (width - len(row))
+
+    placed = {}
+    for index, row in enumerate(current):
+        username = padded(row)[0]
+        if username in desired and username not in placed:
+            placed[username] = index + 2
+
+    updates = {}
+    changed = 0
+    for username, row_number in placed.items():
+        if row_number <= last_row and padded(current[row_number - 2]) != desired[username]:
+            updates[row_number] = desired[username]
+            changed += 1
+
+    occupied = {row_number for row_number in placed.values() if row_number <= last_row}
+    holes = (row_number for row_number in range(2, last_row + 1) if row_number not in occupied)
+    movers = [username for username, row_number in placed.items() if row_number > last_row]
+    movers += [username for username in desired if username not in placed]
+    for username, row_number in zip(movers, holes):
+        updates[row_number] = desired[username]
+        if username in placed and padded(current[placed[username] - 2]) != desired[username]:
+            changed += 1
+
+    for row_number in range(last_row + 1, len(current) + 2):
+        updates[row_number] = [""] * width
+
+    counts = {
+        'added': len(desired) - len(placed),
+        'changed': changed,
+        'removed': sum(1 for row in current if padded(row)[0]) - len(placed),
+    }
+    return updates, counts
+
+
+def member_update_requests(updates, rows_per_request=MEMBER_PUSH_ROWS_PER_REQUEST):
+    """
+    將 {列號: 值} 合併為連續的 A1 範圍，再分成每次最多 rows_per_request 列的 batch_update 請求。
+    """
+    last_col = chr(ord("A") + len(MEMBER_LIST_HEADER) - 1)
+    ranges = []
+    for row_number in sorted(updates):
+        if ranges and ranges[-1][0] + len(ranges[-1][1]) == row_number and len(ranges[-1][1]) < rows_per_request:
+            ranges[-1][1].append(updates[row_number])
+        else:
+            ranges.append((row_number, [updates[row_number]]))
+
+    request, request_rows = [], 0
+    for start, values in ranges:
+        if request and request_rows + len(values) > rows_per_request:
+            yield request
+            request, request_rows = [], 0
+        request.append({"range": f"A{start}:{last_col}{start + len(values) - 1}", "values": values})
+        request_rows += len(values)
+    if request:
+        yield request
+
+
+def sync_members_to_google_sheets_logic(progress=None, sheet=None):
+    """
+    將所有會員 (User) 資料差異同步到 Google Sheets 的 MemberList 工作表，返回結果訊息：
+    讀取一次目前內容，只以 batch_update 寫入新增 / 變更 / 需清空的範圍 (工作表不會整張清空)，
+    遇到 429 等暫時性錯誤時以指數退避重試。
+    sheet 可傳入 FakeWorksheet 等替身以離線執行。結果寫入 GoogleSheetsSyncLog；失敗時拋出 SheetSyncError。
+    """
+    metrics = SyncMetrics(GoogleSheetsSyncLog.SYNC_TYPE_MEMBER_EXPORT)
+    requests_sent = 0
+    try:
+        with metrics.timer('fetch'):
+            if sheet is None:
+                # 與消費紀錄同步共用同一個延遲建立的 client (不重新授權)
+                sheet = open_worksheet(MEMBER_LIST_WORKSHEET)
+                if sheet is None:
+                    raise ValueError("Google Sheets client 尚未建立 (API 初始化失敗)")
+            last_col = chr(ord("A") + len(MEMBER_LIST_HEADER) - 1)
+            values = call_with_backoff(sheet.get, f"A1:{last_col}{sheet.row_count}")
+
+        with metrics.timer('resolve'):
+            desired = member_list_rows()
+            current = [list(row) for row in values]
+            updates, counts = diff_member_rows(current[1:], desired)
+            if not current or current[0][:len(MEMBER_LIST_HEADER)] != MEMBER_LIST_HEADER:
+                updates[1] = MEMBER_LIST_HEADER
+        metrics.add('fetched', len(desired))
+
+        with metrics.timer('write'):
+            if len(desired) + 1 > sheet.row_count:
+                call_with_backoff(sheet.add_rows, len(desired) + 1 - sheet.row_count)
+            for request in member_update_requests(updates):
+                call_with_backoff(sheet.batch_update, request, raw=True)
+                requests_sent += 1
+        metrics.add('inserted', counts['added'])
+        metrics.add('updated', counts['changed'])
+        metrics.add('deleted', counts['removed'])
+    except Exception as e:
+        message = f"❌ 同步會員資料失敗：{e}"
+        metrics.write_log("失敗", message)
+        raise SheetSyncError(message) from e
+
+    if progress:
+        progress(len(desired))
+    message = (
+        f"✅ 已將會員資料同步到 Google Sheets：新增 {counts['added']} 筆、更新 {counts['changed']} 筆、"
+        f"刪除 {counts['removed']} 筆 (共 {len(desired)} 位會員，寫入請求 {requests_sent} 次)"
+    )
+    metrics.write_log("成功", message)
+    return message
@@ -0,0 +1,56 @@
+# signals.py
+# -------------
+# 積分相關紀錄寫入 / 刪除時，同步更新 PointLot 與 MemberBalance 並使會員摘要快取失效
+# (只對三個紀錄表註冊 receiver，其他 model 的批次刪除仍可走 Django 的 fast delete)
+# 注意：bulk_create / QuerySet.update 不會觸發 signal，批次寫入須自行呼叫 apply_balance_deltas
+
+from django.contrib.auth.models import User
+from django.db.models import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .member_cache import invalidate_member_cache
+from .models import ConsumptionRecord, RedemptionRecord, SlotMachineRecord
+from .points import (
+    apply_balance_delta,
+    apply_record_to_lots,
+    arrives_expired,
+    expire_member_lots,
+    record_deltas,
+    schedule_rebuild,
+)
+
+
+@receiver(post_save, sender=ConsumptionRecord)
+@receiver(post_save, sender=RedemptionRecord)
+@receiver(post_save, sender=SlotMachineRecord)
+def update_balance_on_save(sender, instance, created, raw=False, **kwargs):
+    """
+    新增紀錄 => 增量更新 (入帳建立批次 / 扣款依 FIFO 扣除)；
+    修改既有紀錄 (少見，如後台編輯) => 從原始紀錄重建。
+    """
+    if raw:
+        return
+    if created:
+        apply_record_to_lots(instance)
+        apply_balance_delta(instance.user_id, record_deltas(instance))
+        if arrives_expired(instance, timezone.now()):
+            expire_member_lots(instance.user_id)
+    else:
+        schedule_rebuild(instance.user_id)
+    invalidate_member_cache(instance.user_id)
+
+
+@receiver(post_delete, sender=ConsumptionRecord)
+@receiver(post_delete, sender=RedemptionRecord)
+@receiver(post_delete, sender=SlotMachineRecord)
+def update_balance_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    刪除紀錄後，已分配到各批次的扣款需要重新計算 => 從原始紀錄重建。
+    刪除會員本身時 (連帶刪除紀錄) 不需重建。
+    """
+    if isinstance(origin, User) or (isinstance(origin, QuerySet) and origin.model is User):
+        return
+    schedule_rebuild(instance.user_id)
+    invalidate_member_cache(instance.user_id)
@@ -0,0 +1,111 @@
+# sync_metrics.py
+# -------------
+# Google Sheets 同步的結構化指標：各階段耗時、筆數與逐列警告，結束時寫入 GoogleSheetsSyncLog
+
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from .models import GoogleSheetsSyncLog, GoogleSheetsSyncWarning
+
+# 每次同步最多保存的警告明細筆數 (總數仍記錄在 warning_count)
+MAX_SYNC_WARNINGS = 500
+# 回傳訊息 / GoogleSheetsSyncLog.message 中最多列出的警告筆數
+MAX_MESSAGE_WARNINGS = 20
+
+PHASES = ('fetch', 'resolve', 'write', 'commit')
+COUNTERS = ('fetched', 'inserted', 'updated', 'deleted', 'skipped', 'failed')
+
+
+class SyncMetrics:
+    """
+    累計一次同步的筆數、各階段耗時與警告。
+    """
+
+    def __init__(self, sync_type=GoogleSheetsSyncLog.SYNC_TYPE_IMPORT):
+        self.sync_type = sync_type
+        self.started = time.perf_counter()
+        self.seconds = dict.fromkeys(PHASES, 0.0)
+        self.counts = dict.fromkeys(COUNTERS, 0)
+        self.warnings = []
+        self.warning_count = 0
+
+    @contextmanager
+    def timer(self, phase):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[phase] += time.perf_counter() - start
+
+    def timed_iter(self, iterable, phase='fetch'):
+        """
+        包裝 iterator，只把取得下一筆所花的時間計入 phase (例如分段讀取 Google Sheets)。
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.timer(phase):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    @contextmanager
+    def atomic(self):
+        """
+        與 transaction.atomic() 相同，但把最後 COMMIT 的時間計入 commit 階段。
+        """
+        atomic = transaction.atomic()
+        atomic.__enter__()
+        try:
+            yield
+        except BaseException as e:
+            atomic.__exit__(type(e), e, e.__traceback__)
+            raise
+        with self.timer('commit'):
+            atomic.__exit__(None, None, None)
+
+    def add(self, counter, n=1):
+        self.counts[counter] += n
+
+    def warn(self, message):
+        self.warning_count += 1
+        if len(self.warnings) < MAX_SYNC_WARNINGS:
+            self.warnings.append(message[:500])
+
+    def summary_warnings(self):
+        """
+        訊息中只列出前 MAX_MESSAGE_WARNINGS 筆警告，其餘以總數表示。
+        """
+        lines = self.warnings[:MAX_MESSAGE_WARNINGS]
+        if self.warning_count > len(lines):
+            lines = lines + [f"⚠️ 另有 {self.warning_count - len(lines)} 筆警告，請至同步紀錄查看。"]
+        return "".join(f"{line}\n" for line in lines)
+
+    def write_log(self, status, message):
+        """
+        寫入 GoogleSheetsSyncLog 與警告明細，返回 log。
+        """
+        log = GoogleSheetsSyncLog.objects.create(
+            sync_type=self.sync_type,
+            status=status,
+            message=message,
+            rows_fetched=self.counts['fetched'],
+            rows_inserted=self.counts['inserted'],
+            rows_updated=self.counts['updated'],
+            rows_deleted=self.counts['deleted'],
+            rows_skipped=self.counts['skipped'],
+            rows_failed=self.counts['failed'],
+            warning_count=self.warning_count,
+            fetch_seconds=self.seconds['fetch'],
+            resolve_seconds=self.seconds['resolve'],
+            write_seconds=self.seconds['write'],
+            commit_seconds=self.seconds['commit'],
+            total_seconds=time.perf_counter() - self.started,
+        )
+        GoogleSheetsSyncWarning.objects.bulk_create(
+            [GoogleSheetsSyncWarning(sync_log=log, message=warning) for warning in self.warnings]
+        )
+        return log
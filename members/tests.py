@@ -1,3 +1,1237 @@
-from django.test import TestCase
+import importlib
+import itertools
+import os
+import random
+import tempfile
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+import openpyxl
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import Client, TestCase, TransactionTestCase, skipUnlessDBFeature
+from django.urls import reverse
+from django.utils import timezone
+
+from casino.paytable import GRID_GAME, REEL_GAME, GridPaytable
+from casino.rollups import ROLLUP_LAG, rollup_slot_stats
+from casino.stats import outcome_stats
+
+from .excel_import import import_excel_sales
+from .fake_sheets import FakeWorksheet, api_error
+from .google_sheets import fetch_sheet_last_update_time, iter_google_sheets_records
+from .jobs import JOB_HANDLERS, claim_next_job, enqueue_job, fail_stale_jobs, purge_job_results, run_job
+from .member_cache import get_member_summary, invalidate_member_cache, member_cache_stats
+from .models import (
+    BackgroundJob,
+    ConsumptionRecord,
+    ExpiringPointsSummary,
+    GoogleSheetsSyncLog,
+    MemberBalance,
+    PointExpiryRun,
+    PointLot,
+    RedemptionRecord,
+    SlotDailyStat,
+    SlotMachineRecord,
+    SlotRollupState,
+)
+from .pagination import encode_cursor, keyset_page
+from .points import (
+    InsufficientPointsError,
+    apply_balance_deltas,
+    compute_member_totals,
+    get_available_points,
+    rebuild_member_balance,
+    spend_points,
+)
+from .row_cleaning import RowCleaner, clean_decimal
+from .sales_time import SalesTimeParser
+from .sheet_sync import SheetSyncError, sync_members_to_google_sheets_logic, update_from_google_sheets_logic
+
+SHEET_HEADER = ["會員 Email", "消費金額(元)", "銷售品項", "銷售時間"]
+# 試算表中的銷售日期需在一年內，積分才尚未到期
+RECENT_DAY = (timezone.localdate() - timedelta(days=1)).strftime("%Y/%m/%d")
+
+
+# ================================
+# 積分扣款 (spend_points)
+# ================================
+class SpendPointsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="member", email="member@example.com")
+        # 消費 1000 元 => 100 積分
+        ConsumptionRecord.objects.create(user=self.user, amount=1000, sold_item="測試品項")
+
+    def test_spend_within_balance(self):
+        with spend_points(self.user, 60):
+            RedemptionRecord.objects.create(user=self.user, points_used=60)
+        self.assertEqual(get_available_points(self.user), 40)
+
+    def test_overspend_is_rejected_and_rolled_back(self):
+        with spend_points(self.user, 60):
+            RedemptionRecord.objects.create(user=self.user, points_used=60)
+        with self.assertRaises(InsufficientPointsError):
+            with spend_points(self.user, 60):
+                RedemptionRecord.objects.create(user=self.user, points_used=60)
+        self.assertEqual(get_available_points(self.user), 40)
+        self.assertEqual(RedemptionRecord.objects.filter(user=self.user).count(), 1)
+
+    def test_redeem_form_rejects_non_positive_points(self):
+        self.client.force_login(self.user)
+        for points in (0, -5):
+            response = self.client.post(reverse('redeem_points'), {'points_used': points, 'redeemed_item': "品項"})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].has_error('points_used', 'min_value'))
+        self.assertFalse(RedemptionRecord.objects.exists())
+        self.assertEqual(get_available_points(self.user), 100)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentSpendTests(TransactionTestCase):
+    """
+    並行壓力測試：多個執行緒同時對同一會員下注，餘額永遠不可為負。
+    (需支援 SELECT ... FOR UPDATE 的資料庫，例如 PostgreSQL)
+    """
+    THREADS = 20
+    SPINS_PER_THREAD = 10
+    BET = 7
+
+    def test_concurrent_bets_never_overdraw(self):
+        user = User.objects.create_user(username="racer", email="racer@example.com")
+        ConsumptionRecord.objects.create(user=user, amount=1000, sold_item="測試品項")  # 100 積分
+        start_points = get_available_points(user)
+        successes = []
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker():
+            try:
+                barrier.wait()
+                for _ in range(self.SPINS_PER_THREAD):
+                    try:
+                        with spend_points(user.pk, self.BET):
+                            SlotMachineRecord.objects.create(
+                                user_id=user.pk, bet=self.BET, win_points=0
+                            )
+                        successes.append(1)
+                    except InsufficientPointsError:
+                        pass
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        final_points = get_available_points(user)
+        self.assertGreaterEqual(final_points, 0)
+        self.assertEqual(len(successes), start_points // self.BET)
+        self.assertEqual(final_points, start_points - len(successes) * self.BET)
+        # 彙總表必須與原始紀錄一致
+        totals = compute_member_totals(user.pk)
+        self.assertEqual(totals['slot_bet_points'], len(successes) * self.BET)
+
+
+# ================================
+# Google Sheets 分段讀取與增量同步 (離線)
+# ================================
+class SheetReaderTests(TestCase):
+    def test_reads_in_fixed_size_ranges(self):
+        rows = [SHEET_HEADER] + [[f"m{i}@example.com", "100", "品項", "2025/01/02"] for i in range(25)]
+        sheet = FakeWorksheet(rows, row_count=40)
+
+        records = list(iter_google_sheets_records(sheet, chunk_rows=10))
+
+        self.assertEqual(len(records), 25)
+        self.assertEqual(records[0]["會員 Email"], "m0@example.com")
+        ranges = [call[1] for call in sheet.calls if call[0] == "get"]
+        self.assertEqual(ranges, ["A2:D11", "A12:D21", "A22:D31", "A32:D41"])
+
+    def test_skips_blank_rows_and_pads_short_rows(self):
+        rows = [SHEET_HEADER, ["a@example.com", " 1,000 "], [], ["", "", "", ""], ["b@example.com", "5", "x", "2025/01/02"]]
+        records = list(iter_google_sheets_records(FakeWorksheet(rows), chunk_rows=2))
+
+        self.assertEqual([r["會員 Email"] for r in records], ["a@example.com", "b@example.com"])
+        self.assertEqual(records[0]["消費金額(元)"], "1,000")
+        self.assertEqual(records[0]["銷售時間"], "")
+
+    def test_chunk_reads_retry_on_quota_errors(self):
+        rows = [SHEET_HEADER] + [[f"m{i}@example.com", "100", "品項", "2025/01/02"] for i in range(5)]
+        sheet = FakeWorksheet(rows, read_errors=[api_error(429), api_error(503)])
+        with mock.patch("members.google_sheets.time.sleep") as sleep, self.assertLogs("members.google_sheets"):
+            records = list(iter_google_sheets_records(sheet, chunk_rows=3))
+
+        self.assertEqual(len(records), 5)
+        self.assertEqual(sleep.call_count, 2)
+        ranges = [call[1] for call in sheet.calls if call[0] == "get"]
+        self.assertEqual(ranges, ["A2:D4", "A2:D4", "A2:D4", "A5:D7"])
+
+    def test_last_update_time_falls_back_only_on_api_errors(self):
+        client = mock.Mock()
+        client.open_by_key.return_value.get_lastUpdateTime.side_effect = api_error(503, "Backend Error")
+        with mock.patch('members.google_sheets.get_client', return_value=client):
+            with self.assertLogs('members.google_sheets', level='WARNING'):
+                self.assertIsNone(fetch_sheet_last_update_time())
+            # 程式錯誤不被吞掉
+            client.open_by_key.return_value.get_lastUpdateTime.side_effect = AttributeError("bug")
+            with self.assertRaises(AttributeError):
+                fetch_sheet_last_update_time()
+
+
+class RowCleaningTests(TestCase):
+    def test_clean_decimal(self):
+        cases = {
+            "1,000": (Decimal("1000"), None),
+            " -12.5 ": (Decimal("-12.5"), None),
+            "NT$ 300 元": (Decimal("300"), None),
+            7: (Decimal("7"), None),
+            "": (Decimal("0"), "empty"),
+            "免費": (Decimal("0"), "no_digits"),
+            "1.2.3": (Decimal("0"), "multiple_points"),
+            "1-2": (Decimal("0"), "invalid"),
+        }
+        for value, expected in cases.items():
+            self.assertEqual(clean_decimal(value), expected, value)
+
+    def test_batch_is_cleaned_column_wise_with_rate_limited_logging(self):
+        cleaner = RowCleaner(log_limit=2)
+        records = [{"金額": "x", "品項": f" 品項{i} "} for i in range(5)] + [{"金額": "5", "品項": "A"}]
+        with self.assertLogs("members.row_cleaning", level="INFO") as logs:
+            cleaned = cleaner.clean_batch(records)
+            cleaner.log_summary()
+
+        self.assertEqual(cleaned[0], {"金額": Decimal("0"), "品項": "品項0"})
+        self.assertEqual(cleaned[-1]["金額"], Decimal("5"))
+        self.assertEqual(cleaner.issues["no_digits"], 5)
+        # 只逐筆記錄前 2 筆，最後一筆為摘要
+        self.assertEqual(len(logs.records), 3)
+        self.assertIn("另有 3 筆", logs.records[-1].getMessage())
+
+
+class IncrementalSheetSyncTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com")
+
+    def test_sync_inserts_new_rows_and_removes_vanished_rows(self):
+        rows = [
+            SHEET_HEADER,
+            ["buyer@example.com", "1000", "A", f"{RECENT_DAY} 10:00"],
+            ["buyer@example.com", "1000", "A", f"{RECENT_DAY} 10:00"],
+            ["stranger@example.com", "500", "B", f"{RECENT_DAY} 11:00"],
+        ]
+        update_from_google_sheets_logic(batch_size=2, sheet=FakeWorksheet(rows))
+        self.assertEqual(self.user.consumption_records.count(), 2)
+        self.assertEqual(get_available_points(self.user), 200)
+
+        # 重複同步不會重複新增
+        update_from_google_sheets_logic(batch_size=2, sheet=FakeWorksheet(rows))
+        self.assertEqual(self.user.consumption_records.count(), 2)
+
+        # 從試算表移除一列 => 只刪除該列，其他紀錄 (拉霸) 不受影響
+        SlotMachineRecord.objects.create(user=self.user, bet=10, win_points=30)
+        update_from_google_sheets_logic(batch_size=2, sheet=FakeWorksheet(rows[:2]))
+        self.assertEqual(self.user.consumption_records.count(), 1)
+        self.assertEqual(get_available_points(self.user), 120)
+
+    def test_sync_writes_metrics_log(self):
+        rows = [SHEET_HEADER, ["buyer@example.com", "1000", "A", f"{RECENT_DAY} 10:00"]]
+        rows += [[f"stranger{i}@example.com", "500", "B", f"{RECENT_DAY} 11:00"] for i in range(3)]
+        update_from_google_sheets_logic(batch_size=2, sheet=FakeWorksheet(rows))
+
+        log = GoogleSheetsSyncLog.objects.get()
+        self.assertEqual(log.sync_type, GoogleSheetsSyncLog.SYNC_TYPE_IMPORT)
+        self.assertEqual(log.status, "成功")
+        self.assertEqual(
+            (log.rows_fetched, log.rows_inserted, log.rows_skipped, log.warning_count), (4, 1, 3, 3)
+        )
+        self.assertEqual(log.warnings.count(), 3)
+        self.assertGreater(log.total_seconds, 0)
+
+    def test_unparseable_sales_time_is_reported_not_defaulted(self):
+        rows = [
+            SHEET_HEADER,
+            ["buyer@example.com", "1000", "A", f"{RECENT_DAY} 10:00"],
+            ["buyer@example.com", "500", "B", "昨天"],
+        ]
+        message = update_from_google_sheets_logic(sheet=FakeWorksheet(rows))
+        self.assertIn("時間無法解析 1 筆", message)
+        self.assertEqual(self.user.consumption_records.count(), 1)
+        self.assertEqual(GoogleSheetsSyncLog.objects.get().rows_failed, 1)
+
+        # 修正試算表後，下次同步會補上該列
+        rows[2][3] = RECENT_DAY
+        update_from_google_sheets_logic(sheet=FakeWorksheet(rows))
+        self.assertEqual(self.user.consumption_records.count(), 2)
+
+    def test_unchanged_sheet_imports_rows_of_newly_registered_members(self):
+        rows = [
+            SHEET_HEADER,
+            ["buyer@example.com", "1000", "A", f"{RECENT_DAY} 10:00"],
+            ["newcomer@example.com", "500", "B", f"{RECENT_DAY} 11:00"],
+        ]
+        with mock.patch('members.sheet_sync.fetch_sheet_last_update_time', return_value="2025-01-02T00:00:00Z"), \
+                mock.patch('members.google_sheets.open_worksheet', side_effect=lambda: FakeWorksheet(rows)):
+            update_from_google_sheets_logic()
+            self.assertIn("略過同步", update_from_google_sheets_logic())
+
+            # 試算表沒有變更，但上次略過的 Email 已註冊 => 重新比對並匯入
+            newcomer = User.objects.create_user(username="newcomer", email="newcomer@example.com")
+            self.assertIn("新增 1 筆", update_from_google_sheets_logic())
+            self.assertEqual(get_available_points(newcomer), 50)
+            self.assertIn("略過同步", update_from_google_sheets_logic())
+
+    def test_adopted_legacy_rows_are_removed_when_they_vanish(self):
+        sales_time = timezone.make_aware(datetime.strptime(f"{RECENT_DAY} 10:00", "%Y/%m/%d %H:%M"))
+        # 舊版同步 (整表刪除重建) 留下的紀錄沒有自然鍵
+        kept = ConsumptionRecord.objects.create(user=self.user, amount=1000, sold_item="A", sales_time=sales_time)
+        # 對照不到試算表列的無鍵紀錄無法與手動新增的紀錄區分 => 保留
+        manual = ConsumptionRecord.objects.create(user=self.user, amount=300, sold_item="C", sales_time=sales_time)
+        rows = [
+            SHEET_HEADER,
+            ["buyer@example.com", "1000", "A", f"{RECENT_DAY} 10:00"],
+            ["buyer@example.com", "500", "B", f"{RECENT_DAY} 11:00"],
+        ]
+        message = update_from_google_sheets_logic(sheet=FakeWorksheet(rows))
+        self.assertIn("新增 1 筆、補上自然鍵 1 筆、刪除 0 筆", message)
+        kept.refresh_from_db()
+        self.assertEqual(kept.source, ConsumptionRecord.SOURCE_SHEETS)
+        self.assertEqual(get_available_points(self.user), 180)
+
+        # 補上鍵值的舊紀錄之後從試算表消失時同樣刪除
+        update_from_google_sheets_logic(sheet=FakeWorksheet([rows[0], rows[2]]))
+        self.assertFalse(ConsumptionRecord.objects.filter(pk=kept.pk).exists())
+        self.assertTrue(ConsumptionRecord.objects.filter(pk=manual.pk, sheet_row_key__isnull=True).exists())
+        self.assertEqual(get_available_points(self.user), 80)
+
+
+def make_workbook(rows):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    for row in rows:
+        sheet.append(row)
+    buffer = BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    buffer.name = "sales.xlsx"
+    return buffer
+
+
+class ExcelImportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="buyer", email="buyer@example.com")
+        self.sales_day = timezone.localtime() - timedelta(days=1)
+        self.rows = [
+            SHEET_HEADER,
+            ["buyer@example.com", 1000, "A", self.sales_day.replace(tzinfo=None, microsecond=0)],
+            ["buyer@example.com", "1,000", "A", f"{RECENT_DAY} 10:00"],
+            [None, None, None, None],
+            ["stranger@example.com", 500, "B", RECENT_DAY],
+        ]
+
+    def test_import_is_idempotent_and_survives_sheet_sync(self):
+        message = import_excel_sales(make_workbook(self.rows), batch_size=2)
+        self.assertIn("新增 2 筆", message)
+        self.assertEqual(get_available_points(self.user), 200)
+        self.assertEqual(
+            set(self.user.consumption_records.values_list('source', flat=True)), {ConsumptionRecord.SOURCE_EXCEL}
+        )
+
+        # 重複上傳同一檔案不會重複新增
+        message = import_excel_sales(make_workbook(self.rows), batch_size=2)
+        self.assertIn("已匯入過 2 筆", message)
+        self.assertEqual(self.user.consumption_records.count(), 2)
+
+        # Google Sheets 同步只會刪除試算表來源的紀錄
+        sheet_rows = [SHEET_HEADER, ["buyer@example.com", "1000", "A", f"{RECENT_DAY} 10:00"]]
+        update_from_google_sheets_logic(sheet=FakeWorksheet(sheet_rows))
+        self.assertEqual(self.user.consumption_records.count(), 3)
+
+    def test_dashboard_upload_is_queued(self):
+        admin = User.objects.create_superuser(username="admin", email="admin@example.com", password="pw")
+        self.client.force_login(admin)
+        url = reverse('super_admin_dashboard')
+
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media):
+            response = self.client.post(url, {'action': 'import_excel', 'file': make_workbook(self.rows)})
+            job = BackgroundJob.objects.get(kind=BackgroundJob.KIND_EXCEL_IMPORT)
+            self.assertContains(response, f"已排入背景工作 #{job.pk}")
+            # 請求中不匯入，由 worker 執行
+            self.assertEqual(self.user.consumption_records.count(), 0)
+            self.assertTrue(os.path.exists(job.upload.path))
+
+            job = run_job(claim_next_job())
+            self.assertEqual(job.status, BackgroundJob.STATUS_SUCCEEDED)
+            self.assertIn("Excel 匯入完成", job.message)
+            self.assertEqual(job.rows_processed, 3)
+            self.assertEqual(self.user.consumption_records.count(), 2)
+            # 上傳檔案執行後刪除
+            self.assertEqual(job.upload.name, "")
+            self.assertEqual(os.listdir(os.path.join(media, "job_uploads")), [])
+
+            self.client.post(url, {'action': 'import_excel', 'file': make_workbook([["Email", "金額"]])})
+            job = run_job(claim_next_job())
+            self.assertEqual(job.status, BackgroundJob.STATUS_FAILED)
+            self.assertIn("缺少欄位", job.message)
+        self.assertEqual(GoogleSheetsSyncLog.objects.filter(status="失敗").count(), 1)
+
+
+class MemberListPushTests(TestCase):
+    HEADER = ["使用者名稱", "Email", "是否超級管理者", "建立日期"]
+
+    def setUp(self):
+        self.users = {
+            name: User.objects.create_user(username=name, email=f"{name}@example.com")
+            for name in ["alice", "carol", "dave"]
+        }
+
+    def row(self, name, email=None):
+        user = self.users[name]
+        return [name, email or user.email, "否", user.date_joined.strftime("%Y-%m-%d %H:%M:%S")]
+
+    def test_pushes_only_the_diff(self):
+        sheet = FakeWorksheet([
+            self.HEADER,
+            self.row("alice", email="old@example.com"),
+            ["bob", "bob@example.com", "否", "2024-01-01 00:00:00"],
+            self.row("carol"),
+        ], title="MemberList")
+        message = sync_members_to_google_sheets_logic(sheet=sheet)
+
+        self.assertIn("新增 1 筆、更新 1 筆、刪除 1 筆", message)
+        # 已刪除的 bob 由新會員 dave 補上，carol 不動；不清空整張表
+        self.assertEqual(sheet.rows, [self.HEADER, self.row("alice"), self.row("dave"), self.row("carol")])
+        self.assertEqual([call[0] for call in sheet.calls], ["get", "batch_update"])
+        self.assertEqual(sheet.calls[-1][1], ["A2:D3"])
+
+        # 沒有變更時不寫入
+        sheet.calls.clear()
+        sync_members_to_google_sheets_logic(sheet=sheet)
+        self.assertEqual([call[0] for call in sheet.calls], ["get"])
+
+    def test_compacts_removed_rows_and_retries_on_quota_errors(self):
+        rows = [self.HEADER] + [[f"gone{i}", "", "否", ""] for i in range(5)] + [self.row("dave")]
+        sheet = FakeWorksheet(rows, errors=[api_error(429)])
+        with mock.patch("members.google_sheets.time.sleep") as sleep, self.assertLogs("members.google_sheets"):
+            sync_members_to_google_sheets_logic(sheet=sheet)
+
+        sleep.assert_called_once()
+        self.assertEqual(sheet.get("A1:D20"), [self.HEADER, self.row("dave"), self.row("alice"), self.row("carol")])
+        log = GoogleSheetsSyncLog.objects.get()
+        self.assertEqual((log.rows_inserted, log.rows_deleted), (2, 5))
+
+        with mock.patch("members.google_sheets.time.sleep"):
+            with self.assertRaises(SheetSyncError):
+                sync_members_to_google_sheets_logic(sheet=FakeWorksheet(rows, errors=[api_error(403)]))
+
+
+class SalesTimeParserTests(TestCase):
+    def test_sniffs_format_and_reports_failures(self):
+        parser = SalesTimeParser()
+        times, failures = parser.parse_column(["2025/01/02 10:30", "2025/1/3 9:05", "2025-01-04", "", "2025/02/30 10:00"])
+
+        self.assertEqual(str(parser.format), "YYYY/MM/DD HH:MM")
+        self.assertEqual(timezone.localtime(times[0]).replace(tzinfo=None), datetime(2025, 1, 2, 10, 30))
+        self.assertEqual(times[1].hour, 9)
+        # 與偵測格式不同的個別值仍可解析
+        self.assertEqual(times[2].date(), date(2025, 1, 4))
+        self.assertEqual(failures, [(3, ""), (4, "2025/02/30 10:00")])
+
+    def test_numpy_path_matches_regex_path(self):
+        values = [f"2025-{m:02d}-{d:02d} {h:02d}:15:00" for m in range(1, 13) for d in range(1, 29) for h in (0, 23)]
+        fast, fast_failures = SalesTimeParser().parse_column(values)
+        slow, slow_failures = SalesTimeParser(use_numpy=False).parse_column(values)
+        self.assertEqual(fast, slow)
+        self.assertEqual(fast_failures, [])
+
+
+# ================================
+# 查詢計畫回歸測試：會員歷史查詢必須走複合索引
+# ================================
+def index_name(model, fields):
+    return next(index.name for index in model._meta.indexes if index.fields == fields)
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="planner", email="planner@example.com")
+        if connection.vendor == 'postgresql':
+            # 測試資料量小時 Postgres 會偏好循序掃描 => 關閉後確認索引可被使用
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assertUsesIndex(self, queryset, name):
+        plan = queryset.explain()
+        self.assertIn(name, plan, msg=f"查詢未使用索引 {name}:\n{plan}")
+
+    def test_member_history_queries_use_composite_indexes(self):
+        now = timezone.now()
+        records = ConsumptionRecord.objects.filter(user=self.user)
+        self.assertUsesIndex(
+            records.order_by('-sales_time'),
+            index_name(ConsumptionRecord, ['user', '-sales_time', '-id'])
+        )
+        self.assertUsesIndex(
+            records.filter(sales_time__gte=now, sales_time__lt=now + timedelta(days=1)).order_by('-sales_time'),
+            index_name(ConsumptionRecord, ['user', '-sales_time', '-id'])
+        )
+        self.assertUsesIndex(
+            records.filter(expiry_date__range=(now, now + timedelta(days=30))),
+            index_name(ConsumptionRecord, ['user', 'expiry_date'])
+        )
+        self.assertUsesIndex(
+            RedemptionRecord.objects.filter(user=self.user).order_by('-redemption_time'),
+            index_name(RedemptionRecord, ['user', '-redemption_time'])
+        )
+        self.assertUsesIndex(
+            SlotMachineRecord.objects.filter(user=self.user).order_by('-played_at'),
+            index_name(SlotMachineRecord, ['user', '-played_at'])
+        )
+
+    def test_email_lookup_uses_index(self):
+        self.assertUsesIndex(
+            User.objects.filter(email__in=["planner@example.com", "x@example.com"]),
+            "members_auth_user_email_idx"
+        )
+
+
+# ================================
+# 個人頁查詢數量：不隨歷史筆數增加
+# ================================
+class ProfileQueryBudgetTests(TestCase):
+    # session + user + 消費紀錄頁 + 使用紀錄 COUNT 與該頁
+    QUERY_BUDGET = 5
+    # 會員摘要快取未命中：另加彙總 + 可用積分 + 即將到期 (摘要狀態、摘要或批次) + 三種最近活動
+    COLD_CACHE_QUERIES = 7
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="history", email="history@example.com")
+        self.client.force_login(self.user)
+
+    def add_history(self, n):
+        now = timezone.now()
+        records = [
+            ConsumptionRecord(user=self.user, amount=100, sold_item="品項", sales_time=now - timedelta(days=i))
+            for i in range(n)
+        ]
+        for record in records:
+            record.fill_derived_fields()
+        redemptions = [RedemptionRecord(user=self.user, points_used=1) for _ in range(n)]
+        ConsumptionRecord.objects.bulk_create(records)
+        RedemptionRecord.objects.bulk_create(redemptions)
+        # 與試算表批次匯入相同：bulk_create 後自行更新 MemberBalance 與快取
+        apply_balance_deltas(records + redemptions)
+        invalidate_member_cache(self.user.pk)
+
+    def test_profile_query_count_is_fixed(self):
+        for n in (3, 60):
+            self.add_history(n)
+            for params in ({}, {'show_more': '1', 'page': '2'}, {'show_more': '1', 'redemption_page': '3'},
+                           {'show_more': '1', 'cursor': self.deep_cursor()}):
+                cache.clear()
+                with self.subTest(history=n, params=params, cache="cold"):
+                    with self.assertNumQueries(self.QUERY_BUDGET + self.COLD_CACHE_QUERIES):
+                        response = self.client.get(reverse('profile'), params)
+                    self.assertEqual(response.status_code, 200)
+                with self.subTest(history=n, params=params, cache="warm"):
+                    with self.assertNumQueries(self.QUERY_BUDGET):
+                        self.client.get(reverse('profile'), params)
+
+    def test_pager_links_keep_search_query_encoded(self):
+        self.add_history(15)
+        response = self.client.get(reverse('profile'), {'q': "2025-01-02&redemption_page=9"})
+        self.assertContains(response, "&q=2025-01-02%26redemption_page%3D9")
+        self.assertNotContains(response, "&q=2025-01-02&")
+
+    def deep_cursor(self):
+        last = self.user.consumption_records.order_by('sales_time', 'id').first()
+        return encode_cursor("next", last, 'sales_time') if last else ""
+
+    def test_keyset_pages_walk_whole_history(self):
+        self.add_history(45)
+        # 同一時間的紀錄以 id 排序，不會重複或遺漏
+        ConsumptionRecord.objects.update(sales_time=timezone.now())
+        expected = list(self.user.consumption_records.order_by('-sales_time', '-id').values_list('id', flat=True))
+
+        seen, cursors, cursor = [], [], None
+        while True:
+            page = keyset_page(self.user.consumption_records.all(), 'sales_time', 20, cursor=cursor)
+            seen += [r.id for r in page.object_list]
+            cursors.append(cursor)
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(cursors), 3)
+
+        # 從最後一頁往回翻，回到第一頁時沒有上一頁
+        back = keyset_page(self.user.consumption_records.all(), 'sales_time', 20, cursor=page.previous_cursor)
+        self.assertEqual([r.id for r in back.object_list], expected[20:40])
+        first = keyset_page(self.user.consumption_records.all(), 'sales_time', 20, cursor=back.previous_cursor)
+        self.assertEqual([r.id for r in first.object_list], expected[:20])
+        self.assertFalse(first.has_previous)
+
+    def test_keyset_keeps_date_search(self):
+        self.add_history(3)
+        day = timezone.localdate() - timedelta(days=1)
+        response = self.client.get(reverse('profile'), {'show_more': '1', 'q': day.isoformat()})
+        self.assertEqual(len(response.context['page_obj'].object_list), 1)
+        response = self.client.get(reverse('profile'), {'show_more': '1', 'cursor': 'not-a-cursor'})
+        self.assertEqual(len(response.context['page_obj'].object_list), 3)
+
+    def test_profile_totals(self):
+        self.add_history(3)
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.context['total_points'], 30)
+        self.assertEqual(response.context['points_expiring_soon'], 0)
+        self.assertEqual(response.context['redemption_page'].paginator.count, 3)
+
+
+# ================================
+# 會員摘要快取
+# ================================
+class MemberCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="cached", email="cached@example.com")
+        ConsumptionRecord.objects.create(user=self.user, amount=1000, sold_item="測試品項")
+
+    def test_hits_until_records_change(self):
+        self.assertEqual(get_member_summary(self.user)['available_points'], 100)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_member_summary(self.user)['available_points'], 100)
+        self.assertEqual(member_cache_stats()['hits'], 1)
+        self.assertEqual(member_cache_stats()['misses'], 1)
+
+        # 寫入 / 刪除紀錄 (signal) 立即使快取失效
+        with spend_points(self.user, 30):
+            redemption = RedemptionRecord.objects.create(user=self.user, points_used=30)
+        self.assertEqual(get_member_summary(self.user)['available_points'], 70)
+        self.assertEqual(get_member_summary(self.user)['recent_activity'][0]['kind'], "兌換")
+        redemption.delete()
+        self.assertEqual(get_member_summary(self.user)['available_points'], 100)
+
+    def test_sheet_import_invalidates(self):
+        get_member_summary(self.user)
+        rows = [SHEET_HEADER, ["cached@example.com", "500", "A", f"{RECENT_DAY} 10:00"]]
+        update_from_google_sheets_logic(sheet=FakeWorksheet(rows))
+        self.assertEqual(get_member_summary(self.user)['available_points'], 150)
+
+
+# ================================
+# 積分批次 (FIFO 扣款與到期)
+# ================================
+class PointLotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="lots", email="lots@example.com")
+        self.now = timezone.now()
+
+    def earn(self, amount, days_ago):
+        return ConsumptionRecord.objects.create(
+            user=self.user, amount=amount, sold_item="品項", sales_time=self.now - timedelta(days=days_ago)
+        )
+
+    def remaining(self, record):
+        return PointLot.objects.get(consumption=record).remaining_points
+
+    def test_spends_draw_oldest_lots_first(self):
+        old = self.earn(1000, days_ago=300)    # 100 積分
+        new = self.earn(500, days_ago=10)      # 50 積分
+        with spend_points(self.user, 120):
+            RedemptionRecord.objects.create(user=self.user, points_used=120)
+        self.assertEqual((self.remaining(old), self.remaining(new)), (0, 30))
+
+        with spend_points(self.user, 10):
+            SlotMachineRecord.objects.create(user=self.user, bet=10, win_points=40)
+        self.assertEqual(self.remaining(new), 20)
+        self.assertEqual(get_available_points(self.user), 60)
+
+    def test_expired_points_cannot_be_spent(self):
+        old = self.earn(1000, days_ago=300)
+        self.earn(500, days_ago=10)
+        # 舊批次在 70 天後到期
+        PointLot.objects.filter(consumption=old).update(expires_at=self.now - timedelta(minutes=1))
+        with self.assertRaises(InsufficientPointsError):
+            with spend_points(self.user, 60):
+                RedemptionRecord.objects.create(user=self.user, points_used=60)
+
+        call_command('expire_points', stdout=StringIO())
+        self.assertEqual(get_available_points(self.user), 50)
+        self.assertEqual(MemberBalance.objects.get(pk=self.user.pk).expired_points, 100)
+        self.assertEqual(PointExpiryRun.objects.get().points_expired, 100)
+
+        # 再次執行不會重複到期
+        call_command('expire_points', stdout=StringIO())
+        self.assertEqual(get_available_points(self.user), 50)
+
+    def test_backdated_records_expire_on_arrival(self):
+        self.earn(1000, days_ago=400)
+        self.assertEqual(get_available_points(self.user), 0)
+
+    def test_rebuild_replays_fifo_and_expiry(self):
+        old = self.earn(1000, days_ago=300)
+        new = self.earn(500, days_ago=10)
+        with spend_points(self.user, 120):
+            redemption = RedemptionRecord.objects.create(user=self.user, points_used=120)
+        redemption.delete()
+        self.assertEqual((self.remaining(old), self.remaining(new)), (100, 50))
+        self.assertEqual(get_available_points(self.user), 150)
+
+        MemberBalance.objects.all().delete()
+        call_command('rebuild_balances', stdout=StringIO())
+        call_command('rebuild_balances', '--check', stdout=StringIO())
+        self.assertEqual(get_available_points(self.user), 150)
+
+    def test_legacy_spin_mirrors_are_not_counted_twice(self):
+        self.earn(1000, days_ago=10)
+        # 舊版 3x3 拉霸：每局另外建立下注 (RedemptionRecord) 與中獎 (ConsumptionRecord) 鏡像紀錄
+        RedemptionRecord.objects.create(user=self.user, points_used=10, redeemed_item="3x3 拉霸下注")
+        ConsumptionRecord.objects.create(
+            user=self.user, amount=30, sold_item="3x3 拉霸中獎", sales_time=timezone.now()
+        )
+        SlotMachineRecord.objects.create(user=self.user, bet=10, win_points=30)
+        # 沒有對應 SlotMachineRecord 的舊紀錄保留
+        RedemptionRecord.objects.create(
+            user=self.user, points_used=5, redeemed_item="3x3 拉霸下注",
+            redemption_time=self.now - timedelta(days=1),
+        )
+
+        migration = importlib.import_module('members.migrations.0019_remove_legacy_slot_mirrors')
+        migration.remove_legacy_slot_mirrors(apps, None)
+
+        self.assertFalse(MemberBalance.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(RedemptionRecord.objects.filter(redeemed_item="3x3 拉霸下注").count(), 1)
+        self.assertFalse(ConsumptionRecord.objects.filter(sold_item="3x3 拉霸中獎").exists())
+        # 與舊版顯示的餘額相同：100 - 10 + 30 - 5
+        self.assertEqual(get_available_points(self.user), 115)
+        self.assertEqual(rebuild_member_balance(self.user.pk).available_points, 115)
+
+    def test_legacy_mirror_matching_picks_nearest_within_window(self):
+        migration = importlib.import_module('members.migrations.0019_remove_legacy_slot_mirrors')
+        rows = [(pk, 1, self.now + timedelta(seconds=offset), 10) for pk, offset in ((1, 120), (2, -50), (3, 10))]
+        rows.append((4, 1, self.now, 20))
+        buckets = migration._bucket(rows)
+        bucket = buckets[(1, 10)]
+        self.assertEqual(
+            [migration._pop_match(bucket, self.now) for _ in range(3)], [3, 2, None]
+        )
+        self.assertEqual(buckets[(1, 20)][1], [4])
+
+
+class ExpiringSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.soon = User.objects.create_user(username="soon", email="soon@example.com")
+        self.later = User.objects.create_user(username="later", email="later@example.com")
+        for user, days_ago in ((self.soon, 350), (self.soon, 10), (self.later, 100)):
+            ConsumptionRecord.objects.create(
+                user=user, amount=1000, sold_item="品項", sales_time=self.now - timedelta(days=days_ago)
+            )
+
+    def test_nightly_run_precomputes_and_notifies_once(self):
+        call_command('expire_points', '--notify', stdout=StringIO())
+        summary = ExpiringPointsSummary.objects.get()
+        self.assertEqual((summary.user, summary.points), (self.soon, 100))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["soon@example.com"])
+        self.assertEqual(PointExpiryRun.objects.get().expiring_soon_members, 1)
+
+        # 個人頁讀取預先計算的數字
+        self.assertEqual(get_member_summary(self.soon)['points_expiring_soon'], 100)
+        with mock.patch('members.member_cache.PointLot') as lots:
+            get_member_summary(self.later)
+        lots.objects.filter.assert_not_called()
+
+        # 摘要計算後的扣款依 FIFO 先扣即將到期的批次 => 改為即時彙總
+        with spend_points(self.soon, 60):
+            RedemptionRecord.objects.create(user=self.soon, points_used=60)
+        self.assertEqual(get_member_summary(self.soon)['points_expiring_soon'], 40)
+        with spend_points(self.soon, 90):
+            RedemptionRecord.objects.create(user=self.soon, points_used=90)
+        self.assertEqual(get_member_summary(self.soon)['points_expiring_soon'], 0)
+
+        # 7 天內不重複提醒
+        call_command('expire_points', '--notify', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+
+
+# ================================
+# 拉霸賠率引擎
+# ================================
+class PaytableTests(TestCase):
+    def test_reel_game_exact_rtp(self):
+        stats = REEL_GAME.exact_stats()
+        # 三個相同 (非 wild) 4/125 * 5 + 三個 wild 1/125 * 10 + 一個 wild 48/125 * 2 + 兩個 wild 12/125 * 3
+        self.assertAlmostEqual(stats.rtp, 162 / 125)
+        self.assertAlmostEqual(stats.hit_rate, (4 + 1 + 48 + 12) / 125)
+        simulated = REEL_GAME.simulate(20_000, seed=1)
+        self.assertAlmostEqual(simulated.rtp, stats.rtp, delta=0.05)
+
+    def test_grid_game_matches_winning_lines(self):
+        rng = random.Random(7)
+        lines = [[(0, 0), (0, 1), (0, 2)], [(1, 0), (1, 1), (1, 2)], [(2, 0), (2, 1), (2, 2)],
+                 [(0, 0), (1, 0), (2, 0)], [(0, 1), (1, 1), (2, 1)], [(0, 2), (1, 2), (2, 2)],
+                 [(0, 0), (1, 1), (2, 2)], [(0, 2), (1, 1), (2, 0)]]
+        multipliers = {"7": 5, "⭐": 3, "🍒": 2, "🍋": 2, "🔔": 2}
+        for _ in range(500):
+            cells = GRID_GAME.spin(rng)
+            grid = GRID_GAME.to_grid(cells)
+            expected = sum(
+                multipliers[grid[r1][c1]]
+                for (r1, c1), (r2, c2), (r3, c3) in lines
+                if grid[r1][c1] == grid[r2][c2] == grid[r3][c3]
+            )
+            self.assertEqual(GRID_GAME.evaluate(cells), expected)
+
+    def test_grid_game_exact_rtp(self):
+        # 8 條線各自獨立：RTP = 8 * Σ p^3 * multiplier
+        p = GRID_GAME.probabilities
+        expected = 8 * sum(p[i] ** 3 * m for i, m in enumerate(GRID_GAME.multipliers))
+        self.assertAlmostEqual(GRID_GAME.exact_stats().rtp, expected)
+
+    def test_payout_table_matches_evaluate(self):
+        for cells in itertools.product(range(len(REEL_GAME.symbols)), repeat=3):
+            self.assertEqual(REEL_GAME.payout(list(cells)), REEL_GAME.evaluate(cells))
+        rng = random.Random(11)
+        for _ in range(500):
+            cells, multiplier = GRID_GAME.play(rng)
+            self.assertEqual(GRID_GAME.decode(GRID_GAME.encode(cells)), cells)
+            self.assertEqual(multiplier, GRID_GAME.evaluate(cells))
+
+    def test_grid_payout_uses_lookup_table(self):
+        table = GRID_GAME.payout_table()
+        self.assertEqual(len(table), len(GRID_GAME.symbols) ** 9)
+        with mock.patch.object(GridPaytable, 'evaluate', side_effect=AssertionError("不應逐線比對")):
+            cells, multiplier = GRID_GAME.play(random.Random(3))
+        self.assertEqual(multiplier, table[GRID_GAME.encode(cells)])
+
+
+class SlotGridMigrationTests(TransactionTestCase):
+    """
+    0024 (轉換 grid_result) 可重新執行；0025 移除舊欄位前封存無法解析的文字。
+    """
+    before = [('members', '0023_slot_rollup_state')]
+    after = [('members', '0025_archive_legacy_grid_results')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(self.after)
+
+    def test_encode_is_resumable_and_unparsed_text_is_archived(self):
+        old_apps = self.migrate(self.before)
+        Record = old_apps.get_model('members', 'SlotMachineRecord')
+        user = old_apps.get_model('auth', 'User').objects.create(username="legacy")
+        grid = [2, 3, 2, 3, 3, 3, 4, 2, 0]
+        encoded = Record.objects.create(user=user, bet=10, grid_result=GRID_GAME.format_cells(grid))
+        garbled = Record.objects.create(user=user, bet=10, grid_result="🍒 ? 🍒")
+
+        # 中斷後重新執行：只處理 grid_code 仍為空的列
+        migration = importlib.import_module('members.migrations.0024_encode_slot_grid_results')
+        migration.encode_grid_results(old_apps, None)
+        migration.encode_grid_results(old_apps, None)
+        self.assertEqual(Record.objects.get(pk=encoded.pk).grid_code, GRID_GAME.encode(grid))
+
+        self.migrate(self.after)
+        record = SlotMachineRecord.objects.get(pk=encoded.pk)
+        self.assertEqual((record.game, record.cells), (SlotMachineRecord.GAME_GRID, grid))
+        record = SlotMachineRecord.objects.get(pk=garbled.pk)
+        self.assertEqual(record.game, SlotMachineRecord.GAME_UNKNOWN)
+        self.assertEqual(record.grid_result, "🍒 ? 🍒")
+
+        # 反向還原兩種列的原文字
+        old_apps = self.migrate([('members', '0015_expiring_points_summary')])
+        Record = old_apps.get_model('members', 'SlotMachineRecord')
+        self.assertEqual(
+            dict(Record.objects.values_list('pk', 'grid_result')),
+            {encoded.pk: GRID_GAME.format_cells(grid), garbled.pk: "🍒 ? 🍒"},
+        )
+
+
+# ================================
+# 拉霸自動轉 (一次請求多局)
+# ================================
+class AutoSpinTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username="auto", email="auto@example.com")
+        ConsumptionRecord.objects.create(user=self.user, amount=1000, sold_item="測試品項")  # 100 積分
+        self.client.force_login(self.user)
+
+    def auto_spin(self, **params):
+        params.setdefault('bet', 10)
+        return self.client.post(reverse('slot_spin_batch'), params)
+
+    def lot_state(self):
+        return list(PointLot.objects.filter(user=self.user).order_by('earned_at').values_list(
+            'consumption_id', 'slot_record_id', 'remaining_points', 'expired_points'
+        ))
+
+    def test_batch_matches_replayed_ledger(self):
+        random.seed(5)
+        # 查詢數與局數無關：session / 會員 / 鎖定餘額 / 到期檢查 / 寫入紀錄 / FIFO 扣款 / 贏分批次 / 更新餘額
+        with self.assertNumQueries(12):
+            data = self.auto_spin(n=50).json()
+        self.assertEqual(SlotMachineRecord.objects.filter(user=self.user).count(), data['spins'])
+        self.assertEqual(len(data['reelSequences']), data['spins'])
+        self.assertEqual(data['current_points'], 100 + data['total_win'] - data['total_bet'])
+        self.assertEqual(get_available_points(self.user), data['current_points'])
+        if data['stopped'] is None:
+            self.assertEqual(data['spins'], 50)
+        else:
+            self.assertEqual(data['stopped'], "insufficient_points")
+            self.assertLess(data['current_points'], 10)
+
+        # 批次套用的 PointLot / MemberBalance 與逐局重播的結果相同
+        lots = self.lot_state()
+        balance = MemberBalance.objects.get(pk=self.user.pk)
+        rebuild_member_balance(self.user.pk)
+        self.assertEqual(self.lot_state(), lots)
+        self.assertEqual(MemberBalance.objects.get(pk=self.user.pk).available_points, balance.available_points)
+
+    def test_stop_loss_and_limits(self):
+        random.seed(5)
+        data = self.auto_spin(n=100, stop_loss=30).json()
+        self.assertTrue(data['stopped'] == "stop_loss" or data['spins'] == 100)
+        if data['stopped'] == "stop_loss":
+            self.assertGreaterEqual(data['total_bet'] - data['total_win'], 30)
+
+        self.assertEqual(self.auto_spin(n=101).status_code, 400)
+        self.assertEqual(self.auto_spin(n=5, bet=1000).status_code, 400)
+
+    def test_compact_wire_format(self):
+        legacy = self.client.post(reverse('slot_spin'), {'bet': 10}).json()
+        self.assertEqual([len(seq) for seq in legacy['reelSequences']], [12, 12, 12])
+
+        data = self.client.post(reverse('slot_spin'), {'bet': 10, 'format': 2}).json()
+        self.assertEqual((data['v'], len(data['reels'])), (2, 3))
+        self.assertNotIn('reelSequences', data)
+        record = SlotMachineRecord.objects.latest('id')
+        self.assertEqual(record.grid_result, " / ".join(REEL_GAME.symbols[int(c)] for c in data['reels']))
+
+        data = self.auto_spin(n=5, format=2).json()
+        self.assertEqual(len(data['reels']), 3 * data['spins'])
+        self.assertEqual(self.auto_spin(n=5, format=9).status_code, 400)
+
+    def test_spins_require_session_and_csrf(self):
+        other = User.objects.create_user(username="other", email="other@example.com")
+        ConsumptionRecord.objects.create(user=other, amount=1000, sold_item="測試品項")
+        # 以登入的會員扣款，POST 中的 user_id 不起作用
+        self.auto_spin(n=1, user_id=other.pk)
+        self.client.post(reverse('slot_spin'), {'bet': 10, 'user_id': other.pk})
+        self.assertEqual(set(SlotMachineRecord.objects.values_list('user', flat=True)), {self.user.pk})
+        self.assertEqual(get_available_points(other), 100)
+
+        self.client.logout()
+        for url in (reverse('slot_spin'), reverse('slot_spin_batch')):
+            self.assertEqual(self.client.post(url, {'bet': 10, 'n': 1, 'user_id': other.pk}).status_code, 302)
+        self.assertEqual(get_available_points(other), 100)
+
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        token = str(client.get(reverse('slot_game')).context['csrf_token'])
+        for url in (reverse('slot_spin'), reverse('slot_spin_batch')):
+            self.assertEqual(client.post(url, {'bet': 10, 'n': 1}).status_code, 403)
+            self.assertEqual(client.post(url, {'bet': 10, 'n': 1}, HTTP_X_CSRFTOKEN=token).status_code, 200)
+        self.assertEqual(SlotMachineRecord.objects.filter(user=self.user).count(), 4)
+
+
+# ================================
+# 拉霸盤面編碼與 SQL 統計
+# ================================
+class SlotOutcomeStatsTests(TestCase):
+    def test_encoded_grid_round_trip_and_sql_stats(self):
+        user = User.objects.create_user(username="stats", email="stats@example.com")
+        rng = random.Random(3)
+        spins = [GRID_GAME.spin(rng) for _ in range(200)]
+        SlotMachineRecord.objects.bulk_create([
+            SlotMachineRecord.for_spin(SlotMachineRecord.GAME_GRID, cells, user=user, bet=1, win_points=0)
+            for cells in spins
+        ])
+        records = SlotMachineRecord.objects.order_by('id')
+        self.assertEqual([r.cells for r in records], spins)
+        self.assertEqual(records[0].grid_result, GRID_GAME.format_cells(spins[0]))
+        self.assertEqual(GRID_GAME.parse_result(records[0].grid_result), spins[0])
+
+        with self.assertNumQueries(1):
+            stats = outcome_stats(SlotMachineRecord.GAME_GRID)
+        self.assertEqual(stats['spins'], 200)
+        self.assertEqual(stats['line_hits'], [
+            sum(cells[a] == cells[b] == cells[c] for cells in spins) for a, b, c in GRID_GAME.LINES
+        ])
+        self.assertEqual(stats['symbol_counts'], [
+            sum(cells.count(symbol) for cells in spins) for symbol in range(len(GRID_GAME.symbols))
+        ])
+        self.assertEqual(sum(stats['symbol_wins']), sum(stats['line_hits']))
+
+
+# ================================
+# 拉霸每日彙總 (增量水位)
+# ================================
+class SlotRollupTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username="alice", email="alice@example.com")
+        self.bob = User.objects.create_user(username="bob", email="bob@example.com")
+        self.now = timezone.now()
+
+    def play(self, user, bet, win, hours_ago, game=SlotMachineRecord.GAME_REELS):
+        SlotMachineRecord.objects.bulk_create([SlotMachineRecord(
+            user=user, game=game, bet=bet, win_points=win, played_at=self.now - timedelta(hours=hours_ago)
+        )])
+
+    def test_incremental_rollup_matches_full_rebuild(self):
+        self.play(self.alice, 10, 0, hours_ago=30)
+        self.play(self.alice, 10, 50, hours_ago=2)
+        self.play(self.bob, 20, 0, hours_ago=2)
+        run = rollup_slot_stats(now=self.now)
+        self.assertEqual(run.records_processed, 3)
+
+        # ROLLUP_LAG 內上次未處理的紀錄與新紀錄在下次累加，已彙總的紀錄不重複計算
+        self.play(self.alice, 5, 0, hours_ago=0)
+        self.play(self.bob, 5, 0, hours_ago=-0.5)
+        run = rollup_slot_stats(now=self.now + timedelta(hours=1))
+        self.assertEqual(run.records_processed, 2)
+        self.assertEqual(rollup_slot_stats(now=self.now + timedelta(hours=1)).records_processed, 0)
+
+        incremental = sorted(SlotDailyStat.objects.values_list(
+            'day', 'game', 'spins', 'total_bet', 'total_win', 'unique_players'
+        ))
+        rollup_slot_stats(now=self.now + timedelta(hours=1), rebuild=True)
+        rebuilt = sorted(SlotDailyStat.objects.values_list(
+            'day', 'game', 'spins', 'total_bet', 'total_win', 'unique_players'
+        ))
+        self.assertEqual(incremental, rebuilt)
+        self.assertEqual(sum(row[2] for row in rebuilt), 5)
+        self.assertEqual(sum(row[3] for row in rebuilt), 50)
+        self.assertEqual(SlotRollupState.objects.get().rolled_up_through, self.now + timedelta(hours=1) - ROLLUP_LAG)
+
+    def test_dashboard_reads_rollups(self):
+        self.play(self.alice, 10, 0, hours_ago=2)
+        rollup_slot_stats(now=self.now)
+        admin = User.objects.create_superuser(username="root", email="root@example.com", password="pw")
+        self.client.force_login(admin)
+        with self.assertNumQueries(6):  # session / user / 遊戲合計 / 每日 / 會員排行 / 水位
+            response = self.client.get(reverse('super_admin_casino'), {'days': 365})
+        self.assertEqual(response.context['top_members'][0]['user__username'], "alice")
+        self.assertEqual(response.context['game_totals'][0]['house_net'], 10)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentRollupTests(TransactionTestCase):
+    """
+    同時執行的彙總 (第一次執行、重算) 依序鎖定 SlotRollupState，紀錄不會被重複累加。
+    (需支援 SELECT ... FOR UPDATE 的資料庫，例如 PostgreSQL)
+    """
+    THREADS = 4
+
+    def run_concurrently(self, **kwargs):
+        barrier = threading.Barrier(self.THREADS)
+
+        def worker():
+            try:
+                barrier.wait()
+                rollup_slot_stats(now=self.now, **kwargs)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(self.THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return sum(SlotDailyStat.objects.values_list('spins', flat=True))
+
+    def test_concurrent_first_runs_and_rebuilds_count_once(self):
+        user = User.objects.create_user(username="roller", email="roller@example.com")
+        self.now = timezone.now()
+        SlotMachineRecord.objects.bulk_create([
+            SlotMachineRecord(user=user, bet=10, win_points=0, played_at=self.now - timedelta(hours=1))
+            for _ in range(20)
+        ])
+        SlotRollupState.objects.all().delete()
+
+        self.assertEqual(self.run_concurrently(), 20)
+        self.assertEqual(self.run_concurrently(rebuild=True), 20)
+        self.assertEqual(SlotRollupState.objects.get().rolled_up_through, self.now - ROLLUP_LAG)
+
+
+# ================================
+# 會計匯出 (串流 CSV / XLSX)
+# ================================
+class ExportTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", email="admin@example.com", password="pw")
+        self.client.force_login(self.admin)
+        self.today = timezone.localdate()
+        ConsumptionRecord.objects.create(user=self.admin, amount=1000, sold_item="今天")
+        ConsumptionRecord.objects.create(
+            user=self.admin, amount=500, sold_item="上個月", sales_time=timezone.now() - timedelta(days=30)
+        )
+        SlotMachineRecord.for_spin(
+            SlotMachineRecord.GAME_REELS, [0, 0, 0], user=self.admin, bet=10, win_points=50
+        ).save()
+
+    def test_csv_streams_rows_in_date_range(self):
+        url = reverse('super_admin_export', args=['consumption'])
+        response = self.client.get(url, {'start': self.today.isoformat(), 'end': self.today.isoformat()})
+        self.assertTrue(response.streaming)
+        lines = b"".join(response.streaming_content).decode("utf-8-sig").splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].startswith("ID,會員,Email,消費金額(元)"))
+        self.assertIn("今天", lines[1])
+
+        self.assertEqual(self.client.get(url, {'start': "2025-13-01"}).status_code, 400)
+
+    def test_xlsx_export(self):
+        response = self.client.get(reverse('super_admin_export', args=['slots']), {'format': 'xlsx'})
+        workbook = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content)), read_only=True)
+        rows = list(workbook.active.iter_rows(values_only=True))
+        self.assertEqual(rows[0][3:7], ("遊戲", "下注積分", "贏得積分", "盤面"))
+        self.assertEqual(rows[1][3:7], ("三輪拉霸", 10, 50, REEL_GAME.format_cells([0, 0, 0])))
+
+    def test_exports_do_not_emit_formulas(self):
+        ConsumptionRecord.objects.create(user=self.admin, amount=100, sold_item="=HYPERLINK(\"http://x\")")
+        ConsumptionRecord.objects.create(user=self.admin, amount=100, sold_item="-1+2")
+        url = reverse('super_admin_export', args=['consumption'])
+        lines = b"".join(self.client.get(url).streaming_content).decode("utf-8-sig").splitlines()
+        self.assertIn('"\'=HYPERLINK(""http://x"")"', lines[-2])
+        self.assertIn(",'-1+2,", lines[-1])
+
+        response = self.client.get(url, {'format': 'xlsx'})
+        workbook = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content)))
+        cell = workbook.active.cell(row=workbook.active.max_row - 1, column=5)
+        self.assertEqual((cell.value, cell.data_type), ('=HYPERLINK("http://x")', 's'))
+
+    def test_large_xlsx_export_is_queued(self):
+        url = reverse('super_admin_export', args=['consumption'])
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media), \
+                mock.patch('members.exports.XLSX_SYNC_MAX_ROWS', 1):
+            response = self.client.get(url, {'format': 'xlsx'})
+            self.assertRedirects(response, reverse('super_admin_dashboard'))
+            job = BackgroundJob.objects.get(kind=BackgroundJob.KIND_XLSX_EXPORT)
+            self.assertEqual(job.parameters['dataset'], 'consumption')
+
+            job = run_job(claim_next_job())
+            self.assertEqual((job.status, job.rows_processed), (BackgroundJob.STATUS_SUCCEEDED, 2))
+            result_url = self.client.get(reverse('job_status', args=[job.pk])).json()['result_url']
+            self.assertEqual(result_url, reverse('job_result', args=[job.pk]))
+            response = self.client.get(result_url)
+            workbook = openpyxl.load_workbook(BytesIO(b"".join(response.streaming_content)), read_only=True)
+            self.assertEqual(len(list(workbook.active.iter_rows(values_only=True))), 3)
+
+            # 超過保留期限後刪除結果檔
+            self.assertEqual(purge_job_results(timedelta(0)), 1)
+            self.assertEqual(self.client.get(result_url).status_code, 404)
+
+
+# ================================
+# 背景工作佇列 (enqueue / claim / run / run_jobs worker)
+# ================================
+class BackgroundJobTests(TestCase):
+    KIND = BackgroundJob.KIND_SHEETS_IMPORT
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", email="admin@example.com", password="pw")
+
+    def handler(self, func):
+        return mock.patch.dict(JOB_HANDLERS, {self.KIND: func})
+
+    def test_enqueue_reuses_active_job_and_claim_marks_running(self):
+        job, created = enqueue_job(self.KIND, requested_by=self.admin)
+        self.assertTrue(created)
+        self.assertEqual(enqueue_job(self.KIND), (job, False))
+
+        claimed = claim_next_job()
+        self.assertEqual(claimed.pk, job.pk)
+        self.assertEqual(claimed.status, BackgroundJob.STATUS_RUNNING)
+        self.assertIsNotNone(claimed.heartbeat_at)
+        self.assertIsNone(claim_next_job())
+
+    def test_run_job_records_success_and_failure(self):
+        def succeed(progress):
+            progress(5)
+            return "✅ 完成"
+
+        def fail(progress):
+            raise SheetSyncError("❌ 同步失敗")
+
+        enqueue_job(self.KIND)
+        with self.handler(succeed):
+            job = run_job(claim_next_job())
+        self.assertEqual((job.status, job.message, job.rows_processed), (BackgroundJob.STATUS_SUCCEEDED, "✅ 完成", 5))
+        self.assertIsNotNone(job.finished_at)
+
+        enqueue_job(self.KIND)
+        with self.handler(fail):
+            job = run_job(claim_next_job())
+        self.assertEqual((job.status, job.message), (BackgroundJob.STATUS_FAILED, "❌ 同步失敗"))
+
+        enqueue_job(self.KIND)
+        with self.handler(mock.Mock(side_effect=ValueError("boom"))):
+            job = run_job(claim_next_job())
+        self.assertEqual((job.status, job.message), (BackgroundJob.STATUS_FAILED, "⚠️ 發生未知錯誤: boom"))
+
+    def test_only_jobs_without_recent_heartbeat_are_stale(self):
+        now = timezone.now()
+        alive = BackgroundJob.objects.create(
+            kind=self.KIND, status=BackgroundJob.STATUS_RUNNING,
+            started_at=now - timedelta(hours=2), heartbeat_at=now - timedelta(seconds=20),
+        )
+        dead = BackgroundJob.objects.create(
+            kind=BackgroundJob.KIND_MEMBER_EXPORT, status=BackgroundJob.STATUS_RUNNING,
+            started_at=now - timedelta(minutes=20), heartbeat_at=now - timedelta(minutes=10),
+        )
+        self.assertEqual(fail_stale_jobs(timedelta(minutes=5)), 1)
+        alive.refresh_from_db()
+        dead.refresh_from_db()
+        self.assertEqual(alive.status, BackgroundJob.STATUS_RUNNING)
+        self.assertEqual(dead.status, BackgroundJob.STATUS_FAILED)
+
+    def test_finishing_does_not_overwrite_a_job_marked_stale(self):
+        def marked_stale_meanwhile(progress):
+            BackgroundJob.objects.update(heartbeat_at=timezone.now() - timedelta(hours=1))
+            fail_stale_jobs()
+            return "✅ 完成"
+
+        enqueue_job(self.KIND)
+        with self.handler(marked_stale_meanwhile), self.assertLogs("members.jobs", level="WARNING"):
+            job = run_job(claim_next_job())
+        self.assertEqual(job.status, BackgroundJob.STATUS_FAILED)
+        self.assertEqual(job.message, "⚠️ worker 中途終止，工作未完成")
+
+    def test_worker_command_and_status_json(self):
+        job, _ = enqueue_job(self.KIND, requested_by=self.admin)
+        out = StringIO()
+        with self.handler(lambda progress: "✅ 完成"):
+            call_command('run_jobs', '--once', stdout=out)
+        self.assertIn("✅ 完成", out.getvalue())
+
+        url = reverse('job_status', args=[job.pk])
+        self.assertEqual(self.client.get(url).status_code, 302)
+        self.client.force_login(self.admin)
+        data = self.client.get(url).json()
+        self.assertEqual((data['id'], data['status'], data['message']), (job.pk, "succeeded", "✅ 完成"))
+        self.assertIsNotNone(data['finished_at'])
+
+    def test_sheet_sync_setup_failure_is_logged(self):
+        with mock.patch("members.sheet_sync.fetch_sheet_last_update_time", side_effect=RuntimeError("無法開啟")):
+            with self.assertRaises(SheetSyncError):
+                update_from_google_sheets_logic()
+        log = GoogleSheetsSyncLog.objects.get()
+        self.assertEqual(log.status, "失敗")
+        self.assertIn("無法開啟", log.message)
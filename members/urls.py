@@ -25,6 +25,13 @@ urlpatterns = [
     path('super_admin/edit_user/<int:user_id>/', views.super_admin_edit_user, name='super_admin_edit_user'),
     # 同步會員列表到 Google Sheets
     path('super_admin/sync_users_sheet/', views.sync_users_to_google_sheets, name='sync_users_to_google_sheets'),
+    # 拉霸報表 (每日彙總)
+    path('super_admin/casino/', views.super_admin_casino_dashboard, name='super_admin_casino'),
+    # 會計匯出 (consumption / slots，?start=&end=&format=csv|xlsx)
+    path('super_admin/export/<str:dataset>/', views.super_admin_export, name='super_admin_export'),
+    # 背景工作進度 (JSON)
+    path('super_admin/jobs/<int:job_id>/', views.job_status_view, name='job_status'),
+    path('super_admin/jobs/<int:job_id>/result/', views.job_result_view, name='job_result'),
 
     # -------------------------
     # 積分相關功能
@@ -4,75 +4,45 @@ views.py - 各個功能的 View 定義
 """
 
 from django.shortcuts import render, redirect, get_object_or_404
+from django.http import FileResponse, Http404, HttpResponseBadRequest, JsonResponse
 from django.contrib.auth import login, logout
+from django.core.files.storage import default_storage
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.db.models import Sum
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib.auth.models import User
+from django.core.paginator import Paginator
 from django.contrib import messages
 from django.utils import timezone
-from django.utils.dateparse import parse_datetime, parse_date
-from decimal import Decimal
-import re
-import openpyxl
-from datetime import datetime, timedelta
-from django.core.paginator import Paginator
+from django.utils.dateparse import parse_date
+import os
 import random
-from django.db.models import Sum
-from decimal import Decimal
-from .models import SlotMachineRecord, ConsumptionRecord, RedemptionRecord
-from .forms import SlotMachineForm
+from datetime import datetime, timedelta
 
 from .forms import (
     ConsumptionRecordForm,
     RedeemPointsForm,
     ProfileEditForm,
-    ExcelUploadForm
+    ExcelUploadForm,
+    SlotMachineForm,
 )
-from .models import ConsumptionRecord, RedemptionRecord, GoogleSheetsSyncLog
-# ★ google_sheets.py 中定義了 fetch_google_sheets_data, safe_strip, safe_decimal
-from .google_sheets import fetch_google_sheets_data, safe_strip, safe_decimal
-
-
-def parse_sales_time(sales_time_str):
-    """
-    彈性解析銷售時間字串，支援：
-      1. Django parse_datetime() (ISO 格式等)
-      2. 多個 strptime 格式 (含 YYYY/MM/DD、YYYY/MM/DD HH:MM、YYYY-MM-DD ...)
-      3. 若都失敗則返回 timezone.now()
-    """
-    dt = parse_datetime(sales_time_str)
-    if dt is not None:
-        return dt
-
-    possible_formats = [
-        "%Y/%m/%d %H:%M:%S",
-        "%Y/%m/%d %H:%M",
-        "%Y/%m/%d",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d %H:%M",
-        "%Y-%m-%d"
-    ]
-
-    for fmt in possible_formats:
-        try:
-            dt_obj = datetime.strptime(sales_time_str, fmt)
-            dt_obj_aware = timezone.make_aware(dt_obj, timezone.get_current_timezone())
-            return dt_obj_aware
-        except ValueError:
-            pass
-
-    match = re.match(r'^(\d{4})/(\d{1,2})/(\d{1,2})$', sales_time_str.strip())
-    if match:
-        y, m, d = match.groups()
-        try:
-            dt_obj = datetime(int(y), int(m), int(d))
-            dt_obj_aware = timezone.make_aware(dt_obj, timezone.get_current_timezone())
-            return dt_obj_aware
-        except ValueError:
-            pass
-
-    return timezone.now()
+from .models import RedemptionRecord, BackgroundJob, SlotMachineRecord
+from casino.paytable import GRID_GAME
+from casino.rollups import daily_report, game_totals, last_rollup, top_members
+
+from .exports import (
+    EXPORT_DATASETS,
+    EXPORT_FORMATS,
+    XLSX_SYNC_MAX_ROWS,
+    export_job_parameters,
+    export_response,
+    needs_background_export,
+    parse_export_date,
+)
+from .jobs import enqueue_job, job_result_name
+from .member_cache import get_member_summary, member_cache_stats
+from .pagination import KnownCountPaginator, keyset_page
+from .points import get_available_points, spend_points, InsufficientPointsError
 
 
 # -------------------------------------------------------
@@ -123,7 +93,9 @@ def logout_view(request):
 # -------------------------------------------------------
 @login_required
 def home_view(request):
-    return render(request, 'members/home.html')
+    return render(request, 'members/home.html', {
+        'summary': get_member_summary(request.user),
+    })
 
 
 # -------------------------------------------------------
@@ -140,53 +112,58 @@ def profile_view(request):
     search_query = request.GET.get('q', '').strip()
     show_more = request.GET.get('show_more', '0')
     page_number = request.GET.get('page', 1)
+    redemption_page_number = request.GET.get('redemption_page', 1)
 
     # 取得所有消費紀錄 (依銷售時間排序)
     all_records = request.user.consumption_records.all().order_by('-sales_time')
-    # 累積回饋積分
-    total_points = all_records.aggregate(total=Sum('reward_points'))['total'] or 0
 
-    # 取得使用紀錄(何時使用積分)
-    redemption_records = request.user.redemption_records.all().order_by('-redemption_time')
+    # 累積回饋積分、一個月內到期的積分與紀錄筆數：取自會員摘要快取 (未命中時以一次條件式彙總計算)
+    summary = get_member_summary(request.user)
+    total_points = summary['total_points']
+    points_expiring_soon = summary['points_expiring_soon']
+    record_count = summary['record_count']
 
-    # 一個月內到期的積分 (需 models.py 有 expiry_date)
-    now = timezone.now()
-    soon = now + timedelta(days=30)
-    expiring_records = all_records.filter(expiry_date__range=(now, soon))
-    points_expiring_soon = expiring_records.aggregate(total=Sum('reward_points'))['total'] or 0
+    # 取得使用紀錄(何時使用積分)，每頁 10 筆
+    redemption_paginator = Paginator(
+        request.user.redemption_records.all().order_by('-redemption_time'), 10
+    )
+    redemption_page = redemption_paginator.get_page(redemption_page_number)
 
     # 日期搜尋 (YYYY-MM-DD)
     if search_query:
+        # 篩選後的筆數與上面的總筆數不同 => 交由 Paginator 自行計算
+        record_count = None
         date_obj = parse_date(search_query)
         if date_obj:
-            all_records = all_records.filter(sales_time__date=date_obj)
+            # 以當日起訖範圍查詢 (而非 sales_time__date)，才能使用 (user, -sales_time) 索引
+            day_start = timezone.make_aware(datetime.combine(date_obj, datetime.min.time()))
+            all_records = all_records.filter(
+                sales_time__gte=day_start, sales_time__lt=day_start + timedelta(days=1)
+            )
         else:
             # 若解析失敗 => 回傳空集合
             all_records = all_records.none()
+            record_count = 0
 
-    if show_more == '1':
-        # 分頁模式：每頁顯示 20 筆
-        paginator = Paginator(all_records, 20)
+    context = {
+        'search_query': search_query,
+        'total_points': total_points,
+        'redemption_page': redemption_page,
+        'points_expiring_soon': points_expiring_soon,
+    }
+    if show_more == '1' and 'page' in request.GET:
+        # 舊版頁碼分頁 (OFFSET)：保留給既有的 ?page=N 連結，每頁顯示 20 筆
+        paginator = KnownCountPaginator(all_records, 20, count=record_count)
         page_obj = paginator.get_page(page_number)
-        return render(request, 'members/profile.html', {
-            'is_paginated': True,
-            'page_obj': page_obj,
-            'search_query': search_query,
-            'total_points': total_points,
-            'redemption_records': redemption_records,
-            'points_expiring_soon': points_expiring_soon,
-        })
+        context.update({'is_paginated': True, 'is_keyset': False, 'page_obj': page_obj})
+    elif show_more == '1':
+        # 分頁模式：以 (sales_time, id) 為 cursor 的 keyset 分頁，每頁顯示 20 筆，深層頁不需 OFFSET
+        page_obj = keyset_page(all_records, 'sales_time', 20, cursor=request.GET.get('cursor'))
+        context.update({'is_paginated': True, 'is_keyset': True, 'page_obj': page_obj})
     else:
         # 預設只顯示最近 10 筆
-        records = all_records[:10]
-        return render(request, 'members/profile.html', {
-            'is_paginated': False,
-            'records': records,
-            'search_query': search_query,
-            'total_points': total_points,
-            'redemption_records': redemption_records,
-            'points_expiring_soon': points_expiring_soon,
-        })
+        context.update({'is_paginated': False, 'records': all_records[:10]})
+    return render(request, 'members/profile.html', context)
 
 
 # -------------------------------------------------------
@@ -230,6 +207,7 @@ def super_admin_dashboard(request):
     超級管理者後台：匯入每日銷售明細、批次更新超級管理者、顯示使用者列表
     """
     message = ""
+    form = ExcelUploadForm()
     if request.method == 'POST':
         # (A) 批次更新超級管理者
         if request.POST.get('action') == 'update_superusers':
@@ -239,15 +217,30 @@ def super_admin_dashboard(request):
                 User.objects.filter(id__in=posted_ids).update(is_superuser=True)
             message = "已更新超級管理者設定！"
 
-        # (B) 手動同步 Google Sheets (匯入消費紀錄)
+        # (B) 手動同步 Google Sheets (匯入消費紀錄) => 排入背景工作，立即返回
         elif 'sync_google_sheets' in request.POST:
-            # 呼叫無需 request 的邏輯函式
-            message = update_from_google_sheets_logic()
+            job, created = enqueue_job(BackgroundJob.KIND_SHEETS_IMPORT, requested_by=request.user)
+            message = job_enqueued_message(job, created)
+
+        # (C) 上傳 Excel 匯入消費紀錄 => 檔案存入 MEDIA_ROOT 並排入背景工作，立即返回 (進度見背景工作列表)
+        elif request.POST.get('action') == 'import_excel':
+            form = ExcelUploadForm(request.POST, request.FILES)
+            if form.is_valid():
+                job, created = enqueue_job(
+                    BackgroundJob.KIND_EXCEL_IMPORT, requested_by=request.user, upload=form.cleaned_data['file']
+                )
+                message = job_enqueued_message(job, created)
+                form = ExcelUploadForm()
 
     members = User.objects.all().order_by('username')
+    recent_jobs = BackgroundJob.objects.order_by('-created_at')[:10]
     return render(request, 'members/super_admin_dashboard.html', {
         'message': message,
-        'members': members
+        'form': form,
+        'export_datasets': EXPORT_DATASETS.values(),
+        'members': members,
+        'recent_jobs': recent_jobs,
+        'member_cache_stats': member_cache_stats(),
     })
 
 
@@ -270,6 +263,41 @@ def super_admin_edit_user(request, user_id):
     })
 
 
+# 拉霸報表可選的期間 (天)
+CASINO_REPORT_RANGES = [7, 30, 90, 365]
+
+
+@user_passes_test(lambda u: u.is_superuser)
+def super_admin_casino_dashboard(request):
+    """
+    拉霸報表：只讀取每日彙總表 (由 rollup_slot_stats 排程維護)，不掃描 SlotMachineRecord
+    """
+    try:
+        days = int(request.GET.get('days', 30))
+    except ValueError:
+        days = 30
+    if days not in CASINO_REPORT_RANGES:
+        days = 30
+    end = timezone.localdate()
+    start = end - timedelta(days=days - 1)
+
+    totals = game_totals(start, end)
+    for row in totals:
+        row['game_label'] = dict(SlotMachineRecord.GAME_CHOICES).get(row['game'], row['game'])
+        row['rtp_percent'] = 100 * row['win'] / row['bet'] if row['bet'] else None
+
+    return render(request, 'members/super_admin_casino.html', {
+        'days': days,
+        'ranges': CASINO_REPORT_RANGES,
+        'start': start,
+        'end': end,
+        'daily': daily_report(start, end),
+        'game_totals': totals,
+        'top_members': top_members(start, end),
+        'last_rollup': last_rollup(),
+    })
+
+
 # -------------------------------------------------------
 # 9. 超級管理者登入 / 登出
 # -------------------------------------------------------
@@ -298,21 +326,26 @@ def super_admin_logout_view(request):
 # -------------------------------------------------------
 @login_required
 def redeem_points_view(request):
-    total_reward_points = request.user.consumption_records.aggregate(total=Sum('reward_points'))['total'] or 0
-    total_redeemed = request.user.redemption_records.aggregate(total=Sum('points_used'))['total'] or 0
-    available_points = total_reward_points - total_redeemed
+    available_points = get_member_summary(request.user)['available_points']
 
     message = ""
     if request.method == 'POST':
         form = RedeemPointsForm(request.POST)
         if form.is_valid():
-            points_to_redeem = form.cleaned_data['points']
-            if points_to_redeem > available_points:
-                form.add_error('points', "您沒有足夠的積分來兌換。")
+            points_to_redeem = form.cleaned_data['points_used']
+            try:
+                # 鎖定會員餘額後再檢查並扣款，避免並行請求超額兌換
+                with spend_points(request.user, points_to_redeem):
+                    RedemptionRecord.objects.create(
+                        user=request.user,
+                        points_used=points_to_redeem,
+                        redeemed_item=form.cleaned_data['redeemed_item']
+                    )
+            except InsufficientPointsError:
+                form.add_error('points_used', "您沒有足夠的積分來兌換。")
             else:
-                RedemptionRecord.objects.create(user=request.user, points_used=points_to_redeem)
                 message = f"成功兌換 {points_to_redeem} 積分！"
-                available_points -= points_to_redeem
+                available_points = get_available_points(request.user)
     else:
         form = RedeemPointsForm()
 
@@ -323,53 +356,6 @@ def redeem_points_view(request):
     })
 
 
-# -------------------------------------------------------
-# 11. 純邏輯：從 Google Sheets 取得資料 (抓消費紀錄)
-# -------------------------------------------------------
-def update_from_google_sheets_logic():
-    """
-    純邏輯函式：不需要 request 或權限檢查，方便 management command 或其他地方呼叫。
-    從 Google Sheets 取得資料並同步到 Django 資料庫 (與 Sheet9 保持一致)。
-    如果找不到唯一會員 (0 或多筆) 就跳過該筆 (視為非會員)。
-    """
-    records = fetch_google_sheets_data()
-    message = "✅ Google Sheets 同步完成！\n"
-
-    # 刪除舊的消費紀錄
-    ConsumptionRecord.objects.all().delete()
-
-    for row in records:
-        try:
-            email = safe_strip(row.get("會員 Email", ""))
-            raw_amount = safe_strip(row.get("消費金額(元)", "0")).replace(",", "")
-            amount = safe_decimal(raw_amount)
-
-            sold_item = safe_strip(row.get("銷售品項", "未知品項"))
-            sales_time_str = safe_strip(row.get("銷售時間", ""))
-
-            # 用 filter() 取代 get()，若非唯一就跳過
-            matching_users = User.objects.filter(email=email)
-            count = matching_users.count()
-            if count == 1:
-                user = matching_users.first()
-                sales_time = parse_sales_time(sales_time_str)
-
-                ConsumptionRecord.objects.create(
-                    user=user,
-                    amount=amount,
-                    sold_item=sold_item,
-                    sales_time=sales_time
-                )
-            else:
-                # 0 筆 or 多筆 => 視為非會員，不建立紀錄
-                message += f"⚠️ 非會員或多筆會員 Email: {email}，此筆未新增。\n"
-
-        except Exception as e:
-            message += f"⚠️ 發生錯誤: {e}\n"
-
-    return message
-
-
 # -------------------------------------------------------
 # ★ View 版本：若要在後台按按鈕同步 (檢查 superuser)
 # -------------------------------------------------------
@@ -377,10 +363,10 @@ def update_from_google_sheets_logic():
 def update_from_google_sheets_view(request):
     """
     若你在後台想透過 URL 觸發同步，可用這個 View。
-    需要檢查 superuser，然後呼叫邏輯函式。
+    需要檢查 superuser，然後排入背景工作 (由 run_jobs worker 執行)。
     """
-    msg = update_from_google_sheets_logic()
-    messages.info(request, msg)
+    job, created = enqueue_job(BackgroundJob.KIND_SHEETS_IMPORT, requested_by=request.user)
+    messages.info(request, job_enqueued_message(job, created))
     return redirect('super_admin_dashboard')
 
 
@@ -391,58 +377,89 @@ def update_from_google_sheets_view(request):
 def sync_users_to_google_sheets(request):
     """
     將所有會員 (User) 資料同步到 Google Sheets 的某個工作表 (Worksheet)
+    (排入背景工作，由 run_jobs worker 執行 sync_members_to_google_sheets_logic)
     """
-    import os
-    import json
-    import gspread
-    from google.oauth2.service_account import Credentials
+    job, created = enqueue_job(BackgroundJob.KIND_MEMBER_EXPORT, requested_by=request.user)
+    messages.info(request, job_enqueued_message(job, created))
+    return redirect('super_admin_dashboard')
 
-    message = ""
+
+# -------------------------------------------------------
+# ★ 新增：會計匯出 (串流 CSV / XLSX)
+# -------------------------------------------------------
+@user_passes_test(lambda u: u.is_superuser)
+def super_admin_export(request, dataset):
+    """
+    匯出消費紀錄 (consumption) 或拉霸紀錄 (slots)：?start=YYYY-MM-DD&end=YYYY-MM-DD&format=csv|xlsx
+    超過 XLSX_SYNC_MAX_ROWS 列的 XLSX 排入背景工作，完成後從後台的背景工作列表下載。
+    """
+    if dataset not in EXPORT_DATASETS:
+        raise Http404("沒有這種匯出資料")
+    file_format = request.GET.get('format', 'csv')
+    if file_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest("format 只能是 csv 或 xlsx")
     try:
-        SPREADSHEET_ID = os.getenv("SPREADSHEET_ID", "你的試算表ID")
-        WORKSHEET_NAME = "MemberList"
-
-        SCOPES = [
-            "https://www.googleapis.com/auth/spreadsheets",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        creds_info = os.getenv("GOOGLE_CREDENTIALS", "")
-        creds_dict = json.loads(creds_info)
-        creds = Credentials.from_service_account_info(creds_dict, scopes=SCOPES)
-        client = gspread.authorize(creds)
-
-        sheet = client.open_by_key(SPREADSHEET_ID).worksheet(WORKSHEET_NAME)
-
-        members = User.objects.all().order_by('username')
-        data = [
-            ["使用者名稱", "Email", "是否超級管理者", "建立日期"]
-        ]
-        for m in members:
-            data.append([
-                m.username,
-                m.email,
-                "是" if m.is_superuser else "否",
-                m.date_joined.strftime("%Y-%m-%d %H:%M:%S")
-            ])
-
-        sheet.clear()
-        sheet.update("A1", data)
-
-        message = "✅ 已將會員資料同步到 Google Sheets"
-    except Exception as e:
-        message = f"❌ 同步會員資料失敗：{e}"
-
-    messages.info(request, message)
-    return redirect('super_admin_dashboard')
+        start = parse_export_date(request.GET.get('start'))
+        end = parse_export_date(request.GET.get('end'))
+    except ValueError:
+        return HttpResponseBadRequest("日期格式應為 YYYY-MM-DD")
+    if needs_background_export(dataset, file_format, start, end):
+        job, created = enqueue_job(
+            BackgroundJob.KIND_XLSX_EXPORT,
+            requested_by=request.user,
+            parameters=export_job_parameters(dataset, start, end),
+        )
+        messages.info(
+            request,
+            f"資料超過 {XLSX_SYNC_MAX_ROWS} 列，Excel 改由背景工作 #{job.pk} 產生，完成後可在背景工作列表下載。"
+        )
+        return redirect('super_admin_dashboard')
+    return export_response(dataset, file_format, start, end)
+
 
 # -------------------------------------------------------
-# ★ 新增：拉霸機
+# ★ 新增：背景工作進度查詢 (JSON)
 # -------------------------------------------------------
+def job_enqueued_message(job, created):
+    if created:
+        return f"已排入背景工作 #{job.pk}（{job.get_kind_display()}），完成後會記錄在同步紀錄中。"
+    return f"背景工作 #{job.pk}（{job.get_kind_display()}）已在佇列中：{job.get_status_display()}。"
+
+
+@user_passes_test(lambda u: u.is_superuser)
+def job_status_view(request, job_id):
+    job = get_object_or_404(BackgroundJob, pk=job_id)
+    result_url = reverse('job_result', args=[job.pk]) if job_result_name(job) else None
+    return JsonResponse({
+        "id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "status_display": job.get_status_display(),
+        "rows_processed": job.rows_processed,
+        "message": job.message,
+        "created_at": job.created_at.isoformat(),
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "heartbeat_at": job.heartbeat_at.isoformat() if job.heartbeat_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "result_url": result_url,
+    })
 
-import random
-from .models import SlotMachineRecord
-from .forms import SlotMachineForm
 
+@user_passes_test(lambda u: u.is_superuser)
+def job_result_view(request, job_id):
+    """
+    下載背景工作產生的檔案 (例如大量 XLSX 匯出)。
+    """
+    job = get_object_or_404(BackgroundJob, pk=job_id)
+    name = job_result_name(job)
+    if name is None:
+        raise Http404("沒有可下載的結果檔 (工作未完成或已超過保留期限)")
+    return FileResponse(default_storage.open(name, 'rb'), as_attachment=True, filename=os.path.basename(name))
+
+# -------------------------------------------------------
+# ★ 新增：拉霸機
+# -------------------------------------------------------
+@login_required
 def slot_machine_3x3_view(request):
     """
     3x3 拉霸機：會員輸入 bet -> 檢查積分 -> 扣除 -> 生成 3x3 -> 判斷獲勝線 -> 加回贏得積分 -> 紀錄結果
@@ -451,23 +468,10 @@ def slot_machine_3x3_view(request):
     grid = []
     win_points = 0
 
-    # 先計算可用積分
-    total_reward_points = request.user.consumption_records.aggregate(total=Sum('reward_points'))['total'] or 0
-    total_redeemed = request.user.redemption_records.aggregate(total=Sum('points_used'))['total'] or 0
-    available_points = total_reward_points - total_redeemed
-
-    # 符號出現機率 (weights 與 pool 長度相同)
-    SYMBOL_POOL = ["7", "⭐", "🍒", "🍋", "🔔"]
-    SYMBOL_WEIGHTS = [1, 2, 3, 4, 4]  # 7 出現機率較低
-
-    # 三個相同符號時的賠率
-    SYMBOL_MULTIPLIERS = {
-        "7": 5,  # 三個7 => bet * 5
-        "⭐": 3,  # 三個⭐ => bet * 3
-        "🍒": 2,
-        "🍋": 2,
-        "🔔": 2
-    }
+    # 先取得可用積分 (會員摘要快取)
+    available_points = get_member_summary(request.user)['available_points']
+
+    # 符號、權重、賠率與中獎線定義於 casino/paytable.py (GRID_GAME)
 
     if request.method == 'POST':
         form = SlotMachineForm(request.POST)
@@ -475,67 +479,30 @@ def slot_machine_3x3_view(request):
             bet = form.cleaned_data['bet']
             user = request.user
 
-            if bet > available_points:
+            try:
+                # 鎖定會員餘額 => 檢查積分 => 產生結果並紀錄，全部在同一個交易中完成
+                with spend_points(user, bet):
+                    # 產生 3x3 符號（使用 weights），查賠率表取得 8 條中獎線的總倍數
+                    cells, multiplier = GRID_GAME.play(random)
+                    grid = GRID_GAME.to_grid(cells)
+                    win_points = bet * multiplier
+
+                    # 紀錄到 SlotMachineRecord (下注與贏分皆由此計入 MemberBalance)
+                    grid_str = GRID_GAME.format_cells(cells)
+                    SlotMachineRecord.for_spin(
+                        SlotMachineRecord.GAME_GRID, cells,
+                        user=user,
+                        bet=bet,
+                        win_points=win_points
+                    ).save()
+            except InsufficientPointsError:
                 message = "您沒有足夠的積分來下注。"
             else:
-                # 扣除下注積分 => 新增 RedemptionRecord
-                RedemptionRecord.objects.create(
-                    user=user,
-                    points_used=bet,
-                    redeemed_item="3x3 拉霸下注"
-                )
-
-                # 產生 3x3 符號（使用 weights）
-                flat_symbols = random.choices(SYMBOL_POOL, weights=SYMBOL_WEIGHTS, k=9)
-                grid = [flat_symbols[i*3:(i+1)*3] for i in range(3)]
-
-                # 定義 8 條獲勝線
-                winning_lines = [
-                    [(0,0),(0,1),(0,2)],  # row 0
-                    [(1,0),(1,1),(1,2)],  # row 1
-                    [(2,0),(2,1),(2,2)],  # row 2
-                    [(0,0),(1,0),(2,0)],  # col 0
-                    [(0,1),(1,1),(2,1)],  # col 1
-                    [(0,2),(1,2),(2,2)],  # col 2
-                    [(0,0),(1,1),(2,2)],  # diag
-                    [(0,2),(1,1),(2,0)]   # anti-diag
-                ]
-
-                # 判斷中獎線
-                for line in winning_lines:
-                    (r1,c1),(r2,c2),(r3,c3) = line
-                    if grid[r1][c1] == grid[r2][c2] == grid[r3][c3]:
-                        symbol = grid[r1][c1]
-                        multiplier = SYMBOL_MULTIPLIERS.get(symbol, 2)
-                        win_points += bet * multiplier
-
-                # 若有贏分 => 加回
-                if win_points > 0:
-                    # 建立一筆 ConsumptionRecord，sold_item="3x3 拉霸中獎"
-                    # 在 models.py 中檢查到 sold_item=="3x3 拉霸中獎" 就會 reward_points=amount
-                    ConsumptionRecord.objects.create(
-                        user=user,
-                        amount=Decimal(win_points),
-                        sold_item="3x3 拉霸中獎",
-                        sales_time=timezone.now()
-                    )
-
-                # 紀錄到 SlotMachineRecord
-                grid_str = " / ".join(" ".join(row) for row in grid)
-                SlotMachineRecord.objects.create(
-                    user=user,
-                    bet=bet,
-                    grid_result=grid_str,
-                    win_points=win_points
-                )
-
                 # 顯示結果訊息
                 message = f"結果：\n{grid_str}\n您贏得 {win_points} 積分！"
 
-                # 重新計算剩餘積分（若有扣或加）
-                total_reward_points = user.consumption_records.aggregate(total=Sum('reward_points'))['total'] or 0
-                total_redeemed = user.redemption_records.aggregate(total=Sum('points_used'))['total'] or 0
-                available_points = total_reward_points - total_redeemed
+                # 重新取得剩餘積分（若有扣或加）
+                available_points = get_available_points(user)
 
     else:
         form = SlotMachineForm()
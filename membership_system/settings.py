@@ -6,8 +6,6 @@ import os
 import json
 from pathlib import Path
 import dj_database_url
-import gspread
-from google.oauth2.service_account import Credentials
 
 # ==============================================================================
 # 1. 專案基本設定
@@ -95,7 +93,12 @@ DATABASE_URL = os.getenv(
 
 if DATABASE_URL:
     DATABASES = {
-        'default': dj_database_url.config(default=DATABASE_URL, conn_max_age=600, ssl_require=True)
+        # 僅 PostgreSQL 需要 SSL (測試時可用 DATABASE_URL=sqlite:///... 改為本機 SQLite)
+        'default': dj_database_url.config(
+            default=DATABASE_URL,
+            conn_max_age=600,
+            ssl_require=DATABASE_URL.startswith("postgres")
+        )
     }
 else:
     if DEBUG:
@@ -149,6 +152,11 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 # 當執行 collectstatic 時，靜態檔案會被收集到此資料夾
 STATIC_ROOT = os.path.join(BASE_DIR, "staticfiles")
 
+# 上傳檔案：後台上傳的 Excel 暫存於此，由 run_jobs worker 匯入後刪除
+# (worker 與網站需能存取同一個目錄；分開部署時請設定為共用磁碟)
+MEDIA_URL = '/media/'
+MEDIA_ROOT = os.getenv('MEDIA_ROOT', os.path.join(BASE_DIR, "media"))
+
 # ==============================================================================
 # 9. 預設 Primary Key 設定
 # ==============================================================================
@@ -165,32 +173,40 @@ LOGIN_URL = '/members/login/'
 EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 
 # ==============================================================================
-# 11. Google Sheets API 設定
+# 11. 快取設定
+# ==============================================================================
+
+# 預設為各 process 獨立的記憶體快取 (開發 / 測試)；
+# 生產環境多個 worker 需共用快取時設定 CACHE_URL=redis://... (需另外安裝 redis 套件)
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'membership-system',
+        }
+    }
+
+# 會員摘要 (可用積分、即將到期積分、最近活動) 的快取秒數；紀錄寫入時會立即失效，
+# 逾時只是讓「即將到期」等隨時間變動的數字定期重算
+MEMBER_CACHE_TIMEOUT = int(os.getenv('MEMBER_CACHE_TIMEOUT', '300'))
+
+# ==============================================================================
+# 12. Google Sheets API 設定
 # ==============================================================================
 
 # 若要啟用 Google Sheets API，請在 Render 的環境變數中設定 GOOGLE_SHEETS_ENABLED 為 True
 GOOGLE_SHEETS_ENABLED = os.getenv('GOOGLE_SHEETS_ENABLED', 'False') == 'True'
 
-if GOOGLE_SHEETS_ENABLED:
-    try:
-        # 從環境變數中讀取 GOOGLE_CREDENTIALS（必須是合法的 JSON 格式字串）
-        SERVICE_ACCOUNT_INFO = os.getenv("GOOGLE_CREDENTIALS")
-        if SERVICE_ACCOUNT_INFO:
-            # 指定正確的 OAuth scope (這裡只需要存取試算表)
-            SCOPES = ["https://www.googleapis.com/auth/spreadsheets"]
-            # 解析 JSON 並建立憑證物件，這裡加入 scopes 參數
-            creds = Credentials.from_service_account_info(json.loads(SERVICE_ACCOUNT_INFO), scopes=SCOPES)
-            # 利用 gspread 建立 Google Sheets API client
-            client = gspread.authorize(creds)
-            # 從環境變數讀取試算表相關設定，若未設定則使用預設值
-            SPREADSHEET_ID = os.getenv('SPREADSHEET_ID', "1DsDd1YFcUNX6mtSfoLVDfStSNT9GTGcLIhhRS5eH2Ss")
-            SHEET_NAME = os.getenv('SHEET_NAME', "Sheet9")
-            # 開啟指定試算表與工作表
-            sheet = client.open_by_key(SPREADSHEET_ID).worksheet(SHEET_NAME)
-            print(f"✅ 成功連接到試算表: {sheet.title}")
-        else:
-            print("⚠️ GOOGLE_CREDENTIALS 環境變數未設置，無法使用 Google Sheets API")
-    except gspread.exceptions.SpreadsheetNotFound:
-        print("❌ 找不到試算表，請檢查 SPREADSHEET_ID 是否正確，以及 API 權限")
-    except Exception as e:
-        print(f"⚠️ 無法初始化 Google Sheets API: {str(e)}")
\ No newline at end of file
+# 試算表匯入時每批 bulk_create 的筆數
+SHEETS_IMPORT_BATCH_SIZE = int(os.getenv('SHEETS_IMPORT_BATCH_SIZE', '1000'))
+
+# 憑證 (GOOGLE_CREDENTIALS)、SPREADSHEET_ID、SHEET_NAME 由 members/google_sheets.py 在第一次同步時才讀取並授權，
+# 設定檔載入 (每個 gunicorn worker 啟動、每個 manage.py 指令) 不會連線到 Google。